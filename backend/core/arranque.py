@@ -0,0 +1,62 @@
+"""Trabajo opcional de arranque (hook lifespan de `backend.main`).
+
+Nada de esto corre al importar la app: importar `backend.main` sólo arma
+rutas. Con `STARTUP_PREWARM=true` el lifespan llama a `precalentar()` para que
+el primer request no pague conexiones, imports pesados ni el spawn del pool.
+"""
+import logging
+import time
+
+from sqlalchemy import text
+
+from .config import settings
+
+logger = logging.getLogger("axs.startup")
+
+
+def _precalentar_db() -> None:
+    from ..db.connection import engine
+
+    conexiones = []
+    try:
+        for _ in range(max(1, settings.ENGINE_POOL_SIZE)):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            conexiones.append(conn)
+    finally:
+        # Al cerrarlas vuelven al pool, ya abiertas
+        for conn in conexiones:
+            conn.close()
+
+
+def _precalentar_qr() -> None:
+    from ..services import qr_service
+    from ..utils.procesos import obtener_pool, tamano_pool
+
+    qr_service.precalentar()
+    # El pool crea un proceso por tarea enviada mientras no haya uno libre;
+    # cada uno se precalienta en su `initializer` (ver utils.procesos)
+    pool = obtener_pool()
+    for futuro in [pool.submit(int) for _ in range(tamano_pool())]:
+        futuro.result()
+
+
+def _precalentar_passwords() -> None:
+    from .security import get_pwd_context
+
+    get_pwd_context().handler("bcrypt").get_backend()
+
+
+def precalentar() -> None:
+    """Abrir el pool de DB, cargar qrcode/PIL/passlib y levantar el pool de procesos."""
+    for nombre, paso in (
+        ("db", _precalentar_db),
+        ("qr", _precalentar_qr),
+        ("passwords", _precalentar_passwords),
+    ):
+        t0 = time.perf_counter()
+        try:
+            paso()
+            logger.info("Precalentado %s en %.1f ms", nombre, (time.perf_counter() - t0) * 1000)
+        except Exception as exc:
+            logger.warning("No se pudo precalentar %s", nombre, exc_info=exc)
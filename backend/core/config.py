@@ -13,6 +13,84 @@ class Settings:
 
     # Directorio de uploads (puede configurarse vía env)
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", str(PROJECT_ROOT / "uploads"))
+    MAX_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "15"))
+    # Tamaño de bloque para copiar uploads a disco (bytes)
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    # Un blob sin referencias no se borra hasta que pasen estos segundos desde que
+    # se publicó (margen entre guardar el archivo y confirmar su evidencia)
+    EVIDENCIA_GC_GRACIA_S: int = int(os.getenv("EVIDENCIA_GC_GRACIA_S", "3600"))
+
+    # Checkpoint de `python -m backend.integridad` (blobs ya verificados, base SQLite)
+    INTEGRIDAD_CHECKPOINT: str = os.getenv(
+        "INTEGRIDAD_CHECKPOINT", str(PROJECT_ROOT / "integridad" / "checkpoint.sqlite3")
+    )
+
+    # Descarga de evidencias delegada a nginx (X-Accel-Redirect): prefijo de la
+    # location `internal` que apunta a UPLOAD_DIR, p. ej. "/_uploads/". Vacío = servir desde la app.
+    EVIDENCIA_X_ACCEL_PREFIX: str = os.getenv("EVIDENCIA_X_ACCEL_PREFIX", "")
+
+    # Derivados de fotos de evidencia (miniaturas JPEG generadas en el pool de procesos)
+    EVIDENCIA_DERIVADOS: bool = os.getenv("EVIDENCIA_DERIVADOS", "true").lower() in ("1", "true", "yes")
+    DERIVADO_SMALL_PX: int = int(os.getenv("DERIVADO_SMALL_PX", "160"))
+    DERIVADO_MEDIUM_PX: int = int(os.getenv("DERIVADO_MEDIUM_PX", "800"))
+    DERIVADO_CALIDAD: int = int(os.getenv("DERIVADO_CALIDAD", "80"))
+    # Al apagar, esperar a lo sumo estos segundos las miniaturas en curso
+    # (lo que no termine lo completa `python -m backend.integridad --derivados`)
+    DERIVADOS_APAGADO_S: float = float(os.getenv("DERIVADOS_APAGADO_S", "30"))
+
+    # Caché de PNGs de QR: tope en memoria (bytes) y capa opcional en disco con su propio tope
+    QR_CACHE_MAX_BYTES: int = int(os.getenv("QR_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    QR_CACHE_DIR: str = os.getenv("QR_CACHE_DIR", "")
+    QR_CACHE_DISK_MAX_BYTES: int = int(os.getenv("QR_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+    # Aceptar en caseta tokens QR sin firma (formato anterior) mientras sigan vigentes
+    QR_LEGACY_TOKENS: bool = os.getenv("QR_LEGACY_TOKENS", "true").lower() in ("1", "true", "yes")
+
+    # Sincronización de casetas: el delta no entrega cambios más recientes que
+    # este margen (s), para no saltarse transacciones que aún no confirmaban
+    CASETA_DELTA_MARGEN_S: int = int(os.getenv("CASETA_DELTA_MARGEN_S", "2"))
+    CASETA_DELTA_MAX: int = int(os.getenv("CASETA_DELTA_MAX", "1000"))
+    # Eventos de entrada/salida en lote (casetas offline)
+    EVENTOS_LOTE_MAX: int = int(os.getenv("EVENTOS_LOTE_MAX", "500"))
+    EVENTOS_TOLERANCIA_S: int = int(os.getenv("EVENTOS_TOLERANCIA_S", "300"))
+
+    # Pool de procesos para trabajo CPU-bound (0 = número de CPUs)
+    PROCESS_POOL_WORKERS: int = int(os.getenv("PROCESS_POOL_WORKERS", "0"))
+    # Lotes de visitas: máximo por request y mínimo para usar el pool de procesos
+    VISITAS_LOTE_MAX: int = int(os.getenv("VISITAS_LOTE_MAX", "1000"))
+    QR_LOTE_MIN_POOL: int = int(os.getenv("QR_LOTE_MIN_POOL", "16"))
+
+    # Caché del usuario autenticado (X-User-Id): segundos de vida y tope de entradas
+    PRINCIPAL_CACHE_TTL: int = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+    PRINCIPAL_CACHE_MAX: int = int(os.getenv("PRINCIPAL_CACHE_MAX", "10000"))
+
+    # Tokens de sesión firmados (HMAC): llaves "kid:secreto,..." y la activa para firmar
+    AUTH_KEYS: str = os.getenv("AUTH_KEYS", "")
+    AUTH_KEY_ID: str = os.getenv("AUTH_KEY_ID", "")
+    # Sólo desarrollo con un worker: sin AUTH_KEYS, usar una llave aleatoria por proceso
+    AUTH_DEV_EPHEMERAL_KEY: bool = os.getenv("AUTH_DEV_EPHEMERAL_KEY", "false").lower() in ("1", "true", "yes")
+    AUTH_TOKEN_TTL: int = int(os.getenv("AUTH_TOKEN_TTL", "900"))
+    # Cada cuántos segundos recargar la lista de revocación desde la base
+    AUTH_REVOCACION_REFRESH: int = int(os.getenv("AUTH_REVOCACION_REFRESH", "30"))
+    # Aceptar todavía el header X-User-Id (clientes sin login). Es suplantable:
+    # activarlo sólo explícitamente mientras se migran los clientes
+    AUTH_LEGACY_HEADER: bool = os.getenv("AUTH_LEGACY_HEADER", "false").lower() in ("1", "true", "yes")
+
+    # Barrido de visitas expiradas (tarea de fondo en cada worker)
+    EXPIRACION_ENABLED: bool = os.getenv("EXPIRACION_ENABLED", "true").lower() in ("1", "true", "yes")
+    EXPIRACION_INTERVALO_S: int = int(os.getenv("EXPIRACION_INTERVALO_S", "60"))
+    EXPIRACION_LOTE: int = int(os.getenv("EXPIRACION_LOTE", "500"))
+    # Horas tras `vigencia` (fecha de la visita) antes de darla por expirada
+    EXPIRACION_GRACIA_H: int = int(os.getenv("EXPIRACION_GRACIA_H", "12"))
+
+    # Archivo frío: visitas con salida (o expiradas) hace más de ARCHIVO_DIAS días
+    ARCHIVO_ENABLED: bool = os.getenv("ARCHIVO_ENABLED", "false").lower() in ("1", "true", "yes")
+    ARCHIVO_DIAS: int = int(os.getenv("ARCHIVO_DIAS", "90"))
+    # Visitas con entrada y sin salida registrada (salida no escaneada): se archivan
+    # tal cual este número de días después de la entrada; 0 = nunca
+    ARCHIVO_SIN_SALIDA_DIAS: int = int(os.getenv("ARCHIVO_SIN_SALIDA_DIAS", "180"))
+    ARCHIVO_LOTE: int = int(os.getenv("ARCHIVO_LOTE", "200"))
+    ARCHIVO_INTERVALO_S: int = int(os.getenv("ARCHIVO_INTERVALO_S", "3600"))
 
     # Engine parameters (configurables por entorno)
     ENGINE_POOL_SIZE: int = int(os.getenv("ENGINE_POOL_SIZE", "5"))
@@ -20,6 +98,33 @@ class Settings:
     ENGINE_POOL_TIMEOUT: int = int(os.getenv("ENGINE_POOL_TIMEOUT", "30"))
     ECHO_SQL: bool = os.getenv("ECHO_SQL", "false").lower() in ("1", "true", "yes")
 
+    # Perfil SQLite (sitios pequeños): PRAGMAs aplicados a cada conexión nueva
+    SQLITE_PRAGMAS: bool = os.getenv("SQLITE_PRAGMAS", "true").lower() in ("1", "true", "yes")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+    # Escrituras calientes por un único hilo escritor con group commit
+    SQLITE_WRITE_QUEUE: bool = os.getenv("SQLITE_WRITE_QUEUE", "true").lower() in ("1", "true", "yes")
+    WRITE_QUEUE_MAX_LOTE: int = int(os.getenv("WRITE_QUEUE_MAX_LOTE", "64"))
+    # Espera extra para juntar un lote (ms); 0 = sólo lo que ya está encolado
+    WRITE_QUEUE_MAX_ESPERA_MS: float = float(os.getenv("WRITE_QUEUE_MAX_ESPERA_MS", "0"))
+
+    # Contabilidad de SQL por request (headers X-DB-*, access log, N+1) y log de lentas
+    SQL_STATS_ENABLED: bool = os.getenv("SQL_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+    # Repeticiones de la misma sentencia en un request a partir de las que se avisa N+1
+    N_PLUS_ONE_MIN: int = int(os.getenv("N_PLUS_ONE_MIN", "5"))
+
+    # Exponer /metrics (formato Prometheus) y medir cada request
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # Aplicar migraciones al arrancar cada worker (sólo desarrollo; en producción usar
+    # `python -m backend.db.migrations upgrade` como paso de despliegue)
+    AUTO_MIGRATE: bool = os.getenv("AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
+    # Precalentar pool de DB, qrcode/PIL, passlib y pool de procesos en el lifespan
+    STARTUP_PREWARM: bool = os.getenv("STARTUP_PREWARM", "false").lower() in ("1", "true", "yes")
+
     def is_sqlite(self) -> bool:
         return self.DATABASE_URL.startswith("sqlite")
 
@@ -1,7 +1,12 @@
 from fastapi import Header, Depends, HTTPException
+from typing import Optional
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from ..db.connection import SessionLocal
+from ..db.connection import SessionLocal, get_async_sessionmaker
 from ..db.models import Usuario
+from . import sesion
+from .config import settings
+from .principal import Principal, cachear_principal, obtener_principal_cacheado
 
 
 def get_db():
@@ -12,11 +17,52 @@ def get_db():
         db.close()
 
 
-def get_usuario_actual(
-    x_user_id: str = Header(..., alias="X-User-Id"),
-    db: Session = Depends(get_db),
-):
-    usuario = db.query(Usuario).filter(Usuario.usuario_id == x_user_id).first()
-    if not usuario:
-        raise HTTPException(status_code=401, detail="Usuario no encontrado")
-    return usuario
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+def _no_autenticado(detalle: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detalle, headers={"WWW-Authenticate": "Bearer"})
+
+
+def token_bearer(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """Token de `Authorization: Bearer <token>`, o `None` si no viene el header."""
+    if not authorization:
+        return None
+    esquema, _, token = authorization.partition(" ")
+    if esquema.lower() != "bearer" or not token.strip():
+        raise _no_autenticado("Authorization inválido")
+    return token.strip()
+
+
+async def get_usuario_actual(
+    token: Optional[str] = Depends(token_bearer),
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id"),
+) -> Principal:
+    # Token firmado: se verifica en memoria, sin leer la base
+    if token is not None:
+        try:
+            return sesion.principal_desde_token(token)
+        except sesion.TokenInvalido as exc:
+            raise _no_autenticado(str(exc))
+
+    if not x_user_id or not settings.AUTH_LEGACY_HEADER:
+        raise _no_autenticado("No autenticado")
+
+    # Header legado X-User-Id: lookup en base con caché TTL
+    principal = obtener_principal_cacheado(x_user_id)
+    if principal is not None:
+        return principal
+
+    # Sesión propia y corta: no comparte transacción con la del endpoint y la
+    # conexión vuelve al pool antes de que éste empiece.
+    async with get_async_sessionmaker()() as db:
+        usuario = (
+            await db.execute(select(Usuario).where(Usuario.usuario_id == x_user_id))
+        ).scalar_one_or_none()
+        if not usuario:
+            raise HTTPException(status_code=401, detail="Usuario no encontrado")
+        principal = Principal.desde_usuario(usuario)
+    cachear_principal(principal)
+    return principal
@@ -0,0 +1,97 @@
+"""Llavero HMAC-SHA256 con identificador de llave (`kid`) para rotación.
+
+Las llaves se configuran en `AUTH_KEYS` como `kid:secreto` separados por comas.
+Se firma siempre con la llave activa (`AUTH_KEY_ID`, o la primera de la lista)
+y se verifica con la que indique el `kid` del mensaje, así que rotar es:
+
+1. agregar la llave nueva a `AUTH_KEYS` en todos los workers,
+2. cambiar `AUTH_KEY_ID` a la nueva,
+3. quitar la vieja cuando ya no queden firmas vigentes hechas con ella.
+
+Sin `AUTH_KEYS` la app no arranca: una llave distinta por proceso haría que
+un QR o una sesión válidos se rechacen en otro worker o tras un reinicio.
+Para desarrollo con un solo worker, `AUTH_DEV_EPHEMERAL_KEY=true` genera una
+llave aleatoria por proceso.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import re
+import secrets
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger("axs.auth")
+
+# El kid viaja dentro de tokens separados por "." y "|"
+_KID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class FirmaInvalida(ValueError):
+    """Firma mal formada, con `kid` desconocido o que no coincide."""
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b64url_decode(texto: str) -> bytes:
+    try:
+        return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+    except (ValueError, TypeError) as exc:
+        raise FirmaInvalida("Base64 inválido") from exc
+
+
+@lru_cache(maxsize=1)
+def llavero() -> Tuple[str, Dict[str, bytes]]:
+    """`(kid_activo, {kid: llave})` a partir de la configuración (una vez por proceso)."""
+    llaves: Dict[str, bytes] = {}
+    for entrada in filter(None, (e.strip() for e in settings.AUTH_KEYS.split(","))):
+        kid, sep, secreto = entrada.partition(":")
+        if not sep or not _KID_RE.match(kid) or not secreto:
+            raise ValueError("AUTH_KEYS debe tener el formato 'kid:secreto,kid2:secreto2' (kid alfanumérico)")
+        llaves[kid] = secreto.encode()
+
+    if not llaves:
+        if not settings.AUTH_DEV_EPHEMERAL_KEY:
+            raise RuntimeError(
+                "AUTH_KEYS no configurado: define 'kid:secreto' (el mismo en todos los workers) "
+                "o AUTH_DEV_EPHEMERAL_KEY=true sólo para desarrollo"
+            )
+        logger.warning("AUTH_KEYS no configurado: usando una llave efímera de este proceso (sólo desarrollo)")
+        llaves["dev"] = secrets.token_bytes(32)
+
+    activo = settings.AUTH_KEY_ID or next(iter(llaves))
+    if activo not in llaves:
+        raise ValueError(f"AUTH_KEY_ID '{activo}' no está en AUTH_KEYS")
+    return activo, llaves
+
+
+def kid_activo() -> str:
+    return llavero()[0]
+
+
+def firmar(mensaje: bytes, kid: Optional[str] = None) -> Tuple[str, bytes]:
+    """MAC de `mensaje` con la llave activa (o `kid`). Devuelve `(kid, mac)`."""
+    activo, llaves = llavero()
+    kid = kid or activo
+    return kid, hmac.new(llaves[kid], mensaje, hashlib.sha256).digest()
+
+
+def verificar(mensaje: bytes, kid: str, mac: bytes, longitud: Optional[int] = None) -> None:
+    """Lanzar `FirmaInvalida` si `mac` no corresponde a `mensaje` con la llave `kid`.
+
+    `longitud` verifica un MAC truncado a ese número de bytes (p. ej. en el QR,
+    donde cada byte agranda la imagen).
+    """
+    llave = llavero()[1].get(kid)
+    if llave is None:
+        raise FirmaInvalida("Llave desconocida")
+    esperado = hmac.new(llave, mensaje, hashlib.sha256).digest()
+    if longitud is not None:
+        esperado = esperado[:longitud]
+    if not hmac.compare_digest(esperado, mac):
+        raise FirmaInvalida("Firma inválida")
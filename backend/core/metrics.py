@@ -0,0 +1,304 @@
+"""Métricas del proceso en formato de texto de Prometheus (sin dependencias).
+
+Registro mínimo de contadores, gauges e histogramas con etiquetas, seguro entre
+hilos (los endpoints sync corren en el threadpool). `/metrics` devuelve
+`exponer()`.
+
+Lo que se mide está pensado para separar las causas de latencia en caseta:
+
+- HTTP: `axs_http_request_duration_seconds{method,route,status}` y requests en curso.
+- DB: espera de checkout del pool (`axs_db_pool_checkout_wait_seconds`) y su
+  tamaño/uso, leídos al momento del scrape; duración y total de consultas
+  (`axs_db_query_duration_seconds`).
+- QR: tiempo de render (`axs_qr_render_seconds`) y aciertos de caché.
+- Disco: bytes de evidencia ingeridos y tiempo de escritura por archivo.
+"""
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Etiquetas = Tuple[str, ...]
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(nombres: Iterable[str], valores: Iterable[str], extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _num(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas: Etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _clave(self, valores: Dict[str, str]) -> Etiquetas:
+        return tuple(str(valores.get(n, "")) for n in self.etiquetas)
+
+    def cabecera(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Contador incrementado a mano o leído al momento del scrape (`funcion`,
+    para totales que ya lleva otro objeto y sólo crecen)."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion: Optional[Callable[[], Dict[Etiquetas, float]]] = None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Etiquetas, float] = {}
+        self._funcion = funcion
+
+    def inc(self, cantidad: float = 1, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def muestras(self) -> List[str]:
+        if self._funcion is not None:
+            valores = self._funcion()
+        else:
+            with self._lock:
+                valores = dict(self._valores)
+        return [
+            f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_num(v)}"
+            for clave, v in sorted(valores.items())
+        ]
+
+
+class Gauge(_Metrica):
+    """Gauge con valor fijado a mano o calculado al momento del scrape (`funcion`)."""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion: Optional[Callable[[], Dict[Etiquetas, float]]] = None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Etiquetas, float] = {}
+        self._funcion = funcion
+
+    def set(self, valor: float, **etiquetas) -> None:
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+    def inc(self, cantidad: float = 1, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def dec(self, cantidad: float = 1, **etiquetas) -> None:
+        self.inc(-cantidad, **etiquetas)
+
+    def muestras(self) -> List[str]:
+        if self._funcion is not None:
+            valores = self._funcion()
+        else:
+            with self._lock:
+                valores = dict(self._valores)
+        return [
+            f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_num(v)}"
+            for clave, v in sorted(valores.items())
+        ]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # clave -> [conteos por bucket (no acumulados)..., suma, total]
+        self._series: Dict[Etiquetas, List[float]] = {}
+
+    def observe(self, valor: float, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        i = 0
+        while valor > self.buckets[i]:
+            i += 1
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [0] * len(self.buckets) + [0.0, 0]
+            serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def muestras(self) -> List[str]:
+        with self._lock:
+            series = {clave: list(serie) for clave, serie in self._series.items()}
+        lineas = []
+        for clave, serie in sorted(series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, serie):
+                acumulado += conteo
+                le = f'le="{_num(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_num(serie[-2])}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {serie[-1]}")
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            # Idempotente por nombre (reimports / recargas en desarrollo)
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def exponer(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas: List[str] = []
+        for metrica in metricas:
+            lineas.extend(metrica.cabecera())
+            lineas.extend(metrica.muestras())
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = Registro()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def contador(nombre, ayuda, etiquetas=(), funcion=None) -> Contador:
+    return REGISTRO.registrar(Contador(nombre, ayuda, etiquetas, funcion))
+
+
+def gauge(nombre, ayuda, etiquetas=(), funcion=None) -> Gauge:
+    return REGISTRO.registrar(Gauge(nombre, ayuda, etiquetas, funcion))
+
+
+def histograma(nombre, ayuda, etiquetas=(), buckets=DEFAULT_BUCKETS) -> Histograma:
+    return REGISTRO.registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+
+def exponer() -> str:
+    return REGISTRO.exponer()
+
+
+# ------------------------------------------------------------
+# Métricas de la aplicación
+# ------------------------------------------------------------
+HTTP_DURACION = histograma(
+    "axs_http_request_duration_seconds", "Latencia de requests HTTP por ruta.", ("method", "route", "status")
+)
+HTTP_EN_CURSO = gauge("axs_http_requests_in_flight", "Requests HTTP en curso.")
+HTTP_EN_CURSO.set(0)
+
+DB_CHECKOUT_ESPERA = histograma(
+    "axs_db_pool_checkout_wait_seconds",
+    "Tiempo esperando una conexión del pool.",
+    ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+
+DB_CONSULTA_DURACION = histograma(
+    "axs_db_query_duration_seconds",
+    "Duración de cada sentencia SQL (todas las del proceso; `_count` es el total de consultas).",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+QR_RENDER = histograma(
+    "axs_qr_render_seconds",
+    "Tiempo de render de un QR (sólo fallos de caché; en lotes, medido en el proceso del pool).",
+    ("formato",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+)
+
+EVIDENCIA_BYTES = contador("axs_evidencia_bytes_total", "Bytes de evidencia ingeridos (usar rate()).", ("categoria",))
+EVIDENCIA_ARCHIVOS = contador("axs_evidencia_archivos_total", "Archivos de evidencia ingeridos.", ("categoria",))
+EVIDENCIA_ESCRITURA = histograma(
+    "axs_evidencia_write_seconds", "Tiempo de copiar un archivo de evidencia a disco.", ("categoria",)
+)
+EVIDENCIA_DERIVADOS = histograma(
+    "axs_evidencia_derivados_seconds", "Tiempo de generar las miniaturas de una foto de evidencia."
+)
+
+VISITAS_EXPIRADAS = contador("axs_visitas_expiradas_total", "Visitas marcadas como expiradas por el barrido.")
+VISITAS_ARCHIVADAS = contador("axs_visitas_archivadas_total", "Visitas movidas al archivo frío.")
+EXPIRACION_ULTIMO_BARRIDO = gauge(
+    "axs_expiracion_ultimo_barrido_timestamp", "Epoch del último barrido de expiración completado."
+)
+
+
+# Engines cuyos pools se exponen en el scrape (se lee `engine.pool` cada vez:
+# `dispose()` lo reemplaza)
+_engines: Dict[str, object] = {}
+
+
+def registrar_engine(nombre: str, engine) -> None:
+    _engines[nombre] = engine
+
+
+def _estado_pools(metodo: str) -> Callable[[], Dict[Etiquetas, float]]:
+    def leer():
+        valores = {}
+        for nombre, engine in list(_engines.items()):
+            fn = getattr(engine.pool, metodo, None)
+            if fn is not None:
+                try:
+                    # QueuePool.overflow() es negativo mientras no se llena el pool
+                    valores[(nombre,)] = max(0, fn()) if metodo == "overflow" else fn()
+                except Exception:
+                    continue
+        return valores
+    return leer
+
+
+gauge("axs_db_pool_size", "Conexiones configuradas en el pool.", ("pool",), _estado_pools("size"))
+gauge("axs_db_pool_checked_out", "Conexiones del pool en uso.", ("pool",), _estado_pools("checkedout"))
+gauge("axs_db_pool_overflow", "Conexiones abiertas por encima de pool_size.", ("pool",), _estado_pools("overflow"))
+
+
+# ------------------------------------------------------------
+# Middleware ASGI: latencia por ruta y requests en curso
+# ------------------------------------------------------------
+class MetricasMiddleware:
+    """Mide cada request HTTP etiquetando por plantilla de ruta (`/qr/validar/{visita_id}/{token}`),
+    no por path concreto, para no disparar la cardinalidad."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = {"status": 500}
+
+        async def send_medido(message):
+            if message["type"] == "http.response.start":
+                estado["status"] = message["status"]
+            await send(message)
+
+        HTTP_EN_CURSO.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_medido)
+        finally:
+            HTTP_EN_CURSO.dec()
+            # El router deja la ruta resuelta en el mismo scope
+            ruta = getattr(scope.get("route"), "path", None) or "<sin_ruta>"
+            HTTP_DURACION.observe(
+                time.perf_counter() - t0, method=scope["method"], route=ruta, status=estado["status"]
+            )
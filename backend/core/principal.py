@@ -0,0 +1,118 @@
+"""Usuario autenticado como objeto inmutable, con caché en proceso.
+
+`get_usuario_actual` se ejecuta en todos los endpoints autenticados; en vez de
+devolver una instancia ORM ligada a la sesión, devuelve un `Principal` congelado
+que puede cachearse entre requests sin riesgo de lazy-loads ni sesiones cerradas.
+
+Invalidación: los cambios a `Usuario` hechos con el ORM (objetos modificados o
+borrados en una `Session`) se anotan en cada flush y se invalidan al confirmar
+la transacción, no antes: si se revierte, el principal cacheado sigue siendo
+el correcto. Un `update(Usuario)` / `delete(Usuario)` ejecutado con
+`session.execute` vacía toda la caché al confirmar, porque no se sabe a quién
+afectó. Las sentencias Core sobre `usuarios` ejecutadas directo en una
+`Connection` (fuera de una `Session`) no se ven: quien las ejecute debe llamar
+a `invalidar_principal` (o `invalidar_todos`) después del commit.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .config import settings
+from ..db.models import Usuario
+from ..utils.cache import TTLCache
+
+
+@dataclass(frozen=True)
+class Principal:
+    usuario_id: str
+    rol: Optional[str]
+    msp_id: Optional[str] = None
+    condominio_id: Optional[str] = None
+    casa_unidad: Optional[str] = None
+    nombre: Optional[str] = None
+    email: Optional[str] = None
+
+    @classmethod
+    def desde_usuario(cls, usuario: Usuario) -> "Principal":
+        return cls(
+            usuario_id=usuario.usuario_id,
+            rol=usuario.rol,
+            msp_id=usuario.msp_id,
+            condominio_id=usuario.condominio_id,
+            casa_unidad=usuario.casa_unidad,
+            nombre=usuario.nombre,
+            email=usuario.email,
+        )
+
+
+_cache = TTLCache(settings.PRINCIPAL_CACHE_TTL, settings.PRINCIPAL_CACHE_MAX)
+
+
+def obtener_principal_cacheado(usuario_id: str) -> Optional[Principal]:
+    return _cache.get(usuario_id)
+
+
+def cachear_principal(principal: Principal) -> None:
+    _cache.put(principal.usuario_id, principal)
+
+
+def invalidar_principal(usuario_id: str) -> None:
+    """Descartar el principal cacheado (p. ej. al cambiar rol o condominio).
+
+    Sólo afecta al proceso actual; en otros workers la entrada caduca por TTL.
+    """
+    _cache.invalidate(usuario_id)
+
+
+def invalidar_todos() -> None:
+    _cache.clear()
+
+
+# ---------------------------------------------------------
+# Invalidación al confirmar (ver docstring del módulo)
+# ---------------------------------------------------------
+_PENDIENTES = "principal_invalidar"
+_TODOS = object()
+
+
+def _anotar(session: Session, usuario_id) -> None:
+    if usuario_id is not None:
+        session.info.setdefault(_PENDIENTES, set()).add(usuario_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _anotar_usuarios_modificados(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Usuario):
+            continue
+        _anotar(session, obj.usuario_id)
+        # Si cambió el propio usuario_id, también el anterior
+        for previo in inspect(obj).attrs.usuario_id.history.deleted or ():
+            _anotar(session, previo)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _anotar_bulk(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+        m.class_ is Usuario for m in orm_execute_state.all_mappers
+    ):
+        _anotar(orm_execute_state.session, _TODOS)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_confirmados(session):
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if not pendientes:
+        return
+    if _TODOS in pendientes:
+        invalidar_todos()
+        return
+    for usuario_id in pendientes:
+        invalidar_principal(usuario_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendientes(session):
+    session.info.pop(_PENDIENTES, None)
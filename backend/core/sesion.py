@@ -0,0 +1,105 @@
+"""Tokens de sesión firmados (sin estado): autorizar sin leer la base.
+
+Formato: `<payload>.<kid>.<mac>`, con `payload` = JSON en base64url y `mac` =
+HMAC-SHA256 de `"<payload>.<kid>"` con la llave `kid` del llavero
+(`core/firmas.py`). El payload lleva lo que `verificar_rol` y los routers
+necesitan (`sub`, `rol`, `cid`, `casa`, `msp`) más `iat`, `exp` y `jti`.
+
+La revocación es una lista pequeña de `jti` en memoria (tokens cerrados con
+`/auth/logout` o revocados a mano), que el lifespan recarga periódicamente
+desde la tabla `tokens_revocados`. Como los tokens duran poco
+(`AUTH_TOKEN_TTL`), la lista sólo guarda los que aún no expiran.
+"""
+import json
+import secrets
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from . import firmas
+from .config import settings
+from .principal import Principal
+
+
+class TokenInvalido(ValueError):
+    """Token mal formado, con firma inválida, expirado o revocado."""
+
+
+def emitir_token(principal: Principal, ttl: Optional[int] = None) -> Tuple[str, dict]:
+    """Firmar un token para `principal`. Devuelve `(token, payload)`."""
+    ahora = int(time.time())
+    payload = {
+        "sub": principal.usuario_id,
+        "rol": principal.rol,
+        "cid": principal.condominio_id,
+        "casa": principal.casa_unidad,
+        "msp": principal.msp_id,
+        "iat": ahora,
+        "exp": ahora + (ttl or settings.AUTH_TOKEN_TTL),
+        "jti": secrets.token_urlsafe(12),
+    }
+    cuerpo = firmas.b64url(json.dumps(payload, separators=(",", ":")).encode())
+    kid = firmas.kid_activo()
+    _, mac = firmas.firmar(f"{cuerpo}.{kid}".encode(), kid)
+    return f"{cuerpo}.{kid}.{firmas.b64url(mac)}", payload
+
+
+def leer_token(token: str) -> dict:
+    """Verificar firma y expiración (sin tocar la base) y devolver el payload."""
+    try:
+        cuerpo, kid, mac = token.split(".")
+    except ValueError:
+        raise TokenInvalido("Token inválido") from None
+    try:
+        firmas.verificar(f"{cuerpo}.{kid}".encode(), kid, firmas.b64url_decode(mac))
+        payload = json.loads(firmas.b64url_decode(cuerpo))
+    except (firmas.FirmaInvalida, ValueError):
+        raise TokenInvalido("Token inválido") from None
+
+    if not isinstance(payload, dict) or "sub" not in payload:
+        raise TokenInvalido("Token inválido")
+    if payload.get("exp", 0) <= time.time():
+        raise TokenInvalido("Token expirado")
+    if revocado(payload.get("jti")):
+        raise TokenInvalido("Token revocado")
+    return payload
+
+
+def principal_desde_token(token: str) -> Principal:
+    payload = leer_token(token)
+    return Principal(
+        usuario_id=payload["sub"],
+        rol=payload.get("rol"),
+        msp_id=payload.get("msp"),
+        condominio_id=payload.get("cid"),
+        casa_unidad=payload.get("casa"),
+    )
+
+
+# ------------------------------------------------------------
+# Lista de revocación en memoria (jti -> exp epoch)
+# ------------------------------------------------------------
+_revocados: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def revocado(jti: Optional[str]) -> bool:
+    return bool(jti) and jti in _revocados
+
+
+def marcar_revocado(jti: str, exp: float) -> None:
+    with _lock:
+        _revocados[jti] = exp
+
+
+def reemplazar_revocados(vigentes: Dict[str, float]) -> None:
+    """Sustituir la lista local por la leída de la base (descarta los ya expirados)."""
+    global _revocados
+    ahora = time.time()
+    nuevos = {jti: exp for jti, exp in vigentes.items() if exp > ahora}
+    with _lock:
+        # Conservar revocaciones locales aún no visibles en la lectura
+        for jti, exp in _revocados.items():
+            if exp > ahora:
+                nuevos.setdefault(jti, exp)
+        _revocados = nuevos
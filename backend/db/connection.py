@@ -1,25 +1,157 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from ..core import metrics
 from ..core.config import settings
+from . import sql_stats
 
 
 # Build engine in a dialect-aware way (SQLite needs connect_args)
 engine_kwargs = {"echo": settings.ECHO_SQL}
 
+
+def aplicar_pragmas_sqlite(dbapi_connection, connection_record=None) -> None:
+    """Perfil de producción SQLite, aplicado a cada conexión nueva del pool.
+
+    - WAL: lectores concurrentes con un escritor, sin `database is locked` al leer.
+    - synchronous=NORMAL: en WAL sólo hace fsync en checkpoints, no en cada commit.
+    - busy_timeout: esperar el lock de escritura en vez de fallar de inmediato.
+    - mmap_size / cache_size: lecturas desde memoria mapeada y caché de páginas mayor.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        # Negativo = tamaño en KiB (no en páginas)
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    finally:
+        cursor.close()
+
+
+def instalar_perfil_sqlite(sync_engine) -> None:
+    if settings.is_sqlite() and settings.SQLITE_PRAGMAS:
+        event.listen(sync_engine, "connect", aplicar_pragmas_sqlite)
+
+
+# ------------------------------------------------------------
+# Pools instrumentados: tiempo de espera por una conexión (métricas)
+# ------------------------------------------------------------
+class _CheckoutMedido:
+    etiqueta = "db"
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_CHECKOUT_ESPERA.observe(time.perf_counter() - t0, pool=self.etiqueta)
+
+
+def pool_medido(base, etiqueta: str):
+    """Subclase de `base` (QueuePool / AsyncAdaptedQueuePool) que mide el checkout."""
+    return type(f"{base.__name__}Medido", (_CheckoutMedido, base), {"etiqueta": etiqueta})
+
+
+def _es_memoria(url: str) -> bool:
+    # SQLite en memoria necesita su pool por defecto (una conexión compartida)
+    return make_url(url).database in (None, "", ":memory:")
+
+
 if settings.is_sqlite():
     engine = create_engine(
         settings.DATABASE_URL,
         connect_args={"check_same_thread": False},
+        **({} if _es_memoria(settings.DATABASE_URL) else {"poolclass": pool_medido(QueuePool, "sync")}),
         **engine_kwargs,
     )
+    instalar_perfil_sqlite(engine)
 else:
     engine = create_engine(
         settings.DATABASE_URL,
+        poolclass=pool_medido(QueuePool, "sync"),
         pool_size=settings.ENGINE_POOL_SIZE,
         max_overflow=settings.ENGINE_MAX_OVERFLOW,
         pool_timeout=settings.ENGINE_POOL_TIMEOUT,
         **engine_kwargs,
     )
+metrics.registrar_engine("sync", engine)
+sql_stats.instalar(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+
+# ------------------------------------------------------------
+# Engine asíncrono (endpoints calientes: validación QR, preregistro, listados)
+# ------------------------------------------------------------
+# Se crea al primer uso para no cargar drivers async al importar la app.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+psycopg",
+    "postgres": "postgresql+psycopg",
+}
+
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def async_database_url(url: str) -> str:
+    """Misma URL con el driver async equivalente (aiosqlite / psycopg 3 async)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"Sin driver async configurado para '{backend}'")
+    return parsed.set(drivername=_ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        url = async_database_url(settings.DATABASE_URL)
+        if settings.is_sqlite():
+            _async_engine = create_async_engine(
+                url,
+                **({} if _es_memoria(url) else {"poolclass": pool_medido(AsyncAdaptedQueuePool, "async")}),
+                **engine_kwargs,
+            )
+            instalar_perfil_sqlite(_async_engine.sync_engine)
+        else:
+            _async_engine = create_async_engine(
+                url,
+                poolclass=pool_medido(AsyncAdaptedQueuePool, "async"),
+                pool_size=settings.ENGINE_POOL_SIZE,
+                max_overflow=settings.ENGINE_MAX_OVERFLOW,
+                pool_timeout=settings.ENGINE_POOL_TIMEOUT,
+                **engine_kwargs,
+            )
+        metrics.registrar_engine("async", _async_engine)
+        sql_stats.instalar(_async_engine.sync_engine)
+    return _async_engine
+
+
+def get_async_sessionmaker():
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        # expire_on_commit=False: tras el commit no hay lazy-loads implícitos (no
+        # se permiten en asyncio) y las respuestas usan los valores ya cargados.
+        _AsyncSessionLocal = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _AsyncSessionLocal
+
+
+async def cerrar_async_engine() -> None:
+    """Cerrar las conexiones del engine async (apagado del worker)."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _AsyncSessionLocal = None
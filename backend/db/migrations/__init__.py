@@ -0,0 +1,104 @@
+"""Migraciones versionadas del esquema.
+
+Se aplican con un comando explícito, nunca al importar la app:
+
+    python -m backend.db.migrations upgrade   # aplica las pendientes
+    python -m backend.db.migrations status    # lista aplicadas / pendientes
+    python -m backend.db.migrations explain   # verifica que las consultas usan los índices
+
+Cada migración es un módulo `mNNNN_descripcion.py` con una función
+`upgrade(conn)` que corre dentro de una transacción. Deben ser idempotentes
+(usar `crear_indice` / `agregar_columna`): la 0001 crea las tablas base a
+partir de los modelos actuales, así que en una base nueva algunos objetos de
+migraciones posteriores ya existen.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+
+logger = logging.getLogger("axs.migrations")
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("nombre", String, nullable=False),
+    Column("aplicada_en", DateTime, nullable=False),
+)
+
+_MODULO_RE = re.compile(r"^m(\d{4})_\w+$")
+
+
+def descubrir() -> List[Tuple[int, str]]:
+    """(version, nombre_modulo) de todas las migraciones, en orden."""
+    encontradas = []
+    for info in pkgutil.iter_modules(__path__):
+        m = _MODULO_RE.match(info.name)
+        if m:
+            encontradas.append((int(m.group(1)), info.name))
+    return sorted(encontradas)
+
+
+def _engine(engine: Optional[Engine]) -> Engine:
+    if engine is not None:
+        return engine
+    from ..connection import engine as default_engine
+
+    return default_engine
+
+
+def aplicadas(engine: Optional[Engine] = None) -> set:
+    engine = _engine(engine)
+    with engine.begin() as conn:
+        _metadata.create_all(conn)
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pendientes(engine: Optional[Engine] = None) -> List[Tuple[int, str]]:
+    hechas = aplicadas(engine)
+    return [(v, nombre) for v, nombre in descubrir() if v not in hechas]
+
+
+def upgrade(engine: Optional[Engine] = None) -> List[str]:
+    """Aplicar las migraciones pendientes, cada una en su propia transacción."""
+    engine = _engine(engine)
+    aplicadas_ahora = []
+    for version, nombre in pendientes(engine):
+        modulo = importlib.import_module(f"{__name__}.{nombre}")
+        logger.info("Aplicando migración %s", nombre)
+        with engine.begin() as conn:
+            modulo.upgrade(conn)
+            conn.execute(
+                insert(schema_migrations).values(version=version, nombre=nombre, aplicada_en=datetime.utcnow())
+            )
+        aplicadas_ahora.append(nombre)
+    return aplicadas_ahora
+
+
+# ---------------------------------------------------------
+# Helpers idempotentes para los módulos de migración
+# ---------------------------------------------------------
+def crear_indice(conn: Connection, index: Index) -> None:
+    """CREATE INDEX IF NOT EXISTS a partir de un `Index` declarado en los modelos.
+
+    En Postgres toma un lock de escritura sobre la tabla mientras construye el
+    índice: en tablas grandes conviene correr la migración en horario de baja carga.
+    """
+    conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def agregar_columna(conn: Connection, tabla: str, columna: Column) -> None:
+    """ALTER TABLE ... ADD COLUMN sólo si la columna todavía no existe."""
+    existentes = {c["name"] for c in inspect(conn).get_columns(tabla)}
+    if columna.name in existentes:
+        return
+    tipo = columna.type.compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE {tabla} ADD COLUMN {columna.name} {tipo}'))
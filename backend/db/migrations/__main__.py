@@ -0,0 +1,37 @@
+import argparse
+import logging
+import sys
+
+from . import descubrir, aplicadas, upgrade
+from .planes import verificar_planes
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.db.migrations")
+    parser.add_argument("comando", choices=["upgrade", "status", "explain"])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.comando == "upgrade":
+        hechas = upgrade()
+        print("\n".join(hechas) if hechas else "Sin migraciones pendientes")
+        return 0
+
+    if args.comando == "status":
+        hechas = aplicadas()
+        for version, nombre in descubrir():
+            print(f"[{'x' if version in hechas else ' '}] {nombre}")
+        return 0
+
+    fallos = 0
+    for r in verificar_planes():
+        nota = " (ordena en memoria)" if r["ordena"] else ""
+        print(f"{'OK  ' if r['ok'] else 'FAIL'} {r['consulta']} -> {r['indice']}{nota}")
+        if not r["ok"]:
+            fallos += 1
+            print("     " + r["plan"].replace("\n", "\n     "))
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
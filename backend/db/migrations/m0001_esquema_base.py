@@ -0,0 +1,18 @@
+"""Tablas base (lo que antes hacía `create_all` al importar `backend.main`)."""
+from ..connection import Base
+from .. import models
+
+
+def upgrade(conn):
+    Base.metadata.create_all(
+        conn,
+        tables=[
+            models.MSP.__table__,
+            models.Condominio.__table__,
+            models.Usuario.__table__,
+            models.Caseta.__table__,
+            models.Visita.__table__,
+            models.Evidencia.__table__,
+        ],
+        checkfirst=True,
+    )
@@ -0,0 +1,21 @@
+"""Índices compuestos para listados, validación de QR y conteo de referencias.
+
+`create_all` nunca agrega índices a tablas existentes, así que las bases
+creadas antes de declararlos en los modelos los reciben aquí.
+"""
+from ..models import Evidencia, Visita
+from . import crear_indice
+
+INDICES = {
+    "ix_visitas_condominio_vigencia",
+    "ix_visitas_condominio_casa_vigencia",
+    "ix_visitas_condominio_estado_vigencia",
+    "ix_visitas_qr_token",
+    "ix_evidencias_archivo_url",
+}
+
+
+def upgrade(conn):
+    for index in Visita.__table__.indexes | Evidencia.__table__.indexes:
+        if index.name in INDICES:
+            crear_indice(conn, index)
@@ -0,0 +1,6 @@
+"""Lista de revocación de tokens de sesión firmados."""
+from ..models import TokenRevocado
+
+
+def upgrade(conn):
+    TokenRevocado.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,24 @@
+"""`visitas.actualizado_en` e índice para el delta de casetas.
+
+Las filas existentes toman `created_at` (o el momento de la migración) para
+que entren al siguiente snapshot/delta con un cursor ordenable.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, update
+
+from ..models import Visita
+from . import agregar_columna, crear_indice
+
+
+def upgrade(conn):
+    tabla = Visita.__table__
+    agregar_columna(conn, "visitas", tabla.c.actualizado_en)
+    conn.execute(
+        update(tabla)
+        .where(tabla.c.actualizado_en.is_(None))
+        .values(actualizado_en=func.coalesce(tabla.c.created_at, datetime.utcnow()))
+    )
+    for index in tabla.indexes:
+        if index.name == "ix_visitas_condominio_actualizado":
+            crear_indice(conn, index)
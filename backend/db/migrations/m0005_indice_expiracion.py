@@ -0,0 +1,9 @@
+"""Índice parcial sobre las visitas pendientes para el barrido de expiración."""
+from ..models import Visita
+from . import crear_indice
+
+
+def upgrade(conn):
+    for index in Visita.__table__.indexes:
+        if index.name == "ix_visitas_pendientes_vencimiento":
+            crear_indice(conn, index)
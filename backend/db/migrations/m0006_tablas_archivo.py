@@ -0,0 +1,7 @@
+"""Tablas de archivo frío para visitas cerradas y sus evidencias."""
+from ..models import EvidenciaArchivada, VisitaArchivada
+
+
+def upgrade(conn):
+    VisitaArchivada.__table__.create(conn, checkfirst=True)
+    EvidenciaArchivada.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,55 @@
+"""Índices parciales de candidatas al archivo frío y ids sin reutilizar.
+
+En SQLite, sin `AUTOINCREMENT` el siguiente id es `max(id) + 1`: si el
+archivo se lleva la visita de id más alto, una visita nueva lo reutilizaría y
+chocaría con la archivada en los listados con `incluir_archivadas` (y en
+`visitas_archivo.id`). Las tablas existentes se reconstruyen con
+`AUTOINCREMENT` y la secuencia arranca después del mayor id, caliente o
+archivado. En Postgres las secuencias nunca retroceden: sólo se crean los
+índices.
+"""
+from sqlalchemy import func, inspect, select
+
+from ..models import Evidencia, EvidenciaArchivada, Visita, VisitaArchivada
+from . import crear_indice
+
+
+def _reconstruir_con_autoincrement(conn, tabla, archivo) -> None:
+    nombre = tabla.name
+    sql = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)
+    ).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return
+
+    previa = f"{nombre}__previa"
+    conn.exec_driver_sql(f'ALTER TABLE "{nombre}" RENAME TO "{previa}"')
+    # Los índices viajan con la tabla renombrada; se liberan sus nombres para recrearlos
+    indices = conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (previa,)
+    ).scalars().all()
+    for indice in indices:
+        conn.exec_driver_sql(f'DROP INDEX "{indice}"')
+
+    tabla.create(conn)
+    existentes = {c["name"] for c in inspect(conn).get_columns(previa)}
+    columnas = ", ".join(f'"{c.name}"' for c in tabla.c if c.name in existentes)
+    conn.exec_driver_sql(f'INSERT INTO "{nombre}" ({columnas}) SELECT {columnas} FROM "{previa}"')
+    conn.exec_driver_sql(f'DROP TABLE "{previa}"')
+
+    maximo = max(
+        conn.execute(select(func.coalesce(func.max(tabla.c.id), 0))).scalar(),
+        conn.execute(select(func.coalesce(func.max(archivo.c.id), 0))).scalar(),
+    )
+    conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (nombre,))
+    conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (nombre, maximo))
+
+
+def upgrade(conn):
+    if conn.dialect.name == "sqlite":
+        _reconstruir_con_autoincrement(conn, Visita.__table__, VisitaArchivada.__table__)
+        _reconstruir_con_autoincrement(conn, Evidencia.__table__, EvidenciaArchivada.__table__)
+
+    for index in Visita.__table__.indexes:
+        if index.name in ("ix_visitas_cerradas_cierre", "ix_visitas_sin_salida_entrada"):
+            crear_indice(conn, index)
@@ -0,0 +1,113 @@
+"""Verificación con EXPLAIN de que las consultas calientes usan sus índices.
+
+Compila las mismas sentencias que ejecutan los servicios y revisa el plan del
+motor (SQLite: EXPLAIN QUERY PLAN; Postgres: EXPLAIN con seqscan desactivado,
+para que el resultado no dependa del tamaño de la tabla de prueba).
+
+Además del índice, los listados de una sola tabla deben salir en el orden del
+índice: un nodo Sort (Postgres) o `USE TEMP B-TREE` (SQLite) significa que el
+motor lee y ordena todas las filas que cumplen el filtro antes del LIMIT.
+Los mismos casos corren como pruebas en `tests/test_planes.py`.
+"""
+import re
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+
+from ..models import Evidencia
+from ...services import archivo_service, caseta_service, expiracion_service, visita_service
+from ...utils.paginacion import codificar_cursor
+
+
+def _casos():
+    """(nombre, índice esperado, sentencia, admite ordenar en memoria)."""
+    ahora = datetime.utcnow()
+    cursor = codificar_cursor(ahora, 1000)
+    return [
+        ("listado condominio", "ix_visitas_condominio_vigencia",
+         visita_service.consulta_visitas_condominio("C", cursor=cursor), False),
+        ("listado condominio sin vigencia", "ix_visitas_condominio_vigencia",
+         visita_service.consulta_visitas_condominio("C", cursor=codificar_cursor(None, 1000)), False),
+        ("listado condominio por estado", "ix_visitas_condominio_estado_vigencia",
+         visita_service.consulta_visitas_condominio("C", estado="pendiente"), False),
+        ("listado residente", "ix_visitas_condominio_casa_vigencia",
+         visita_service.consulta_visitas_residente("C", "A-1", cursor=cursor), False),
+        ("listado condominio por casa", "ix_visitas_condominio_casa_vigencia",
+         visita_service.consulta_visitas_condominio("C", casa_unidad="A-1"), False),
+        # La mezcla final ordena a lo más 2 * (limite + 1) filas ya limitadas por tabla
+        ("listado condominio con archivo", "ix_visitas_archivo_condominio_vigencia",
+         visita_service.consulta_visitas_condominio("C", cursor=cursor, incluir_archivadas=True), True),
+        ("redención QR", "ix_visitas_visita_id",
+         visita_service.sentencia_redimir_qr("VIS-x", "tok", ahora), False),
+        ("delta de caseta", "ix_visitas_condominio_actualizado",
+         caseta_service.consulta_delta("C", ahora, 1000, ahora, 100), False),
+        ("expiración de visitas", "ix_visitas_pendientes_vencimiento",
+         expiracion_service.sentencia_expirar(expiracion_service.criterios(ahora)[0], 500), False),
+        ("candidatas a archivo", "ix_visitas_cerradas_cierre",
+         archivo_service.consulta_candidatas(archivo_service.criterios_archivo(ahora)[0], 200), False),
+        ("candidatas a archivo sin salida", "ix_visitas_sin_salida_entrada",
+         archivo_service.consulta_candidatas(archivo_service.criterios_archivo(ahora)[-1], 200), False),
+        ("referencias de archivo", "ix_evidencias_archivo_url",
+         select(func.count(Evidencia.id)).where(Evidencia.archivo_url == "x"), False),
+    ]
+
+
+# Postgres: "Sort" / "Incremental Sort"; SQLite: "USE TEMP B-TREE FOR ORDER BY"
+_ORDENA_RE = re.compile(r"\bSort\b|USE TEMP B-TREE")
+
+
+def ordena_en_memoria(plan: str) -> bool:
+    return bool(_ORDENA_RE.search(plan))
+
+
+def _plan(conn, stmt) -> str:
+    compilado = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    if conn.dialect.name == "sqlite":
+        filas = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compilado}").all()
+        return "\n".join(str(f[-1]) for f in filas)
+    filas = conn.exec_driver_sql(f"EXPLAIN {compilado}").all()
+    return "\n".join(str(f[0]) for f in filas)
+
+
+@contextmanager
+def conexion_explain(engine: Optional[Engine] = None) -> Iterator:
+    """Conexión en una transacción que siempre se revierte, lista para `evaluar`."""
+    if engine is None:
+        from ..connection import engine
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            if conn.dialect.name == "postgresql":
+                conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            yield conn
+        finally:
+            # EXPLAIN de un UPDATE en Postgres no lo ejecuta, pero por si acaso nada se confirma
+            trans.rollback()
+
+
+def evaluar(conn, caso) -> dict:
+    """`{consulta, indice, ok, plan, ordena}` de un caso de `_casos()`.
+
+    `ok` es False si el índice no aparece o si el motor ordena en memoria una
+    consulta que debería salir en el orden del índice.
+    """
+    nombre, indice, stmt, admite_orden = caso
+    plan = _plan(conn, stmt)
+    ordena = ordena_en_memoria(plan)
+    return {
+        "consulta": nombre,
+        "indice": indice,
+        "ok": indice in plan and (admite_orden or not ordena),
+        "ordena": ordena,
+        "plan": plan,
+    }
+
+
+def verificar_planes(engine: Optional[Engine] = None) -> List[dict]:
+    """Devuelve `evaluar(...)` de cada caso."""
+    with conexion_explain(engine) as conn:
+        return [evaluar(conn, caso) for caso in _casos()]
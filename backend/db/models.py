@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index, func, text
 from datetime import datetime
 from .connection import Base
 
@@ -56,6 +56,48 @@ class Visita(Base):
     entrada_registrada_en = Column(DateTime)
     salida_registrada_en = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Última modificación (también en UPDATEs Core): cursor del delta de casetas
+    actualizado_en = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Índices alineados con las consultas de visita_service (ver migración 0002).
+    # Terminan en (vigencia, id) para servir el orden y el keyset de los listados.
+    __table_args__ = (
+        Index("ix_visitas_condominio_vigencia", "condominio_id", "vigencia", "id"),
+        Index("ix_visitas_condominio_casa_vigencia", "condominio_id", "casa_unidad", "vigencia", "id"),
+        Index("ix_visitas_condominio_estado_vigencia", "condominio_id", "estado", "vigencia", "id"),
+        Index("ix_visitas_qr_token", "qr_token"),
+        # Delta de casetas (migración 0004)
+        Index("ix_visitas_condominio_actualizado", "condominio_id", "actualizado_en", "id"),
+        # Barrido de expiración: índice parcial, sólo crece con las pendientes (migración 0005)
+        Index(
+            "ix_visitas_pendientes_vencimiento",
+            "qr_vigencia",
+            "vigencia",
+            sqlite_where=text("estado = 'pendiente'"),
+            postgresql_where=text("estado = 'pendiente'"),
+        ),
+        # Candidatas al archivo frío con entrada y sin salida (migración 0007;
+        # las cerradas usan `ix_visitas_cerradas_cierre`, declarado abajo)
+        Index(
+            "ix_visitas_sin_salida_entrada",
+            "entrada_registrada_en",
+            sqlite_where=text("estado = 'entrada_registrada'"),
+            postgresql_where=text("estado = 'entrada_registrada'"),
+        ),
+        # Los ids de visitas archivadas no se reutilizan (el archivo conserva el id)
+        {"sqlite_autoincrement": True},
+    )
+
+
+# Candidatas al archivo frío (migración 0007): momento de cierre de las visitas
+# cerradas (la salida, o la expiración para las expiradas). Índice de expresión,
+# por eso va fuera de `__table_args__`.
+Index(
+    "ix_visitas_cerradas_cierre",
+    func.coalesce(Visita.salida_registrada_en, Visita.actualizado_en),
+    sqlite_where=text("estado IN ('salida_registrada', 'expirada')"),
+    postgresql_where=text("estado IN ('salida_registrada', 'expirada')"),
+)
 
 
 class Evidencia(Base):
@@ -74,3 +116,67 @@ class Evidencia(Base):
     metadata_json = Column(JSON)
 
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Conteo de referencias del almacén por contenido (evidencia_service.contar_referencias)
+    __table_args__ = (
+        Index("ix_evidencias_archivo_url", "archivo_url"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TokenRevocado(Base):
+    """`jti` de tokens de sesión revocados antes de expirar (ver core/sesion.py)."""
+    __tablename__ = "tokens_revocados"
+    jti = Column(String, primary_key=True)
+    usuario_id = Column(String)
+    expira = Column(DateTime, index=True)
+    revocado_en = Column(DateTime, default=datetime.utcnow)
+
+
+# ------------------------------------------------------------
+# Archivo frío (services/archivo_service.py): mismas columnas que
+# `visitas`/`evidencias`, conservando `id`, más la fecha de archivo.
+# ------------------------------------------------------------
+class VisitaArchivada(Base):
+    __tablename__ = "visitas_archivo"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    visita_id = Column(String, unique=True, index=True)
+    condominio_id = Column(String)
+    nombre_visitante = Column(String)
+    casa_unidad = Column(String)
+    tipo_visita = Column(String)
+    vigencia = Column(DateTime)
+    qr_token = Column(String)
+    qr_vigencia = Column(DateTime)
+    estado = Column(String)
+    entrada_registrada_en = Column(DateTime)
+    salida_registrada_en = Column(DateTime)
+    created_at = Column(DateTime)
+    actualizado_en = Column(DateTime)
+    archivada_en = Column(DateTime, default=datetime.utcnow)
+
+    # Sólo los listados con `incluir_archivadas` (mismo keyset que en `visitas`)
+    __table_args__ = (
+        Index("ix_visitas_archivo_condominio_vigencia", "condominio_id", "vigencia", "id"),
+        Index("ix_visitas_archivo_condominio_casa_vigencia", "condominio_id", "casa_unidad", "vigencia", "id"),
+    )
+
+
+class EvidenciaArchivada(Base):
+    __tablename__ = "evidencias_archivo"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    evidencia_id = Column(String, unique=True, index=True)
+    visita_id = Column(String, index=True)
+    categoria = Column(String)
+    sub_tipo = Column(String)
+    archivo_url = Column(Text)
+    hash_sha256 = Column(Text)
+    guardia_id = Column(String)
+    metadata_json = Column(JSON)
+    created_at = Column(DateTime)
+    archivada_en = Column(DateTime, default=datetime.utcnow)
+
+    # Los blobs archivados siguen referenciados (evidencia_service.contar_referencias)
+    __table_args__ = (
+        Index("ix_evidencias_archivo_archivo_url", "archivo_url"),
+    )
@@ -0,0 +1,169 @@
+"""Contabilidad de SQL por request y log de consultas lentas.
+
+Alternativa de producción a `ECHO_SQL`: en vez de imprimir cada sentencia,
+cada request acumula en un `ContextVar` cuántas consultas hizo y cuánto tiempo
+pasó en la base. El middleware lo publica en:
+
+- headers `X-DB-Queries` / `X-DB-Time-ms` (para respuestas en streaming sólo
+  cuentan las consultas hechas antes de empezar a enviar el cuerpo),
+- una línea del access log (`axs.access`),
+- un warning `axs.sql` si la misma sentencia se repite `N_PLUS_ONE_MIN` veces o
+  más en el mismo request (patrón N+1, p. ej. `SELECT visitas WHERE visita_id=?`
+  dentro de un loop).
+
+Independiente del request, toda sentencia que tarde más de `SLOW_QUERY_MS` se
+escribe en `axs.sql.slow` con los parámetros reemplazados por su tipo.
+
+El contexto se copia a los hilos del threadpool y a la cola de escritura
+SQLite, así que las consultas hechas ahí también cuentan para el request. Por
+eso un mismo `EstadisticasSQL` puede recibir consultas de varios hilos a la vez
+(p. ej. `asyncio.gather` de llamadas al threadpool) y se actualiza bajo lock.
+
+Los totales del proceso (todas las consultas, con o sin request) van al
+registro de `core/metrics.py` como `axs_db_query_duration_seconds`, que ya es
+seguro entre hilos.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from ..core import metrics
+from ..core.config import settings
+
+logger = logging.getLogger("axs.sql")
+slow_logger = logging.getLogger("axs.sql.slow")
+access_logger = logging.getLogger("axs.access")
+
+_ESPACIOS_RE = re.compile(r"\s+")
+
+
+@dataclass
+class EstadisticasSQL:
+    consultas: int = 0
+    tiempo_s: float = 0.0
+    sentencias: Counter = field(default_factory=Counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def registrar(self, statement: str, duracion: float) -> None:
+        with self._lock:
+            self.consultas += 1
+            self.tiempo_s += duracion
+            self.sentencias[statement] += 1
+
+    @property
+    def tiempo_ms(self) -> float:
+        return self.tiempo_s * 1000
+
+    def repetidas(self, minimo: int) -> List[Tuple[str, int]]:
+        """Sentencias ejecutadas `minimo` veces o más (candidatas a N+1)."""
+        with self._lock:
+            comunes = self.sentencias.most_common()
+        return [(sql, n) for sql, n in comunes if n >= minimo]
+
+
+_actual: ContextVar[Optional[EstadisticasSQL]] = ContextVar("axs_sql_stats", default=None)
+
+
+def actuales() -> Optional[EstadisticasSQL]:
+    return _actual.get()
+
+
+def _normalizar(statement: str) -> str:
+    return _ESPACIOS_RE.sub(" ", statement).strip()
+
+
+def _redactar(parameters: Any, executemany: bool = False) -> Any:
+    """Sólo el tipo de cada parámetro: nunca valores (tokens, nombres, documentos)."""
+    if executemany and isinstance(parameters, (list, tuple)):
+        return f"<{len(parameters)} filas>"
+    if isinstance(parameters, dict):
+        return {k: f"<{type(v).__name__}>" for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [f"<{type(v).__name__}>" for v in parameters]
+    return f"<{type(parameters).__name__}>"
+
+
+# ------------------------------------------------------------
+# Eventos del engine
+# ------------------------------------------------------------
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    context._axs_t0 = time.perf_counter()
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    t0 = getattr(context, "_axs_t0", None)
+    if t0 is None:
+        return
+    duracion = time.perf_counter() - t0
+
+    metrics.DB_CONSULTA_DURACION.observe(duracion)
+    stats = _actual.get()
+    if stats is not None:
+        stats.registrar(_normalizar(statement), duracion)
+
+    if duracion * 1000 >= settings.SLOW_QUERY_MS:
+        slow_logger.warning(
+            "Consulta lenta (%.1f ms): %s | params=%s",
+            duracion * 1000,
+            _normalizar(statement),
+            _redactar(parameters, executemany),
+        )
+
+
+def instalar(sync_engine) -> None:
+    """Registrar la contabilidad en un engine síncrono (o `AsyncEngine.sync_engine`)."""
+    if not settings.SQL_STATS_ENABLED:
+        return
+    event.listen(sync_engine, "before_cursor_execute", _antes)
+    event.listen(sync_engine, "after_cursor_execute", _despues)
+
+
+# ------------------------------------------------------------
+# Middleware ASGI
+# ------------------------------------------------------------
+class ContabilidadSQLMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = EstadisticasSQL()
+        token = _actual.set(stats)
+        estado = {"status": 500}
+
+        async def send_con_headers(message):
+            if message["type"] == "http.response.start":
+                estado["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.consultas).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.tiempo_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_con_headers)
+        finally:
+            _actual.reset(token)
+            ruta = getattr(scope.get("route"), "path", None) or scope.get("path", "")
+            for sql, veces in stats.repetidas(settings.N_PLUS_ONE_MIN):
+                logger.warning("Posible N+1 en %s %s: %dx %s", scope["method"], ruta, veces, sql[:300])
+            access_logger.info(
+                "%s %s %s %.1fms db_queries=%d db_ms=%.1f",
+                scope["method"],
+                scope.get("path", ""),
+                estado["status"],
+                (time.perf_counter() - t0) * 1000,
+                stats.consultas,
+                stats.tiempo_ms,
+            )
@@ -0,0 +1,235 @@
+"""Cola de escritura serializada para SQLite (un solo escritor, group commit).
+
+SQLite admite muchos lectores pero un solo escritor. Con varios workers/hilos
+escribiendo a la vez (preregistros, escaneos en caseta) cada transacción
+compite por el lock y paga su propio commit, y bajo carga aparecen
+`database is locked`. Aquí las escrituras calientes se encolan y un único hilo
+las aplica:
+
+- toma lo que haya en la cola (hasta `WRITE_QUEUE_MAX_LOTE` trabajos) y lo
+  ejecuta dentro de una sola transacción `BEGIN IMMEDIATE` con un solo commit;
+- cada trabajo corre en su propio SAVEPOINT, así que si uno falla sólo se
+  deshace ése y el resto del lote se confirma;
+- cada trabajo corre con una copia del `contextvars` de quien lo encoló.
+
+Las lecturas no pasan por aquí: siguen en el pool normal, concurrentes gracias
+a WAL (ver `aplicar_pragmas_sqlite`).
+
+Un trabajo es una función síncrona `fn(db, *args, **kwargs)` que usa la
+`Session` recibida sin hacer commit ni rollback; su valor de retorno es el
+resultado del future (objetos ORM incluidos: la sesión no expira al commit).
+"""
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from ..core import metrics
+from ..core.config import settings
+from . import sql_stats
+from .connection import instalar_perfil_sqlite, pool_medido
+
+logger = logging.getLogger("axs.db.write_queue")
+
+_FIN = object()
+
+
+class _Trabajo:
+    __slots__ = ("fn", "args", "kwargs", "contexto", "futuro")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.contexto = contextvars.copy_context()
+        self.futuro: Future = Future()
+
+
+def crear_engine_escritor(url: Optional[str] = None):
+    """Engine de una sola conexión para el hilo escritor.
+
+    pysqlite abre las transacciones de forma implícita y rompe los SAVEPOINT
+    anidados; aquí se desactiva ese manejo y SQLAlchemy emite `BEGIN IMMEDIATE`,
+    que además toma el lock de escritura al inicio (sin upgrades que fallen a media
+    transacción).
+    """
+    eng = create_engine(
+        url or settings.DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=pool_medido(QueuePool, "escritor"),
+        pool_size=1,
+        max_overflow=0,
+        echo=settings.ECHO_SQL,
+    )
+    instalar_perfil_sqlite(eng)
+    sql_stats.instalar(eng)
+
+    @event.listens_for(eng, "connect")
+    def _sin_transaccion_implicita(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(eng, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return eng
+
+
+class ColaEscritura:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_lote: int = 64,
+        max_espera_s: float = 0.0,
+    ):
+        self._session_factory = session_factory
+        self._max_lote = max(1, max_lote)
+        self._max_espera_s = max(0.0, max_espera_s)
+        self._cola: "queue.Queue[Any]" = queue.Queue()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.lotes = 0
+        self.trabajos = 0
+
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="axs-sqlite-writer", daemon=True)
+                self._hilo.start()
+
+    def detener(self, timeout: Optional[float] = None) -> None:
+        """Procesar lo pendiente y terminar el hilo escritor."""
+        with self._lock:
+            hilo = self._hilo
+            self._hilo = None
+        if hilo is not None and hilo.is_alive():
+            self._cola.put(_FIN)
+            hilo.join(timeout)
+
+    def pendientes(self) -> int:
+        return self._cola.qsize()
+
+    def enviar(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Encolar `fn(db, *args, **kwargs)` y devolver su `Future`."""
+        self.iniciar()
+        trabajo = _Trabajo(fn, args, kwargs)
+        self._cola.put(trabajo)
+        return trabajo.futuro
+
+    # ------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------
+    def _bucle(self) -> None:
+        terminar = False
+        while not terminar:
+            primero = self._cola.get()
+            if primero is _FIN:
+                break
+            lote = [primero]
+            limite = time.monotonic() + self._max_espera_s
+            while len(lote) < self._max_lote:
+                restante = limite - time.monotonic()
+                try:
+                    siguiente = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if siguiente is _FIN:
+                    terminar = True
+                    break
+                lote.append(siguiente)
+            try:
+                self._procesar(lote)
+            except Exception:  # pragma: no cover - _procesar ya resuelve los futures
+                logger.exception("Fallo inesperado en el hilo escritor")
+
+    @staticmethod
+    def _en_savepoint(db: Session, trabajo: _Trabajo) -> Any:
+        with db.begin_nested():
+            return trabajo.fn(db, *trabajo.args, **trabajo.kwargs)
+
+    def _procesar(self, lote: List[_Trabajo]) -> None:
+        hechos = []
+        db = self._session_factory()
+        try:
+            with db.begin():
+                for trabajo in lote:
+                    if not trabajo.futuro.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        # El flush ocurre al cerrar el SAVEPOINT: también dentro del contexto
+                        resultado = trabajo.contexto.run(self._en_savepoint, db, trabajo)
+                    except Exception as exc:
+                        trabajo.futuro.set_exception(exc)
+                    else:
+                        hechos.append((trabajo, resultado))
+        except Exception as exc:
+            # Falló el BEGIN o el COMMIT del lote: nada de lo "hecho" quedó escrito
+            logger.warning("No se pudo confirmar un lote de %d escrituras", len(lote), exc_info=exc)
+            for trabajo, _ in hechos:
+                trabajo.futuro.set_exception(exc)
+            return
+        finally:
+            db.close()
+
+        self.lotes += 1
+        self.trabajos += len(hechos)
+        for trabajo, resultado in hechos:
+            trabajo.futuro.set_result(resultado)
+
+
+# ------------------------------------------------------------
+# Instancia del proceso
+# ------------------------------------------------------------
+_cola: Optional[ColaEscritura] = None
+_engine_escritor = None
+_cola_lock = threading.Lock()
+
+
+def cola_activa() -> bool:
+    return settings.is_sqlite() and settings.SQLITE_WRITE_QUEUE
+
+
+def obtener_cola() -> ColaEscritura:
+    global _cola, _engine_escritor
+    with _cola_lock:
+        if _cola is None:
+            _engine_escritor = crear_engine_escritor()
+            metrics.registrar_engine("escritor", _engine_escritor)
+            fabrica = sessionmaker(bind=_engine_escritor, autoflush=False, expire_on_commit=False)
+            _cola = ColaEscritura(
+                fabrica,
+                max_lote=settings.WRITE_QUEUE_MAX_LOTE,
+                max_espera_s=settings.WRITE_QUEUE_MAX_ESPERA_MS / 1000,
+            )
+        return _cola
+
+
+async def ejecutar_escritura(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Encolar un trabajo de escritura y esperar su resultado sin bloquear el loop."""
+    return await asyncio.wrap_future(obtener_cola().enviar(fn, *args, **kwargs))
+
+
+def _estado_cola():
+    return {(): _cola.pendientes()} if _cola is not None else {}
+
+
+metrics.gauge("axs_write_queue_pending", "Escrituras SQLite esperando al hilo escritor.", (), _estado_cola)
+
+
+def detener_cola() -> None:
+    global _cola, _engine_escritor
+    with _cola_lock:
+        cola, _cola = _cola, None
+        eng, _engine_escritor = _engine_escritor, None
+    if cola is not None:
+        cola.detener()
+    if eng is not None:
+        eng.dispose()
@@ -0,0 +1,232 @@
+"""Verificación de integridad del almacén de evidencias.
+
+Re-hashea los blobs referenciados por `evidencias` y `evidencias_archivo` y
+compara con `hash_sha256`:
+
+    python -m backend.integridad                # sólo lo nuevo o modificado
+    python -m backend.integridad --todo         # todo, ignorando el checkpoint
+
+Los archivos se hashean en paralelo en el pool de procesos (mmap, sin copiar
+a memoria de Python). Cada blob verificado se anota en un checkpoint
+(`INTEGRIDAD_CHECKPOINT`, una tabla SQLite con clave `archivo_url`) con su
+tamaño y `mtime_ns`; la siguiente corrida, o la misma si se interrumpe, omite
+los que siguen iguales y ya estaban bien. Guardar sólo escribe las filas nuevas,
+no el checkpoint entero. Los faltantes, corruptos e ilegibles se escriben en un
+reporte JSON y se vuelven a verificar siempre.
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db.models import Evidencia, EvidenciaArchivada
+from ..utils.hash_tools import sha256_archivo
+from ..utils.procesos import obtener_pool, tamano_pool
+
+logger = logging.getLogger("axs.integridad")
+
+
+@dataclass
+class Blob:
+    archivo_url: str
+    hash_sha256: str
+    evidencias: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Resultado:
+    total: int = 0
+    verificados: int = 0
+    omitidos: int = 0
+    correctos: int = 0
+    faltantes: List[dict] = field(default_factory=list)
+    corruptos: List[dict] = field(default_factory=list)
+    ilegibles: List[dict] = field(default_factory=list)
+    interrumpido: bool = False
+
+    def reporte(self) -> dict:
+        return {
+            "generado_en": datetime.utcnow().isoformat(),
+            "total": self.total,
+            "verificados": self.verificados,
+            "omitidos": self.omitidos,
+            "correctos": self.correctos,
+            "interrumpido": self.interrumpido,
+            "faltantes": self.faltantes,
+            "corruptos": self.corruptos,
+            "ilegibles": self.ilegibles,
+        }
+
+
+# ---------------------------------------------------------
+# Inventario y checkpoint
+# ---------------------------------------------------------
+def inventario(db: Session) -> Dict[str, Blob]:
+    """Blobs referenciados (activos y archivados), agrupando las evidencias que comparten archivo."""
+    blobs: Dict[str, Blob] = {}
+    for modelo in (Evidencia, EvidenciaArchivada):
+        filas = db.execute(
+            select(modelo.archivo_url, modelo.hash_sha256, modelo.evidencia_id)
+            .where(modelo.archivo_url != "", modelo.archivo_url.isnot(None))
+            .execution_options(yield_per=5000)
+        )
+        for archivo_url, hash_sha, evidencia_id in filas:
+            blob = blobs.setdefault(archivo_url, Blob(archivo_url, (hash_sha or "").lower()))
+            blob.evidencias.append(evidencia_id)
+    return blobs
+
+
+def abrir_checkpoint(ruta: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    conn = sqlite3.connect(ruta)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS verificados ("
+        " archivo_url TEXT PRIMARY KEY, hash TEXT, tamano INTEGER, mtime_ns INTEGER,"
+        " ok INTEGER NOT NULL, verificado_en REAL)"
+    )
+    return conn
+
+
+def cargar_checkpoint(conn: sqlite3.Connection) -> Dict[str, dict]:
+    filas = conn.execute("SELECT archivo_url, hash, tamano, mtime_ns, ok FROM verificados")
+    return {
+        url: {"hash": hash_, "tamano": tamano, "mtime_ns": mtime_ns, "ok": bool(ok)}
+        for url, hash_, tamano, mtime_ns, ok in filas
+    }
+
+
+_GUARDAR = (
+    "INSERT INTO verificados (archivo_url, hash, tamano, mtime_ns, ok, verificado_en)"
+    " VALUES (?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (archivo_url) DO UPDATE SET hash = excluded.hash, tamano = excluded.tamano,"
+    " mtime_ns = excluded.mtime_ns, ok = excluded.ok, verificado_en = excluded.verificado_en"
+)
+
+
+def _escribir_json(ruta: str, datos) -> None:
+    """Escritura atómica: un corte a medio guardar no deja un JSON truncado."""
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix=".part")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(datos, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _sin_cambios(blob: Blob, previo: Optional[dict]) -> bool:
+    """Verificado antes con éxito y el archivo no cambió de tamaño ni de mtime."""
+    if not previo or not previo.get("ok") or previo.get("hash") != blob.hash_sha256:
+        return False
+    try:
+        st = os.stat(blob.archivo_url)
+    except OSError:
+        return False
+    return st.st_size == previo.get("tamano") and st.st_mtime_ns == previo.get("mtime_ns")
+
+
+# ---------------------------------------------------------
+# Verificación
+# ---------------------------------------------------------
+def verificar(
+    blobs: Dict[str, Blob],
+    checkpoint_path: str,
+    todo: bool = False,
+    guardar_cada: int = 500,
+    progreso: Optional[Callable[[Resultado], None]] = None,
+) -> Resultado:
+    """Re-hashear los blobs pendientes y actualizar el checkpoint sobre la marcha.
+
+    Ante `KeyboardInterrupt` confirma lo verificado hasta ahí y lo devuelve con
+    `interrumpido=True`; la siguiente corrida continúa desde ese punto.
+    """
+    conn = abrir_checkpoint(checkpoint_path)
+    try:
+        return _verificar(conn, blobs, todo, guardar_cada, progreso)
+    finally:
+        conn.close()
+
+
+def _verificar(conn, blobs, todo, guardar_cada, progreso) -> Resultado:
+    checkpoint = cargar_checkpoint(conn)
+    resultado = Resultado(total=len(blobs))
+
+    pendientes = []
+    for blob in blobs.values():
+        if not todo and _sin_cambios(blob, checkpoint.get(blob.archivo_url)):
+            resultado.omitidos += 1
+        else:
+            pendientes.append(blob.archivo_url)
+
+    # Sólo se conservan en el checkpoint los blobs que siguen referenciados
+    obsoletos = [(url,) for url in checkpoint if url not in blobs]
+    with conn:
+        conn.executemany("DELETE FROM verificados WHERE archivo_url = ?", obsoletos)
+    logger.info("%d blobs referenciados, %d por verificar", len(blobs), len(pendientes))
+
+    chunksize = max(1, min(64, len(pendientes) // (4 * tamano_pool())))
+    try:
+        for ruta, obtenido, tamano, mtime_ns, error in obtener_pool().map(
+            sha256_archivo, pendientes, chunksize=chunksize
+        ):
+            blob = blobs[ruta]
+            resultado.verificados += 1
+            ok = obtenido == blob.hash_sha256
+            if error is not None:
+                resultado.ilegibles.append({"archivo_url": ruta, "error": error, "evidencias": blob.evidencias})
+            elif obtenido is None:
+                resultado.faltantes.append(
+                    {"archivo_url": ruta, "hash_sha256": blob.hash_sha256, "evidencias": blob.evidencias}
+                )
+            elif not ok:
+                resultado.corruptos.append(
+                    {"archivo_url": ruta, "esperado": blob.hash_sha256, "obtenido": obtenido, "evidencias": blob.evidencias}
+                )
+            else:
+                resultado.correctos += 1
+            conn.execute(_GUARDAR, (ruta, blob.hash_sha256, tamano, mtime_ns, ok, time.time()))
+            if resultado.verificados % guardar_cada == 0:
+                conn.commit()
+                if progreso:
+                    progreso(resultado)
+    except KeyboardInterrupt:
+        resultado.interrumpido = True
+    finally:
+        conn.commit()
+    return resultado
+
+
+def ejecutar(
+    db: Session,
+    checkpoint_path: Optional[str] = None,
+    reporte_path: Optional[str] = None,
+    todo: bool = False,
+    progreso: Optional[Callable[[Resultado], None]] = None,
+) -> Resultado:
+    """Inventario + verificación + reporte JSON."""
+    checkpoint_path = checkpoint_path or settings.INTEGRIDAD_CHECKPOINT
+    resultado = verificar(inventario(db), checkpoint_path, todo=todo, progreso=progreso)
+    reporte_path = reporte_path or str(
+        Path(checkpoint_path).parent / f"integridad_{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    )
+    _escribir_json(reporte_path, resultado.reporte())
+    logger.info(
+        "Integridad: %d verificados, %d omitidos, %d faltantes, %d corruptos, %d ilegibles -> %s",
+        resultado.verificados, resultado.omitidos, len(resultado.faltantes), len(resultado.corruptos),
+        len(resultado.ilegibles), reporte_path,
+    )
+    return resultado
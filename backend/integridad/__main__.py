@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+from . import ejecutar
+from ..core.config import settings
+from ..db.connection import SessionLocal
+from ..utils.procesos import cerrar_pool
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.integridad")
+    parser.add_argument("--todo", action="store_true", help="ignorar el checkpoint y verificar todo")
+    parser.add_argument("--workers", type=int, default=0, help="procesos (0 = PROCESS_POOL_WORKERS / CPUs)")
+    parser.add_argument("--checkpoint", default=None, help="ruta del checkpoint (INTEGRIDAD_CHECKPOINT)")
+    parser.add_argument("--reporte", default=None, help="ruta del reporte JSON")
+    parser.add_argument(
+        "--huerfanos", action="store_true",
+        help="en lugar de verificar, borrar los archivos sin evidencias (respeta EVIDENCIA_GC_GRACIA_S)",
+    )
+    parser.add_argument(
+        "--derivados", action="store_true",
+        help="en lugar de verificar, generar las miniaturas que falten (o que fallaron)",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.workers:
+        settings.PROCESS_POOL_WORKERS = args.workers
+
+    def progreso(r):
+        print(
+            f"  {r.verificados} verificados ({len(r.faltantes)} faltantes, "
+            f"{len(r.corruptos)} corruptos, {len(r.ilegibles)} ilegibles)"
+        )
+
+    if args.derivados:
+        from ..services.evidencia_service import rellenar_derivados
+
+        try:
+            print(f"{asyncio.run(rellenar_derivados())} evidencias con derivados generados")
+        finally:
+            cerrar_pool()
+        return 0
+
+    if args.huerfanos:
+        from ..services.evidencia_service import recolectar_huerfanos
+
+        db = SessionLocal()
+        try:
+            print(f"{recolectar_huerfanos(db)} archivos huérfanos borrados")
+        finally:
+            db.close()
+        return 0
+
+    db = SessionLocal()
+    try:
+        resultado = ejecutar(db, args.checkpoint, args.reporte, todo=args.todo, progreso=progreso)
+    finally:
+        db.close()
+        cerrar_pool()
+
+    if resultado.interrumpido:
+        print("Interrumpido: el checkpoint guarda lo verificado, la próxima corrida continúa")
+        return 130
+    return 1 if resultado.faltantes or resultado.corruptos or resultado.ilegibles else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,123 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response
+from starlette.concurrency import run_in_threadpool
 import logging
 import os
 
-from .db.connection import Base, engine
 from .routers import (
+    auth_router,
+    casetas_router,
     visitas_router,
     qr_router,
     evidencias_router,
     preregistro_router,
 )
 
+from .core import metrics
 from .core.config import settings
 
 logger = logging.getLogger("axs.startup")
 
-app = FastAPI(title="AX-S MSP API")
 
 # ============================================================
-#   Inicialización de Base de Datos
+#   Arranque / apagado
 # ============================================================
 
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables checked/created successfully")
-except Exception as exc:
-    logger.warning("No se pudo crear/verificar tablas en la DB (se omite create_all)", exc_info=exc)
+# Importar este módulo no toca la base ni carga qrcode/PIL/passlib: eso queda
+# para el primer uso o para este hook, que corre una vez por worker.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sin llavero válido (AUTH_KEYS) el worker no arranca: las firmas de QR y
+    # sesiones deben valer igual en todos los workers y entre reinicios
+    from .core.firmas import llavero
+
+    llavero()
+
+    # El esquema se gestiona con migraciones versionadas aplicadas por comando
+    # explícito (`python -m backend.db.migrations upgrade`), no en cada arranque
+    # de worker. AUTO_MIGRATE=true las aplica aquí (sólo para desarrollo local).
+    if settings.AUTO_MIGRATE:
+        try:
+            from .db.migrations import upgrade as aplicar_migraciones
+
+            aplicadas = await run_in_threadpool(aplicar_migraciones)
+            logger.info("Migraciones aplicadas al arrancar: %s", aplicadas or "ninguna pendiente")
+        except Exception as exc:
+            logger.warning("No se pudieron aplicar migraciones al arrancar", exc_info=exc)
+
+    if settings.STARTUP_PREWARM:
+        from .core.arranque import precalentar
+
+        await run_in_threadpool(precalentar)
+
+        # El engine async vive en este event loop: se abre aquí y no en el threadpool
+        try:
+            from sqlalchemy import text
+            from .db.connection import get_async_engine
+
+            async with get_async_engine().connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        except Exception as exc:
+            logger.warning("No se pudo precalentar el engine async", exc_info=exc)
+
+    # Lista de revocación de tokens: recarga periódica, fuera del camino del request
+    from .services.auth_service import refrescar_revocados_periodicamente
+
+    tareas = [asyncio.create_task(refrescar_revocados_periodicamente())]
+
+    # Visitas pendientes ya vencidas -> 'expirada' (seguro con varios workers)
+    if settings.EXPIRACION_ENABLED:
+        from .services.expiracion_service import barrer_periodicamente
+
+        tareas.append(asyncio.create_task(barrer_periodicamente()))
+
+    # Visitas cerradas hace más de ARCHIVO_DIAS -> tablas de archivo
+    if settings.ARCHIVO_ENABLED:
+        from .services.archivo_service import archivar_periodicamente
+
+        tareas.append(asyncio.create_task(archivar_periodicamente()))
+
+    yield
+
+    for tarea in tareas:
+        tarea.cancel()
+
+    # Miniaturas en curso: necesitan la cola de escritura y el pool de procesos
+    from .services.evidencia_service import esperar_derivados
+
+    await esperar_derivados(settings.DERIVADOS_APAGADO_S)
+
+    from .db.connection import cerrar_async_engine
+    from .db.write_queue import detener_cola
+    from .utils.procesos import cerrar_pool
+
+    # Vaciar la cola de escritura antes de cerrar conexiones
+    await run_in_threadpool(detener_cola)
+    await cerrar_async_engine()
+    cerrar_pool(wait=False)
+
+
+app = FastAPI(title="AX-S MSP API", lifespan=lifespan)
+
+if settings.SQL_STATS_ENABLED:
+    from .db.sql_stats import ContabilidadSQLMiddleware
+
+    app.add_middleware(ContabilidadSQLMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricasMiddleware)
 
 
 # ============================================================
 #   Routers
 # ============================================================
 
+app.include_router(auth_router.router)
 app.include_router(visitas_router.router)
 app.include_router(qr_router.router)
 app.include_router(evidencias_router.router)
 app.include_router(preregistro_router.router)
+app.include_router(casetas_router.router)
 
 
 # ============================================================
@@ -51,6 +134,17 @@ def debug_db():
     }
 
 
+# ============================================================
+#   Métricas (Prometheus)
+# ============================================================
+
+@app.get("/metrics", include_in_schema=False)
+def metricas():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(404, "Not Found")
+    return Response(metrics.exponer(), media_type=metrics.CONTENT_TYPE)
+
+
 # ============================================================
 #   Root
 # ============================================================
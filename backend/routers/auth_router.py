@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from ..core import sesion
+from ..core.dependencies import get_db, token_bearer
+from ..schemas.auth import LoginRequest, TokenResponse
+from ..services import auth_service
+
+router = APIRouter(prefix="/auth", tags=["Auth"])
+
+
+# ---------------------------------------------------------
+# Login: verifica la contraseña una vez y emite un token firmado
+# ---------------------------------------------------------
+@router.post("/login", response_model=TokenResponse)
+def login(data: LoginRequest, db: Session = Depends(get_db)):
+    principal = auth_service.autenticar(db, data.usuario, data.password)
+    if principal is None:
+        raise HTTPException(401, "Credenciales inválidas")
+
+    token, payload = sesion.emitir_token(principal)
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "expires_in": payload["exp"] - payload["iat"],
+        "usuario_id": principal.usuario_id,
+        "rol": principal.rol,
+    }
+
+
+# ---------------------------------------------------------
+# Logout: revocar el token actual
+# ---------------------------------------------------------
+@router.post("/logout")
+def logout(token: str | None = Depends(token_bearer), db: Session = Depends(get_db)):
+    if token is None:
+        raise HTTPException(401, "No autenticado")
+    try:
+        payload = sesion.leer_token(token)
+    except sesion.TokenInvalido as exc:
+        raise HTTPException(401, str(exc))
+
+    auth_service.revocar(db, payload)
+    return {"status": "ok"}
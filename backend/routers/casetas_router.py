@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..core.config import settings
+from ..core.dependencies import get_db, get_usuario_actual
+from ..core.security import verificar_rol
+from ..schemas.caseta import CasetaSync
+from ..services import caseta_service
+from ..utils.paginacion import CursorInvalido
+
+router = APIRouter(prefix="/casetas", tags=["Casetas"])
+
+
+def _caseta_autorizada(db: Session, caseta_id: str, usuario):
+    verificar_rol(usuario, ["GUARDIA", "ADMIN_CONDOMINIO"])
+    caseta = caseta_service.obtener_caseta(db, caseta_id)
+    if not caseta:
+        raise HTTPException(404, "Caseta no encontrada")
+    if caseta.condominio_id != usuario.condominio_id:
+        raise HTTPException(403, "No autorizado para esta caseta")
+    return caseta
+
+
+# ---------------------------------------------------------
+# Snapshot inicial: visitas pendientes con QR vigente
+# ---------------------------------------------------------
+@router.get("/{caseta_id}/snapshot", response_model=CasetaSync)
+def snapshot_caseta(
+    caseta_id: str,
+    db: Session = Depends(get_db),
+    usuario = Depends(get_usuario_actual),
+):
+    caseta = _caseta_autorizada(db, caseta_id, usuario)
+    return caseta_service.snapshot(db, caseta.condominio_id)
+
+
+# ---------------------------------------------------------
+# Delta desde el cursor del último snapshot/delta
+# ---------------------------------------------------------
+@router.get("/{caseta_id}/delta", response_model=CasetaSync)
+def delta_caseta(
+    caseta_id: str,
+    cursor: str,
+    limite: Optional[int] = Query(None, ge=1, le=settings.CASETA_DELTA_MAX),
+    db: Session = Depends(get_db),
+    usuario = Depends(get_usuario_actual),
+):
+    caseta = _caseta_autorizada(db, caseta_id, usuario)
+    try:
+        return caseta_service.delta(db, caseta.condominio_id, cursor, limite)
+    except CursorInvalido as exc:
+        raise HTTPException(400, str(exc))
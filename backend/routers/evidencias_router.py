@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, File, UploadFile
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Response, UploadFile
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
+from ..core.config import settings
 from ..core.dependencies import get_db, get_usuario_actual
 from ..core.security import verificar_rol
-from ..services.evidencia_service import guardar_evidencias_opcionales
+from ..services.evidencia_service import guardar_evidencias_opcionales_async, obtener_evidencia_y_condominio
+from ..utils.file_storage import ArchivoDemasiadoGrande, ruta_servible
+from ..utils.http import etag_coincide
+from pathlib import Path
+from typing import Literal, Optional
+import mimetypes
 
 router = APIRouter(prefix="/evidencias", tags=["Evidencias"]) 
 
 
 @router.post("/entrada/{visita_id}")
-def evidencias_entrada(
+async def evidencias_entrada(
     visita_id: str,
     foto_visitante: UploadFile | None = File(None),
     ine_frente: UploadFile | None = File(None),
@@ -30,12 +37,77 @@ def evidencias_entrada(
         "documento": documento,
     }
 
-    registros = guardar_evidencias_opcionales(
-        db,
-        visita_id=visita_id,
-        guardia_id=usuario.usuario_id,
-        categoria="entrada",
-        archivos=archivos,
-    )
+    try:
+        registros = await guardar_evidencias_opcionales_async(
+            db,
+            visita_id=visita_id,
+            guardia_id=usuario.usuario_id,
+            categoria="entrada",
+            archivos=archivos,
+        )
+    except ArchivoDemasiadoGrande as exc:
+        raise HTTPException(413, str(exc))
 
     return {"status": "ok", "evidencias": len(registros)}
+
+
+# ---------------------------------------------------------
+# Descargar evidencia (original o miniatura)
+# ---------------------------------------------------------
+@router.get("/{evidencia_id}/archivo")
+def descargar_evidencia(
+    evidencia_id: str,
+    variante: Literal["original", "small", "medium"] = "original",
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    usuario = Depends(get_usuario_actual),
+):
+    """Archivo de la evidencia con `ETag` = SHA-256 del contenido.
+
+    El blob es inmutable (direccionado por contenido): `If-None-Match` responde
+    304 sin tocar el disco, y `Range` / `If-Range` permiten reanudar descargas.
+    Con `EVIDENCIA_X_ACCEL_PREFIX` el envío lo hace nginx; si no, `FileResponse`
+    lo transmite por bloques (o con `sendfile` si el servidor ASGI ofrece `pathsend`).
+    """
+    verificar_rol(usuario, ["ADMIN_CONDOMINIO", "GUARDIA"])
+    encontrada = obtener_evidencia_y_condominio(db, evidencia_id)
+    if encontrada is None:
+        raise HTTPException(404, "Evidencia no encontrada")
+    evidencia, condominio_id = encontrada
+    if condominio_id != usuario.condominio_id:
+        raise HTTPException(403, "No autorizado para esta evidencia")
+
+    metadata = evidencia.metadata_json or {}
+    if variante == "original":
+        archivo_url = evidencia.archivo_url
+        filename = metadata.get("filename") or evidencia_id
+        media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        etag = f'"{evidencia.hash_sha256}"'
+    else:
+        archivo_url = (metadata.get("derivados") or {}).get(variante, {}).get("archivo_url")
+        filename = f"{Path(metadata.get('filename') or evidencia_id).stem}.{variante}.jpg"
+        media_type = "image/jpeg"
+        etag = f'"{evidencia.hash_sha256}.{variante}"'
+    if not archivo_url or not evidencia.hash_sha256:
+        raise HTTPException(404, "Archivo no disponible")
+
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if etag_coincide(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    ruta = ruta_servible(archivo_url)
+    if ruta is None:
+        raise HTTPException(404, "Archivo no disponible")
+
+    if settings.EVIDENCIA_X_ACCEL_PREFIX:
+        relativa = ruta.relative_to(Path(settings.UPLOAD_DIR).resolve()).as_posix()
+        headers["X-Accel-Redirect"] = settings.EVIDENCIA_X_ACCEL_PREFIX.rstrip("/") + "/" + relativa
+        return Response(media_type=media_type, headers=headers)
+
+    return FileResponse(
+        ruta,
+        media_type=media_type,
+        headers=headers,
+        filename=filename,
+        content_disposition_type="inline",
+    )
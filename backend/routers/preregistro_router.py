@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..core.dependencies import get_db, get_usuario_actual
+from starlette.concurrency import run_in_threadpool
+from ..core.dependencies import get_async_db, get_usuario_actual
 from ..core.security import verificar_rol
 from ..services import visita_service, qr_service
 from ..schemas.preregistro import PreregistroCreate
@@ -15,43 +15,45 @@ router = APIRouter(prefix="/preregistro", tags=["Preregistro"])
 
 
 @router.post("/crear")
-def crear_preregistro(
+async def crear_preregistro(
     data: PreregistroCreate,
-    db: Session = Depends(get_db),
+    incluir_base64: bool = True,
+    db = Depends(get_async_db),
     usuario = Depends(get_usuario_actual),
 ):
     verificar_rol(usuario, ["RESIDENTE"])
 
     try:
-        # Crear visita y persistir metadata opcional como evidencia
-        visita = visita_service.crear_desde_preregistro(db, data, usuario)
+        # Token QR generado antes del INSERT: visita, metadata y QR en una sola transacción
+        visita = await visita_service.crear_desde_preregistro_async(db, data, usuario)
+        token, qr_vigencia = visita.qr_token, visita.qr_vigencia
 
-        # Generar QR y guardar token/vigencia en la visita
-        qr_data = qr_service.generar_qr_para_visita(visita.visita_id)
-        visita_service.actualizar_qr(db, visita.visita_id, qr_data["token"], qr_data["qr_vigencia"])
-
-        return {
+        respuesta = {
             "status": "ok",
             "visita_id": visita.visita_id,
-            "qr_base64": base64.b64encode(qr_data["qr_bytes"]).decode(),
-            "qr_vigencia": qr_data["qr_vigencia"],
+            "qr_url": f"/qr/imagen/{visita.visita_id}",
+            "qr_vigencia": qr_vigencia,
         }
+        if incluir_base64:
+            # Render CPU-bound fuera del event loop
+            png = await run_in_threadpool(qr_service.renderizar_qr, visita.visita_id, token)
+            respuesta["qr_base64"] = base64.b64encode(png).decode()
+        return respuesta
     except Exception as exc:
         logger.exception("Failed to create preregistro")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error creando preregistro") from exc
 
 
 @router.get("/qr/{visita_id}")
-def reenviar_qr(
+async def reenviar_qr(
     visita_id: str,
-    db: Session = Depends(get_db),
+    incluir_base64: bool = True,
+    db = Depends(get_async_db),
     usuario = Depends(get_usuario_actual),
 ):
     verificar_rol(usuario, ["RESIDENTE"])
 
-    from ..db.models import Visita
-
-    visita = db.query(Visita).filter(Visita.visita_id == visita_id).first()
+    visita = await visita_service.obtener_visita_async(db, visita_id)
     if not visita:
         raise HTTPException(404, "Visita no encontrada")
 
@@ -59,29 +61,19 @@ def reenviar_qr(
     if getattr(usuario, "condominio_id", None) != visita.condominio_id:
         raise HTTPException(403, "No autorizado para esta visita")
 
-    # Si el QR no existe o está expirado, regenerar
-    if not visita.qr_token or not visita.qr_vigencia or visita.qr_vigencia < datetime.utcnow():
-        qr_data = qr_service.generar_qr_para_visita(visita.visita_id)
-        visita_service.actualizar_qr(db, visita.visita_id, qr_data["token"], qr_data["qr_vigencia"])
-    else:
-        # Construir el QR actual
-        remaining_minutes = max(
-            int((visita.qr_vigencia - datetime.utcnow()).total_seconds() / 60),
-            1
-        )
-        img_blob = qr_service.generar_qr_para_visita(
-            visita.visita_id,
-            minutos_vigencia=remaining_minutes
-        )
-        qr_data = {
-            "token": visita.qr_token,
-            "qr_vigencia": visita.qr_vigencia,
-            "qr_bytes": img_blob["qr_bytes"]
-        }
+    # Si el QR no existe o está expirado, regenerar; si no, reenviar el token almacenado
+    token, qr_vigencia = visita.qr_token, visita.qr_vigencia
+    if not token or not qr_vigencia or qr_vigencia < datetime.utcnow():
+        token, qr_vigencia = qr_service.nuevo_token(visita.visita_id)
+        await visita_service.actualizar_qr_async(db, visita.visita_id, token, qr_vigencia)
 
-    return {
+    respuesta = {
         "status": "ok",
         "visita_id": visita_id,
-        "qr_base64": base64.b64encode(qr_data["qr_bytes"]).decode(),
-        "qr_vigencia": qr_data["qr_vigencia"],
+        "qr_url": f"/qr/imagen/{visita_id}",
+        "qr_vigencia": qr_vigencia,
     }
+    if incluir_base64:
+        png = await run_in_threadpool(qr_service.renderizar_qr, visita.visita_id, token)
+        respuesta["qr_base64"] = base64.b64encode(png).decode()
+    return respuesta
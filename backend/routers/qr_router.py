@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 import logging
 from sqlalchemy.orm import Session
-from ..core.dependencies import get_db, get_usuario_actual
+from ..core.config import settings
+from ..core.dependencies import get_async_db, get_db, get_usuario_actual
 from ..core.security import verificar_rol
 from ..db.models import Visita
 from ..services import qr_service, visita_service
+from ..utils.http import etag_coincide
 import base64
 from datetime import datetime
+from typing import TYPE_CHECKING, Literal, Optional
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("axs.qr")
 
 router = APIRouter(prefix="/qr", tags=["QR"]) 
 
@@ -14,6 +22,7 @@ router = APIRouter(prefix="/qr", tags=["QR"])
 @router.post("/generar/{visita_id}")
 def generar_qr(
     visita_id: str,
+    incluir_base64: bool = True,
     db: Session = Depends(get_db),
     usuario = Depends(get_usuario_actual),
 ):
@@ -25,51 +34,108 @@ def generar_qr(
     qr_data = qr_service.generar_qr_para_visita(visita_id)
     visita_service.actualizar_qr(db, visita_id, qr_data["token"], qr_data["qr_vigencia"])
 
-    return {
+    respuesta = {
         "status": "ok",
         "visita_id": visita_id,
-        "qr_base64": base64.b64encode(qr_data["qr_bytes"]).decode(),
+        "qr_url": f"/qr/imagen/{visita_id}",
         "qr_vigencia": qr_data["qr_vigencia"],
     }
+    if incluir_base64:
+        respuesta["qr_base64"] = base64.b64encode(qr_data["qr_bytes"]).decode()
+    return respuesta
+
+
+@router.get("/imagen/{visita_id}")
+def imagen_qr(
+    visita_id: str,
+    formato: Literal["png", "svg"] = "png",
+    box_size: int = Query(10, ge=1, le=40),
+    border: int = Query(4, ge=0, le=16),
+    ecc: Literal["L", "M", "Q", "H"] = "M",
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    usuario = Depends(get_usuario_actual),
+):
+    """Imagen binaria del QR vigente (PNG o SVG) con ETag/Cache-Control.
+
+    El ETag depende del token y de las opciones de render, así que el cliente
+    recibe 304 mientras el token no rote.
+    """
+    verificar_rol(usuario, ["ADMIN_CONDOMINIO", "RESIDENTE"])
+    visita = db.query(Visita).filter(Visita.visita_id == visita_id).first()
+    if not visita:
+        raise HTTPException(404, "Visita no encontrada")
+    if getattr(usuario, "condominio_id", None) != visita.condominio_id:
+        raise HTTPException(403, "No autorizado para esta visita")
+
+    ahora = datetime.utcnow()
+    if not visita.qr_token or not visita.qr_vigencia or visita.qr_vigencia < ahora:
+        raise HTTPException(404, "QR no generado o expirado")
+
+    etag = qr_service.etag_qr(visita_id, visita.qr_token, formato, box_size, border, ecc)
+    max_age = int((visita.qr_vigencia - ahora).total_seconds())
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+    if etag_coincide(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    contenido = qr_service.renderizar_qr(
+        visita_id, visita.qr_token, formato=formato, box_size=box_size, border=border, ecc=ecc
+    )
+    return Response(content=contenido, media_type=qr_service.FORMATOS_QR[formato], headers=headers)
 
 
 @router.get("/validar/{visita_id}/{token}")
-def validar_qr(
+async def validar_qr(
     visita_id: str,
     token: str,
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     usuario = Depends(get_usuario_actual),
 ):
-    from ..db.models import Visita
-    from datetime import datetime
     verificar_rol(usuario, ["GUARDIA"])
 
-    logger = logging.getLogger("axs.qr")
-    verificar_rol(usuario, ["GUARDIA"])
+    # QR firmado: falsificados y vencidos se rechazan en memoria, sin ir a la base
+    if qr_service.es_token_firmado(token):
+        try:
+            qr_service.verificar_token(visita_id, token)
+        except qr_service.QRExpirado:
+            logger.info("QR expired", extra={"visita_id": visita_id})
+            raise HTTPException(400, "QR expirado")
+        except qr_service.QRInvalido:
+            logger.warning("QR validation failed: bad signature", extra={"visita_id": visita_id, "user": getattr(usuario, "usuario_id", None)})
+            raise HTTPException(400, "QR inválido")
+    elif not settings.QR_LEGACY_TOKENS:
+        raise HTTPException(400, "QR inválido")
 
-    visita = db.query(Visita).filter(Visita.visita_id == visita_id).first()
+    # Camino feliz: un solo UPDATE condicional decide el resultado (uso único)
+    visita = await visita_service.redimir_qr_async(db, visita_id, token)
+    if visita is None:
+        await _rechazo_qr(db, visita_id, token, usuario)
+
+    return {
+        "status": "aprobado",
+        "visita_id": visita_id,
+        "nombre_visitante": visita["nombre_visitante"],
+        "casa_unidad": visita["casa_unidad"],
+        "condominio_id": visita["condominio_id"],
+    }
+
+
+async def _rechazo_qr(db: "AsyncSession", visita_id: str, token: str, usuario):
+    """Averiguar por qué no se pudo redimir el QR y lanzar el error correspondiente."""
+    visita = await visita_service.obtener_visita_async(db, visita_id)
     if not visita:
         logger.warning("QR validation failed: visita no encontrada", extra={"visita_id": visita_id, "user": getattr(usuario, "usuario_id", None)})
         raise HTTPException(404, "Visita no encontrada")
 
     if visita.qr_token != token:
-        logger.warning("QR validation failed: token mismatch", extra={"visita_id": visita_id, "expected": visita.qr_token, "provided": token})
+        # Nunca el token esperado (ni el recibido): quien lee los logs podría redimirlo
+        logger.warning("QR validation failed: token mismatch", extra={"visita_id": visita_id, "user": getattr(usuario, "usuario_id", None)})
         raise HTTPException(400, "QR inválido")
 
     if not visita.qr_vigencia or visita.qr_vigencia < datetime.utcnow():
         logger.info("QR expired", extra={"visita_id": visita_id, "qr_vigencia": visita.qr_vigencia})
         raise HTTPException(400, "QR expirado")
 
-    if visita.estado in ["entrada_registrada", "salida_registrada"]:
-        logger.warning("QR already used", extra={"visita_id": visita_id, "estado": visita.estado})
-        raise HTTPException(400, "QR ya utilizado")
-
-    visita_service.registrar_entrada(db, visita_id)
-
-    return {
-        "status": "aprobado",
-        "visita_id": visita_id,
-        "nombre_visitante": visita.nombre_visitante,
-        "casa_unidad": visita.casa_unidad,
-        "condominio_id": visita.condominio_id,
-    }
+    # Ya no está pendiente (incluye perder la carrera contra otra caseta)
+    logger.warning("QR already used", extra={"visita_id": visita_id, "estado": visita.estado})
+    raise HTTPException(400, "QR ya utilizado")
@@ -1,14 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from ..core.dependencies import get_db, get_usuario_actual
+from ..core.config import settings
+from ..core.dependencies import get_async_db, get_db, get_usuario_actual
 from ..core.security import verificar_rol
-from ..services import visita_service
-from ..schemas.visita import VisitaCreate, VisitaResponse
-from typing import List
+from ..services import visita_service, qr_service
+from ..schemas.visita import (
+    EventoCaseta,
+    EventosLote,
+    EventosLoteResponse,
+    ResultadoEvento,
+    VisitaCreate,
+    VisitaLoteCreate,
+    VisitaPagina,
+    VisitaResponse,
+)
+from ..utils.paginacion import CursorInvalido
+from datetime import datetime
+from typing import Literal, Optional
+import base64
+import json
+import zipfile
 
 router = APIRouter(prefix="/visitas", tags=["Visitas"])
 
 
+def _verificar_condominio(usuario, condominio_id: str) -> None:
+    """El administrador sólo crea visitas en su propio condominio."""
+    if getattr(usuario, "condominio_id", None) != condominio_id:
+        raise HTTPException(403, "No autorizado para este condominio")
+
+
 # ---------------------------------------------------------
 # Crear visita (solo Administración del condominio)
 # ---------------------------------------------------------
@@ -19,6 +41,7 @@ def crear_visita(
     usuario = Depends(get_usuario_actual),
 ):
     verificar_rol(usuario, ["ADMIN_CONDOMINIO"])
+    _verificar_condominio(usuario, data.condominio_id)
     visita = visita_service.crear_visita(
         db,
         data,
@@ -29,35 +52,191 @@ def crear_visita(
 
 
 # ---------------------------------------------------------
-# Listar visitas del residente
+# Crear visitas en lote + QR (eventos, entregas, cuadrillas)
 # ---------------------------------------------------------
-@router.get("/mis-visitas", response_model=List[VisitaResponse])
-def mis_visitas(
+@router.post("/lote")
+def crear_visitas_lote(
+    data: VisitaLoteCreate,
+    formato: Literal["ndjson", "zip"] = "ndjson",
     db: Session = Depends(get_db),
     usuario = Depends(get_usuario_actual),
 ):
-    verificar_rol(usuario, ["RESIDENTE"])
-    visitas = visita_service.obtener_visitas_residente(
+    verificar_rol(usuario, ["ADMIN_CONDOMINIO"])
+    _verificar_condominio(usuario, data.condominio_id)
+    if not data.visitas:
+        raise HTTPException(400, "El lote no contiene visitas")
+    if len(data.visitas) > settings.VISITAS_LOTE_MAX:
+        raise HTTPException(413, f"Máximo {settings.VISITAS_LOTE_MAX} visitas por lote")
+
+    filas = visita_service.crear_visitas_lote(
         db,
-        condominio_id=usuario.condominio_id,
-        casa_unidad=usuario.casa_unidad,
+        data.visitas,
+        condominio_id=data.condominio_id,
+        minutos_vigencia_qr=data.minutos_vigencia_qr,
     )
-    return visitas
+    pngs = qr_service.renderizar_qr_lote([(f["visita_id"], f["qr_token"]) for f in filas])
+
+    if formato == "zip":
+        return StreamingResponse(
+            _stream_zip(filas, pngs),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="visitas_qr.zip"'},
+        )
+    return StreamingResponse(_stream_ndjson(filas, pngs), media_type="application/x-ndjson")
+
+
+def _resumen_lote(fila: dict) -> dict:
+    return {
+        "visita_id": fila["visita_id"],
+        "nombre_visitante": fila["nombre_visitante"],
+        "casa_unidad": fila["casa_unidad"],
+        "qr_vigencia": fila["qr_vigencia"].isoformat(),
+    }
+
+
+def _stream_ndjson(filas, pngs):
+    for fila, png in zip(filas, pngs):
+        linea = {**_resumen_lote(fila), "qr_base64": base64.b64encode(png).decode()}
+        yield json.dumps(linea, ensure_ascii=False) + "\n"
+
+
+class _ZipChunks:
+    """Destino no-seekable para `zipfile`: acumula lo escrito hasta el siguiente yield."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _stream_zip(filas, pngs):
+    out = _ZipChunks()
+    # PNG ya está comprimido: ZIP_STORED evita gastar CPU en deflate
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for fila, png in zip(filas, pngs):
+            zf.writestr(f"{fila['visita_id']}.png", png)
+            yield out.drain()
+        zf.writestr(
+            "visitas.json",
+            json.dumps([_resumen_lote(f) for f in filas], ensure_ascii=False),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+    yield out.drain()
+
+
+# ---------------------------------------------------------
+# Entradas/salidas en lote (caseta con buffer offline o aforo alto)
+# ---------------------------------------------------------
+@router.post("/eventos", response_model=EventosLoteResponse)
+async def registrar_eventos(
+    data: EventosLote,
+    db = Depends(get_async_db),
+    usuario = Depends(get_usuario_actual),
+):
+    """Aplicar todos los eventos en una transacción; el resultado va por evento
+    (`aplicado`, `duplicado` o `rechazado` con su motivo), así que un conflicto
+    no invalida el resto del lote."""
+    verificar_rol(usuario, ["GUARDIA"])
+    if not data.eventos:
+        raise HTTPException(400, "El lote no contiene eventos")
+    if len(data.eventos) > settings.EVENTOS_LOTE_MAX:
+        raise HTTPException(413, f"Máximo {settings.EVENTOS_LOTE_MAX} eventos por lote")
+
+    resultados = await visita_service.registrar_eventos_async(db, data.eventos, usuario.condominio_id)
+    return {"resultados": resultados}
+
+
+# ---------------------------------------------------------
+# Registrar salida (guardia)
+# ---------------------------------------------------------
+@router.post("/{visita_id}/salida", response_model=ResultadoEvento)
+async def registrar_salida(
+    visita_id: str,
+    db = Depends(get_async_db),
+    usuario = Depends(get_usuario_actual),
+):
+    verificar_rol(usuario, ["GUARDIA"])
+    evento = EventoCaseta(visita_id=visita_id, tipo="salida", ocurrido_en=datetime.utcnow())
+    (resultado,) = await visita_service.registrar_eventos_async(db, [evento], usuario.condominio_id)
+    if resultado["resultado"] == "rechazado":
+        if resultado["estado"] is None:
+            raise HTTPException(404, "Visita no encontrada")
+        raise HTTPException(409, resultado["detalle"])
+    return resultado
+
+
+# ---------------------------------------------------------
+# Listar visitas del residente
+# ---------------------------------------------------------
+@router.get("/mis-visitas", response_model=VisitaPagina)
+async def mis_visitas(
+    limite: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    incluir_archivadas: bool = False,
+    db = Depends(get_async_db),
+    usuario = Depends(get_usuario_actual),
+):
+    verificar_rol(usuario, ["RESIDENTE"])
+    try:
+        visitas, siguiente = await visita_service.obtener_visitas_residente_async(
+            db,
+            condominio_id=usuario.condominio_id,
+            casa_unidad=usuario.casa_unidad,
+            limite=limite,
+            cursor=cursor,
+            estado=estado,
+            desde=desde,
+            hasta=hasta,
+            incluir_archivadas=incluir_archivadas,
+        )
+    except CursorInvalido as exc:
+        raise HTTPException(400, str(exc))
+    return {"items": visitas, "next_cursor": siguiente}
 
 
 # ---------------------------------------------------------
 # Listar todas las visitas del condominio (admin / guardia)
 # ---------------------------------------------------------
-@router.get("/condominio", response_model=List[VisitaResponse])
-def visitas_condominio(
-    db: Session = Depends(get_db),
+@router.get("/condominio", response_model=VisitaPagina)
+async def visitas_condominio(
+    limite: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    casa_unidad: Optional[str] = None,
+    incluir_archivadas: bool = False,
+    db = Depends(get_async_db),
     usuario = Depends(get_usuario_actual),
 ):
     verificar_rol(usuario, ["ADMIN_CONDOMINIO", "GUARDIA"])
-    visitas = visita_service.obtener_visitas_condominio(
-        db, usuario.condominio_id
-    )
-    return visitas
+    try:
+        visitas, siguiente = await visita_service.obtener_visitas_condominio_async(
+            db,
+            usuario.condominio_id,
+            limite=limite,
+            cursor=cursor,
+            estado=estado,
+            desde=desde,
+            hasta=hasta,
+            casa_unidad=casa_unidad,
+            incluir_archivadas=incluir_archivadas,
+        )
+    except CursorInvalido as exc:
+        raise HTTPException(400, str(exc))
+    return {"items": visitas, "next_cursor": siguiente}
 
 
 # ---------------------------------------------------------
@@ -66,10 +245,11 @@ def visitas_condominio(
 @router.get("/{visita_id}", response_model=VisitaResponse)
 def obtener_visita(
     visita_id: str,
+    incluir_archivadas: bool = False,
     db: Session = Depends(get_db),
     usuario = Depends(get_usuario_actual),
 ):
-    visita = visita_service.obtener_visita(db, visita_id)
+    visita = visita_service.obtener_visita(db, visita_id, incluir_archivadas)
     if not visita:
         raise HTTPException(404, "Visita no encontrada")
 
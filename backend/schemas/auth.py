@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+
+
+class LoginRequest(BaseModel):
+    usuario: str  # usuario_id o email
+    password: str
+
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int
+    usuario_id: str
+    rol: str | None = None
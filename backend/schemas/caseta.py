@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class CasetaVisita(BaseModel):
+    visita_id: str
+    token: Optional[str] = None
+    exp: Optional[int] = None  # epoch UTC de qr_vigencia
+    casa_unidad: Optional[str] = None
+    nombre_visitante: Optional[str] = None
+    estado: Optional[str] = None
+
+
+class CasetaSync(BaseModel):
+    visitas: list[CasetaVisita]
+    cursor: str
+    mas: bool = False
+    generado_en: datetime
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
+from typing import Literal
 
 
 class VisitaBase(BaseModel):
@@ -13,16 +14,58 @@ class VisitaCreate(VisitaBase):
     casa_unidad: str | None = None
 
 
-class VisitaResponse(VisitaBase):
+class VisitaLoteItem(VisitaBase):
+    casa_unidad: str | None = None
+
+
+class VisitaLoteCreate(BaseModel):
+    condominio_id: str
+    visitas: list[VisitaLoteItem]
+    minutos_vigencia_qr: int = 60
+
+
+class VisitaResponse(BaseModel):
+    # Campos propios (no VisitaBase): en la tabla son nullable y los listados
+    # devuelven también las filas históricas sin vigencia
+    model_config = ConfigDict(from_attributes=True)
+
     visita_id: str
     condominio_id: str
     casa_unidad: str | None
+    nombre_visitante: str | None
+    tipo_visita: str | None
+    vigencia: datetime | None
     estado: str
     qr_token: str | None
     qr_vigencia: datetime | None
 
-    class Config:
-        orm_mode = True
+
+class VisitaPagina(BaseModel):
+    items: list[VisitaResponse]
+    next_cursor: str | None = None
+
+
+class EventoCaseta(BaseModel):
+    visita_id: str
+    tipo: Literal["entrada", "salida"]
+    ocurrido_en: datetime  # reloj de la caseta
+    token: str | None = None  # QR escaneado (sólo entradas)
+
+
+class EventosLote(BaseModel):
+    eventos: list[EventoCaseta]
+
+
+class ResultadoEvento(BaseModel):
+    visita_id: str
+    tipo: str
+    resultado: Literal["aplicado", "duplicado", "rechazado"]
+    detalle: str | None = None
+    estado: str | None = None
+
+
+class EventosLoteResponse(BaseModel):
+    resultados: list[ResultadoEvento]
 
 
 class PreregistroCreate(BaseModel):
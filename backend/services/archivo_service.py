@@ -0,0 +1,175 @@
+"""Archivo frío de visitas cerradas y sus evidencias.
+
+Mueve a `visitas_archivo` / `evidencias_archivo` las visitas con salida
+registrada, o expiradas, hace más de `ARCHIVO_DIAS` días.
+Así `visitas` y `evidencias` sólo guardan lo reciente (listados, caseta,
+validación de QR) y lo histórico se sigue consultando con `incluir_archivadas`.
+
+Las visitas con entrada pero sin salida registrada (el guardia no escaneó la
+salida) no se cierran solas: se archivan tal cual, en estado
+`entrada_registrada`, `ARCHIVO_SIN_SALIDA_DIAS` días después de la entrada
+(0 = se quedan en la tabla caliente). El historial muestra así que no hubo
+salida registrada, sin inventar una hora de salida.
+
+Las candidatas se buscan con un recorrido por criterio de los índices
+parciales `ix_visitas_cerradas_cierre` / `ix_visitas_sin_salida_entrada`, que
+sólo contienen esos estados: el costo no depende de cuántas visitas pendientes
+o recientes haya en la tabla.
+
+Cada lote (`ARCHIVO_LOTE` visitas) es una transacción: INSERT ... SELECT al
+archivo y DELETE de las tablas calientes, visitas y evidencias juntas, así
+que una visita nunca queda a medias. Se conserva el `id` original para que
+el keyset de los listados siga siendo válido sobre la unión. Con varios
+workers se coordina igual que el barrido de expiración (advisory lock y
+`SKIP LOCKED` en Postgres, cola de escritura en SQLite).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DateTime, delete, func, insert, literal, literal_column, select, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..core import metrics
+from ..core.config import settings
+from ..db import write_queue
+from ..db.connection import SessionLocal
+from ..db.models import Evidencia, EvidenciaArchivada, Visita, VisitaArchivada
+
+logger = logging.getLogger("axs.archivo")
+
+_LLAVE_LOCK = 0x4158535F41524348
+
+# Columnas comunes (todas las del archivo salvo `archivada_en`)
+_COLUMNAS_VISITA = [c.name for c in VisitaArchivada.__table__.c if c.name != "archivada_en"]
+_COLUMNAS_EVIDENCIA = [c.name for c in EvidenciaArchivada.__table__.c if c.name != "archivada_en"]
+
+
+# Literales (no parámetros) para que el WHERE implique el de los índices parciales
+_CERRADAS = [literal_column("'salida_registrada'"), literal_column("'expirada'")]
+_SIN_SALIDA = literal_column("'entrada_registrada'")
+
+
+# Momento de cierre: la salida o, en una expirada, cuando la marcó el barrido
+# (misma expresión que el índice `ix_visitas_cerradas_cierre`)
+_CIERRE = func.coalesce(Visita.salida_registrada_en, Visita.actualizado_en)
+
+
+def criterios_archivo(ahora: datetime) -> List[Tuple]:
+    """`(condición, orden)` de archivo, una por recorrido de índice parcial."""
+    criterios = [
+        (Visita.estado.in_(_CERRADAS) & (_CIERRE < ahora - timedelta(days=settings.ARCHIVO_DIAS)), _CIERRE),
+    ]
+    if settings.ARCHIVO_SIN_SALIDA_DIAS > 0:
+        corte = ahora - timedelta(days=settings.ARCHIVO_SIN_SALIDA_DIAS)
+        criterios.append(
+            ((Visita.estado == _SIN_SALIDA) & (Visita.entrada_registrada_en < corte), Visita.entrada_registrada_en)
+        )
+    return criterios
+
+
+def consulta_candidatas(criterio: Tuple, lote: int):
+    condicion, orden = criterio
+    return (
+        select(Visita.id, Visita.visita_id)
+        .where(condicion)
+        .order_by(orden)
+        .limit(lote)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _copiar(origen, destino, columnas, condicion, ahora: datetime):
+    return insert(destino).from_select(
+        columnas + ["archivada_en"],
+        select(*(origen.c[c] for c in columnas), literal(ahora, DateTime)).where(condicion),
+    )
+
+
+def _archivar_lote(db: Session, ahora: datetime, lote: int) -> Optional[int]:
+    """Mover un lote sin commit. `None` si otro worker está archivando (Postgres)."""
+    if db.get_bind().dialect.name == "postgresql":
+        if not db.execute(select(text(f"pg_try_advisory_xact_lock({_LLAVE_LOCK})"))).scalar():
+            return None
+
+    filas = []
+    for criterio in criterios_archivo(ahora):
+        if len(filas) >= lote:
+            break
+        filas += db.execute(consulta_candidatas(criterio, lote - len(filas))).all()
+    if not filas:
+        return 0
+
+    ids = [f.id for f in filas]
+    visita_ids = [f.visita_id for f in filas]
+    visitas, evidencias = Visita.__table__, Evidencia.__table__
+
+    db.execute(_copiar(visitas, VisitaArchivada.__table__, _COLUMNAS_VISITA, visitas.c.id.in_(ids), ahora))
+    db.execute(
+        _copiar(
+            evidencias, EvidenciaArchivada.__table__, _COLUMNAS_EVIDENCIA,
+            evidencias.c.visita_id.in_(visita_ids), ahora,
+        )
+    )
+    db.execute(delete(evidencias).where(evidencias.c.visita_id.in_(visita_ids)))
+    db.execute(delete(visitas).where(visitas.c.id.in_(ids)))
+    return len(ids)
+
+
+def _ejecutar_lote(ahora: datetime, lote: int) -> Optional[int]:
+    if write_queue.cola_activa():
+        return write_queue.obtener_cola().enviar(_archivar_lote, ahora, lote).result()
+
+    db = SessionLocal()
+    try:
+        movidas = _archivar_lote(db, ahora, lote)
+        db.commit()
+        return movidas
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------
+# Archivado por lotes
+# ---------------------------------------------------------
+def archivar(
+    ahora: Optional[datetime] = None, lote: Optional[int] = None, max_lotes: Optional[int] = None
+) -> int:
+    """Archivar lo elegible hasta `ahora`, a lo sumo `max_lotes` lotes. Devuelve cuántas visitas movió."""
+    ahora = ahora or datetime.utcnow()
+    lote = lote or settings.ARCHIVO_LOTE
+    t0 = time.perf_counter()
+    total = lotes = 0
+
+    while max_lotes is None or lotes < max_lotes:
+        movidas = _ejecutar_lote(ahora, lote)
+        if movidas is None:
+            logger.debug("Archivado en curso en otro worker")
+            break
+        lotes += 1
+        total += movidas
+        metrics.VISITAS_ARCHIVADAS.inc(movidas)
+        if movidas:
+            logger.debug("Lote archivado: %d visitas (acumulado %d)", movidas, total)
+        if movidas < lote:
+            break
+
+    if total:
+        logger.info("Archivo frío: %d visitas en %d lotes (%.2f s)", total, lotes, time.perf_counter() - t0)
+    return total
+
+
+async def archivar_periodicamente() -> None:
+    """Tarea del lifespan: archivar cada `ARCHIVO_INTERVALO_S` segundos."""
+    while True:
+        try:
+            await run_in_threadpool(archivar)
+        except Exception as exc:
+            logger.warning("Falló el archivado", exc_info=exc)
+        await asyncio.sleep(settings.ARCHIVO_INTERVALO_S)
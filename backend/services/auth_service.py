@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import secrets
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..core import sesion
+from ..core.config import settings
+from ..core.principal import Principal
+from ..core.security import get_password_hash, verify_password
+from ..db.connection import SessionLocal
+from ..db.models import TokenRevocado, Usuario
+
+logger = logging.getLogger("axs.auth")
+
+
+# ---------------------------------------------------------
+# Login
+# ---------------------------------------------------------
+@lru_cache(maxsize=1)
+def _hash_señuelo() -> str:
+    return get_password_hash(secrets.token_urlsafe(16))
+
+
+def autenticar(db: Session, usuario: str, password: str) -> Optional[Principal]:
+    """Verificar credenciales (una sola lectura + bcrypt). `None` si no son válidas."""
+    encontrado = db.execute(
+        select(Usuario).where(or_(Usuario.usuario_id == usuario, Usuario.email == usuario))
+    ).scalars().first()
+    if not encontrado or not encontrado.password_hash:
+        # Mismo costo que un password incorrecto: el tiempo de respuesta no
+        # revela qué usuarios existen
+        verify_password(password, _hash_señuelo())
+        return None
+    if not verify_password(password, encontrado.password_hash):
+        return None
+    return Principal.desde_usuario(encontrado)
+
+
+# ---------------------------------------------------------
+# Revocación
+# ---------------------------------------------------------
+def revocar(db: Session, payload: dict) -> None:
+    """Revocar un token ya verificado: efecto inmediato en este proceso y
+    en los demás workers al siguiente refresco de la lista."""
+    jti, exp = payload.get("jti"), payload.get("exp", 0)
+    if not jti:
+        return
+    sesion.marcar_revocado(jti, exp)
+    valores = {"jti": jti, "usuario_id": payload.get("sub"), "expira": datetime.utcfromtimestamp(exp)}
+    try:
+        db.execute(_insertar_revocado(db.get_bind().dialect.name).values(**valores))
+        db.commit()
+    except IntegrityError:
+        # Otro logout con el mismo token se adelantó: ya está revocado
+        db.rollback()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _insertar_revocado(dialecto: str):
+    """INSERT que ignora un `jti` ya presente (dos logouts concurrentes del mismo token)."""
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_pg
+
+        return insert_pg(TokenRevocado).on_conflict_do_nothing(index_elements=["jti"])
+    if dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+
+        return insert_sqlite(TokenRevocado).on_conflict_do_nothing(index_elements=["jti"])
+    return insert(TokenRevocado)
+
+
+def cargar_revocados(db: Session) -> dict:
+    filas = db.execute(
+        select(TokenRevocado.jti, TokenRevocado.expira).where(TokenRevocado.expira > datetime.utcnow())
+    ).all()
+    # `expira` se guarda en UTC naive: convertir a epoch como UTC
+    return {jti: (expira - datetime(1970, 1, 1)).total_seconds() for jti, expira in filas}
+
+
+def _refrescar_revocados() -> None:
+    db = SessionLocal()
+    try:
+        sesion.reemplazar_revocados(cargar_revocados(db))
+    finally:
+        db.close()
+
+
+async def refrescar_revocados_periodicamente() -> None:
+    """Tarea del lifespan: recargar la lista de revocación cada `AUTH_REVOCACION_REFRESH` s."""
+    while True:
+        try:
+            await run_in_threadpool(_refrescar_revocados)
+        except Exception as exc:
+            logger.warning("No se pudo recargar la lista de revocación", exc_info=exc)
+        await asyncio.sleep(settings.AUTH_REVOCACION_REFRESH)
@@ -0,0 +1,131 @@
+"""Sincronización de casetas: snapshot de visitas válidas y deltas por cursor.
+
+La caseta descarga una vez el snapshot de su condominio y después pide sólo
+los cambios desde su cursor, de modo que puede validar QR localmente (sin ir
+a la base en cada escaneo) y seguir operando durante cortes breves de red.
+
+El cursor es keyset sobre `(actualizado_en, id)`. El delta nunca entrega
+filas modificadas en los últimos `CASETA_DELTA_MARGEN_S` segundos: una
+transacción que fijó `actualizado_en` pero aún no confirmaba podría quedar
+detrás del cursor y perderse. Las entregas repetidas son inocuas (la caseta
+hace upsert por `visita_id`).
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db.models import Caseta, Visita
+from ..utils.paginacion import codificar_cursor, decodificar_cursor
+
+_COLUMNAS = (
+    Visita.id,
+    Visita.visita_id,
+    Visita.qr_token,
+    Visita.qr_vigencia,
+    Visita.casa_unidad,
+    Visita.nombre_visitante,
+    Visita.estado,
+    Visita.actualizado_en,
+)
+
+
+def obtener_caseta(db: Session, caseta_id: str) -> Optional[Caseta]:
+    return db.query(Caseta).filter(Caseta.caseta_id == caseta_id).first()
+
+
+def _item(fila) -> dict:
+    exp = fila.qr_vigencia
+    return {
+        "visita_id": fila.visita_id,
+        "token": fila.qr_token,
+        # Epoch UTC: la caseta compara contra su reloj sin parsear fechas
+        "exp": int((exp - datetime(1970, 1, 1)).total_seconds()) if exp else None,
+        "casa_unidad": fila.casa_unidad,
+        "nombre_visitante": fila.nombre_visitante,
+        "estado": fila.estado,
+    }
+
+
+def _horizonte(ahora: datetime) -> datetime:
+    return ahora - timedelta(seconds=settings.CASETA_DELTA_MARGEN_S)
+
+
+# ---------------------------------------------------------
+# Snapshot: visitas pendientes con QR vigente
+# ---------------------------------------------------------
+def consulta_snapshot(condominio_id: str, ahora: datetime) -> Select:
+    return (
+        select(*_COLUMNAS)
+        .where(
+            Visita.condominio_id == condominio_id,
+            Visita.estado == "pendiente",
+            Visita.qr_vigencia > ahora,
+        )
+        .order_by(Visita.id)
+    )
+
+
+def snapshot(db: Session, condominio_id: str, ahora: Optional[datetime] = None) -> dict:
+    ahora = ahora or datetime.utcnow()
+    filas = db.execute(consulta_snapshot(condominio_id, ahora)).all()
+    return {
+        "visitas": [_item(f) for f in filas],
+        # Lo modificado después del horizonte vuelve a llegar por el delta
+        "cursor": codificar_cursor(_horizonte(ahora), 0),
+        "mas": False,
+        "generado_en": ahora,
+    }
+
+
+# ---------------------------------------------------------
+# Delta: todo lo modificado desde el cursor (cualquier estado)
+# ---------------------------------------------------------
+def consulta_delta(
+    condominio_id: str, desde: Optional[datetime], ultimo_id: int, hasta: datetime, limite: int
+) -> Select:
+    stmt = select(*_COLUMNAS).where(
+        Visita.condominio_id == condominio_id,
+        Visita.actualizado_en <= hasta,
+    )
+    if desde is not None:
+        stmt = stmt.where(tuple_(Visita.actualizado_en, Visita.id) > tuple_(desde, ultimo_id))
+    return stmt.order_by(Visita.actualizado_en, Visita.id).limit(limite + 1)
+
+
+def delta(
+    db: Session,
+    condominio_id: str,
+    cursor: str,
+    limite: Optional[int] = None,
+    ahora: Optional[datetime] = None,
+) -> dict:
+    """Cambios desde `cursor`. Los items con `estado` distinto de `pendiente`
+    (o `exp` vencido) se eliminan del almacén local de la caseta.
+
+    Lanza `CursorInvalido` si el cursor no se puede decodificar.
+    """
+    ahora = ahora or datetime.utcnow()
+    limite = limite or settings.CASETA_DELTA_MAX
+    desde, ultimo_id = decodificar_cursor(cursor)
+    hasta = _horizonte(ahora)
+
+    filas: List = db.execute(consulta_delta(condominio_id, desde, ultimo_id, hasta, limite)).all()
+    mas = len(filas) > limite
+    filas = filas[:limite]
+
+    siguiente: Tuple[Optional[datetime], int] = (desde, ultimo_id)
+    if mas:
+        siguiente = (filas[-1].actualizado_en, filas[-1].id)
+    elif desde is None or desde < hasta:
+        # Ya se entregó todo hasta el horizonte: avanzar ahí
+        siguiente = (hasta, filas[-1].id if filas and filas[-1].actualizado_en == hasta else 0)
+
+    return {
+        "visitas": [_item(f) for f in filas],
+        "cursor": codificar_cursor(*siguiente),
+        "mas": mas,
+        "generado_en": ahora,
+    }
@@ -1,16 +1,40 @@
 from sqlalchemy.orm import Session
-from ..db.models import Evidencia
-from ..utils.file_storage import guardar_archivo
-from ..utils.hash_tools import calcular_hash_sha256
+from ..db import write_queue
+from ..db.connection import SessionLocal
+from ..db.models import Evidencia, EvidenciaArchivada, Visita, VisitaArchivada
+from starlette.concurrency import run_in_threadpool
+from ..utils.file_storage import (
+    blobs_en_disco,
+    guardar_stream,
+    guardar_stream_async,
+    limpiar_temporales,
+    recolectar_blob,
+)
+from ..utils.imagenes import generar_derivados
+from ..utils.procesos import obtener_pool
+from ..core import metrics
+from ..core.config import settings
+import asyncio
+import io
+import logging
+import time
 import uuid
-from typing import Optional
-import os
+from typing import List, Optional, Tuple
+from sqlalchemy import bindparam, func, select, update
+
+logger = logging.getLogger("axs.evidencias")
 
 # Max upload size in MB (fallback to 15MB)
-_MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "15"))
+_MAX_UPLOAD_MB = settings.MAX_UPLOAD_SIZE_MB
 _MAX_UPLOAD_BYTES = _MAX_UPLOAD_MB * 1024 * 1024
 
 
+def _registrar_ingesta(categoria: str, tamano: int, segundos: float) -> None:
+    metrics.EVIDENCIA_BYTES.inc(tamano, categoria=categoria)
+    metrics.EVIDENCIA_ARCHIVOS.inc(categoria=categoria)
+    metrics.EVIDENCIA_ESCRITURA.observe(segundos, categoria=categoria)
+
+
 def guardar_evidencias_opcionales(
     db: Session,
     visita_id: str,
@@ -27,22 +51,21 @@ def guardar_evidencias_opcionales(
 
         # archivo puede ser UploadFile de FastAPI o un objeto con .file
         if hasattr(archivo, "file"):
-            contenido = archivo.file.read()
-            filename = getattr(archivo, "filename", f"{uuid.uuid4().hex}.bin")
+            stream = archivo.file
+            filename = getattr(archivo, "filename", None) or f"{uuid.uuid4().hex}.bin"
         else:
             # si se pasa un par (filename, bytes)
             try:
                 filename, contenido = archivo
             except Exception:
                 continue
+            stream = io.BytesIO(contenido)
 
-        # Validate size
-        if isinstance(contenido, (bytes, bytearray)) and len(contenido) > _MAX_UPLOAD_BYTES:
-            # abort the whole batch
-            raise ValueError(f"Archivo '{filename}' excede tamaño máximo de {_MAX_UPLOAD_MB} MB")
-
-        archivo_url = guardar_archivo(filename, contenido)
-        hash_sha = calcular_hash_sha256(contenido)
+        # Copia por bloques + hash en una sola pasada; si excede el máximo
+        # lanza ArchivoDemasiadoGrande (ValueError) y aborta todo el lote.
+        t0 = time.perf_counter()
+        archivo_url, hash_sha, tamano = guardar_stream(stream, filename, max_bytes=_MAX_UPLOAD_BYTES)
+        _registrar_ingesta(categoria, tamano, time.perf_counter() - t0)
 
         evidencia = Evidencia(
             evidencia_id=str(uuid.uuid4()),
@@ -70,3 +93,310 @@ def guardar_evidencias_opcionales(
         raise
 
     return registros
+
+
+class _BytesAsync:
+    """Adaptador mínimo para pasar `(filename, bytes)` al pipeline asíncrono."""
+
+    def __init__(self, contenido: bytes):
+        self._buf = io.BytesIO(contenido)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buf.read(size)
+
+
+async def _guardar_stream_medido(stream, filename: str, categoria: str):
+    t0 = time.perf_counter()
+    resultado = await guardar_stream_async(stream, filename, max_bytes=_MAX_UPLOAD_BYTES)
+    _registrar_ingesta(categoria, resultado[2], time.perf_counter() - t0)
+    return resultado
+
+
+async def guardar_evidencias_opcionales_async(
+    db: Session,
+    visita_id: str,
+    guardia_id: str,
+    categoria: str,
+    archivos: dict,
+    metadata_extra: Optional[dict] = None,
+):
+    """Versión asíncrona de `guardar_evidencias_opcionales`.
+
+    Escribe y hashea todos los archivos en paralelo y hace un solo insert al
+    final: con SQLite por la cola de escritura (como las demás escrituras
+    calientes), si no con la sesión síncrona en el threadpool. Si algún archivo
+    falla no se inserta ninguna fila y se propaga el primer error.
+    """
+    pendientes = []
+    for sub_tipo, archivo in archivos.items():
+        if archivo is None:
+            continue
+        if hasattr(archivo, "read"):
+            filename = getattr(archivo, "filename", None) or f"{uuid.uuid4().hex}.bin"
+            stream = archivo
+        else:
+            try:
+                filename, contenido = archivo
+            except Exception:
+                continue
+            stream = _BytesAsync(contenido)
+        pendientes.append((sub_tipo, filename, stream))
+
+    resultados = await asyncio.gather(
+        *(_guardar_stream_medido(stream, filename, categoria) for _, filename, stream in pendientes),
+        return_exceptions=True,
+    )
+
+    # Los blobs ya publicados se dejan: están direccionados por contenido y
+    # pueden estar referenciados por otras evidencias.
+    errores = [r for r in resultados if isinstance(r, BaseException)]
+    if errores:
+        raise errores[0]
+
+    registros = [
+        Evidencia(
+            evidencia_id=str(uuid.uuid4()),
+            visita_id=visita_id,
+            guardia_id=guardia_id,
+            categoria=categoria,
+            sub_tipo=sub_tipo,
+            archivo_url=archivo_url,
+            hash_sha256=hash_sha,
+            metadata_json=metadata_extra or {"filename": filename},
+        )
+        for (sub_tipo, filename, _), (archivo_url, hash_sha, _) in zip(pendientes, resultados)
+    ]
+
+    if registros:
+        # Datos para las miniaturas, tomados antes del commit (que expira los objetos)
+        derivables = [(r.evidencia_id, r.archivo_url, r.metadata_json) for r in registros]
+        if write_queue.cola_activa():
+            await write_queue.ejecutar_escritura(_agregar_evidencias, registros)
+        else:
+            await run_in_threadpool(_insertar_evidencias, db, registros)
+        programar_derivados(derivables)
+    return registros
+
+
+def _agregar_evidencias(db: Session, registros: list) -> None:
+    """Trabajo de la cola de escritura: agregar sin commit (lo hace la cola)."""
+    db.add_all(registros)
+
+
+def _insertar_evidencias(db: Session, registros: list):
+    try:
+        _agregar_evidencias(db, registros)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+# ---------------------------------------------------------
+# Derivados (miniaturas) en segundo plano
+# ---------------------------------------------------------
+# Referencias a las tareas en curso (asyncio sólo guarda referencias débiles)
+_tareas_derivados: set = set()
+
+
+def _tamanos_derivados() -> dict:
+    return {"small": settings.DERIVADO_SMALL_PX, "medium": settings.DERIVADO_MEDIUM_PX}
+
+
+def _guardar_metadata(db: Session, cambios: List[dict]) -> None:
+    """UPDATE executemany de `metadata_json` por `evidencia_id`, sin commit."""
+    tabla = Evidencia.__table__
+    db.execute(
+        update(tabla)
+        .where(tabla.c.evidencia_id == bindparam("_evidencia_id"))
+        .values(metadata_json=bindparam("_metadata")),
+        cambios,
+    )
+
+
+def _registrar_derivados(cambios: List[dict]) -> None:
+    if write_queue.cola_activa():
+        write_queue.obtener_cola().enviar(_guardar_metadata, cambios).result()
+        return
+
+    db = SessionLocal()
+    try:
+        _guardar_metadata(db, cambios)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def generar_derivados_async(derivables: List[Tuple[str, str, Optional[dict]]]) -> int:
+    """Miniaturas para `[(evidencia_id, archivo_url, metadata_json)]` en el pool de
+    procesos; las guarda en `metadata_json["derivados"]`. Devuelve cuántas filas actualizó.
+    """
+    loop = asyncio.get_running_loop()
+    tamanos = _tamanos_derivados()
+
+    # El mismo blob (subido dos veces) se procesa una sola vez
+    por_blob: dict = {}
+    for evidencia_id, archivo_url, metadata in derivables:
+        if archivo_url:
+            por_blob.setdefault(archivo_url, []).append((evidencia_id, metadata))
+
+    async def generar(archivo_url: str) -> dict:
+        t0 = time.perf_counter()
+        derivados = await loop.run_in_executor(
+            obtener_pool(), generar_derivados, archivo_url, tamanos, settings.DERIVADO_CALIDAD
+        )
+        metrics.EVIDENCIA_DERIVADOS.observe(time.perf_counter() - t0)
+        return derivados
+
+    resultados = await asyncio.gather(*(generar(url) for url in por_blob), return_exceptions=True)
+
+    cambios = []
+    for (archivo_url, evidencias), derivados in zip(por_blob.items(), resultados):
+        if isinstance(derivados, BaseException):
+            logger.warning("No se pudieron generar derivados de %s", archivo_url, exc_info=derivados)
+            continue
+        # `{}` (no es imagen) también se anota, para que el relleno no lo reintente
+        for evidencia_id, metadata in evidencias:
+            cambios.append({"_evidencia_id": evidencia_id, "_metadata": {**(metadata or {}), "derivados": derivados}})
+
+    if cambios:
+        await run_in_threadpool(_registrar_derivados, cambios)
+    return len(cambios)
+
+
+async def _generar_derivados_seguro(derivables) -> None:
+    try:
+        await generar_derivados_async(derivables)
+    except Exception as exc:
+        logger.warning("Falló la generación de derivados", exc_info=exc)
+
+
+def programar_derivados(derivables: List[Tuple[str, str, Optional[dict]]]) -> Optional[asyncio.Task]:
+    """Lanzar `generar_derivados_async` sin que el request lo espere."""
+    if not settings.EVIDENCIA_DERIVADOS or not derivables:
+        return None
+    tarea = asyncio.create_task(_generar_derivados_seguro(derivables))
+    _tareas_derivados.add(tarea)
+    tarea.add_done_callback(_tareas_derivados.discard)
+    return tarea
+
+
+async def esperar_derivados(timeout: Optional[float] = None) -> int:
+    """Apagado ordenado: esperar las tareas de `programar_derivados` en curso.
+
+    Las que no terminan en `timeout` se cancelan; sus evidencias quedan sin
+    `derivados` y las completa `rellenar_derivados`. Devuelve cuántas se cancelaron.
+    """
+    if not _tareas_derivados:
+        return 0
+    _, pendientes = await asyncio.wait(set(_tareas_derivados), timeout=timeout)
+    for tarea in pendientes:
+        tarea.cancel()
+    if pendientes:
+        logger.warning("%d tareas de derivados canceladas al apagar", len(pendientes))
+    return len(pendientes)
+
+
+def _pagina_evidencias(desde_id: int, lote: int) -> list:
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(Evidencia.id, Evidencia.evidencia_id, Evidencia.archivo_url, Evidencia.metadata_json)
+            .where(Evidencia.id > desde_id)
+            .order_by(Evidencia.id)
+            .limit(lote)
+        ).all()
+    finally:
+        db.close()
+
+
+async def rellenar_derivados(lote: int = 200) -> int:
+    """Generar las miniaturas que faltan y devolver cuántas evidencias actualizó.
+
+    Cubre las tareas perdidas por un reinicio o canceladas al apagar, las que
+    fallaron y los uploads de antes de `EVIDENCIA_DERIVADOS`. Una evidencia ya
+    procesada tiene la clave `derivados` (vacía si no es imagen); las que
+    fallan no la tienen y se reintentan en la siguiente corrida.
+    """
+    total = ultimo_id = 0
+    while True:
+        filas = await run_in_threadpool(_pagina_evidencias, ultimo_id, lote)
+        if not filas:
+            return total
+        ultimo_id = filas[-1].id
+        derivables = [
+            (f.evidencia_id, f.archivo_url, f.metadata_json)
+            for f in filas
+            if f.archivo_url and "derivados" not in (f.metadata_json or {})
+        ]
+        if derivables:
+            total += await generar_derivados_async(derivables)
+
+
+# ---------------------------------------------------------
+# Conteo de referencias del almacén por contenido
+# ---------------------------------------------------------
+def contar_referencias(db: Session, archivo_url: str) -> int:
+    """Número de evidencias (activas o archivadas) que apuntan al mismo blob (`archivo_url`)."""
+    activas = db.query(func.count(Evidencia.id)).filter(Evidencia.archivo_url == archivo_url).scalar()
+    archivadas = (
+        db.query(func.count(EvidenciaArchivada.id))
+        .filter(EvidenciaArchivada.archivo_url == archivo_url)
+        .scalar()
+    )
+    return activas + archivadas
+
+
+def obtener_evidencia_y_condominio(db: Session, evidencia_id: str) -> Optional[Tuple[object, Optional[str]]]:
+    """`(evidencia, condominio_id de su visita)`, buscando también en el archivo frío."""
+    for evidencia_modelo, visita_modelo in ((Evidencia, Visita), (EvidenciaArchivada, VisitaArchivada)):
+        fila = db.execute(
+            select(evidencia_modelo, visita_modelo.condominio_id)
+            .outerjoin(visita_modelo, visita_modelo.visita_id == evidencia_modelo.visita_id)
+            .where(evidencia_modelo.evidencia_id == evidencia_id)
+        ).first()
+        if fila is not None:
+            return fila[0], fila[1]
+    return None
+
+
+def eliminar_evidencia(db: Session, evidencia_id: str) -> bool:
+    """Borrar una evidencia y, si era la última referencia, también su archivo.
+
+    El archivo se borra con `recolectar_blob`, que vuelve a contar referencias
+    bajo el lock del hash: si otro upload acaba de publicar el mismo contenido,
+    se conserva y lo decide después `recolectar_huerfanos`.
+    """
+    evidencia = db.query(Evidencia).filter(Evidencia.evidencia_id == evidencia_id).first()
+    if not evidencia:
+        return False
+
+    archivo_url = evidencia.archivo_url
+    try:
+        db.delete(evidencia)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if archivo_url:
+        recolectar_blob(archivo_url, lambda: contar_referencias(db, archivo_url) > 0)
+    return True
+
+
+def recolectar_huerfanos(db: Session, gracia_s: Optional[float] = None) -> int:
+    """Borrar los blobs del almacén que ninguna evidencia (activa o archivada) referencia.
+
+    Recoge los archivos de lotes que fallaron después de guardarse, los que
+    `eliminar_evidencia` conservó por una publicación concurrente y los
+    temporales abandonados. Respeta el margen `EVIDENCIA_GC_GRACIA_S`.
+    """
+    borrados = limpiar_temporales(gracia_s)
+    for archivo_url in blobs_en_disco():
+        if recolectar_blob(archivo_url, lambda: contar_referencias(db, archivo_url) > 0, gracia_s):
+            borrados += 1
+    logger.info("Recolección de huérfanos: %d archivos borrados", borrados)
+    return borrados
@@ -0,0 +1,134 @@
+"""Barrido de visitas expiradas: `pendiente` -> `expirada` por lotes.
+
+Una visita expira cuando su QR ya venció y además pasó su `vigencia` (la
+fecha de la visita) más `EXPIRACION_GRACIA_H` horas. Un QR vencido con la
+visita todavía por venir no la expira, porque el residente puede reenviarlo.
+Las visitas sin QR expiran sólo por `vigencia`.
+
+Cada lote es un UPDATE de a lo sumo `EXPIRACION_LOTE` filas en su propia
+transacción corta, para no bloquear a las casetas:
+
+- Postgres: los candidatos se eligen con `FOR UPDATE SKIP LOCKED` (no espera
+  filas que otra transacción está tocando) y un advisory lock de transacción
+  evita que dos workers barran a la vez (el segundo cede su turno).
+- SQLite: el lote pasa por la cola de escritura, intercalado con las
+  escrituras de los requests.
+
+El UPDATE vuelve a exigir `estado = 'pendiente'`, así que repetirlo o correrlo
+desde varios workers no cambia el resultado. `actualizado_en` se actualiza
+(onupdate), por lo que las casetas reciben las expiradas en su delta.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import Update, and_, literal_column, or_, select, text, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..core import metrics
+from ..core.config import settings
+from ..db import write_queue
+from ..db.connection import SessionLocal
+from ..db.models import Visita
+
+logger = logging.getLogger("axs.expiracion")
+
+# Literal (no parámetro) para que SQLite reconozca el índice parcial
+_PENDIENTE = literal_column("'pendiente'")
+# Clave del advisory lock de Postgres (arbitraria, fija para todos los workers)
+_LLAVE_LOCK = 0x4158535F45585052
+
+
+def criterios(ahora: datetime) -> List:
+    """Condiciones de expiración, una por recorrido del índice parcial."""
+    corte = ahora - timedelta(hours=settings.EXPIRACION_GRACIA_H)
+    return [
+        # QR vencido y visita ya pasada (o sin fecha)
+        and_(Visita.qr_vigencia < ahora, or_(Visita.vigencia.is_(None), Visita.vigencia < corte)),
+        # Sin QR: sólo por fecha de la visita
+        and_(Visita.qr_vigencia.is_(None), Visita.vigencia < corte),
+    ]
+
+
+def sentencia_expirar(criterio, lote: int) -> Update:
+    candidatas = (
+        select(Visita.id)
+        .where(Visita.estado == _PENDIENTE, criterio)
+        .limit(lote)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(Visita)
+        .where(Visita.id.in_(candidatas.scalar_subquery()), Visita.estado == _PENDIENTE)
+        .values(estado="expirada")
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _expirar_lote(db: Session, criterio, lote: int) -> Optional[int]:
+    """Un lote sin commit. `None` si otro worker tiene el barrido (Postgres)."""
+    if db.get_bind().dialect.name == "postgresql":
+        if not db.execute(select(text(f"pg_try_advisory_xact_lock({_LLAVE_LOCK})"))).scalar():
+            return None
+    return db.execute(sentencia_expirar(criterio, lote)).rowcount
+
+
+def _ejecutar_lote(criterio, lote: int) -> Optional[int]:
+    if write_queue.cola_activa():
+        return write_queue.obtener_cola().enviar(_expirar_lote, criterio, lote).result()
+
+    db = SessionLocal()
+    try:
+        expiradas = _expirar_lote(db, criterio, lote)
+        db.commit()
+        return expiradas
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------
+# Barrido
+# ---------------------------------------------------------
+def barrer(ahora: Optional[datetime] = None, lote: Optional[int] = None) -> int:
+    """Expirar todo lo vencido hasta `ahora`, lote por lote. Devuelve cuántas visitas expiró."""
+    ahora = ahora or datetime.utcnow()
+    lote = lote or settings.EXPIRACION_LOTE
+    t0 = time.perf_counter()
+    total = lotes = 0
+
+    for criterio in criterios(ahora):
+        while True:
+            expiradas = _ejecutar_lote(criterio, lote)
+            if expiradas is None:
+                logger.debug("Barrido de expiración en curso en otro worker")
+                return total
+            lotes += 1
+            total += expiradas
+            metrics.VISITAS_EXPIRADAS.inc(expiradas)
+            if expiradas:
+                logger.debug("Lote de expiración: %d visitas (acumulado %d)", expiradas, total)
+            if expiradas < lote:
+                break
+
+    metrics.EXPIRACION_ULTIMO_BARRIDO.set(time.time())
+    if total:
+        logger.info(
+            "Barrido de expiración: %d visitas en %d lotes (%.2f s)", total, lotes, time.perf_counter() - t0
+        )
+    return total
+
+
+async def barrer_periodicamente() -> None:
+    """Tarea del lifespan: barrer cada `EXPIRACION_INTERVALO_S` segundos."""
+    while True:
+        try:
+            await run_in_threadpool(barrer)
+        except Exception as exc:
+            logger.warning("Falló el barrido de expiración", exc_info=exc)
+        await asyncio.sleep(settings.EXPIRACION_INTERVALO_S)
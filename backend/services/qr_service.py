@@ -1,28 +1,217 @@
-import qrcode
+import hashlib
 import io
-import uuid
+import time
 from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+from ..core import firmas, metrics
 from ..core.config import settings
+from ..utils.cache import LRUBytesCache
+from ..utils.procesos import obtener_pool
 
 
-def generar_qr_para_visita(visita_id: str, minutos_vigencia: int = 60):
-    # normalize inputs
+# Imágenes ya renderizadas por (visita_id, token, formato, opciones). El token es
+# inmutable mientras sea vigente, así que no hace falta invalidar: al rotar cambia la clave.
+_qr_cache = LRUBytesCache(
+    settings.QR_CACHE_MAX_BYTES, settings.QR_CACHE_DIR or None, settings.QR_CACHE_DISK_MAX_BYTES
+)
+
+
+metrics.contador("axs_qr_cache_hits_total", "Aciertos de la caché de QR.", funcion=lambda: {(): _qr_cache.hits})
+metrics.contador("axs_qr_cache_misses_total", "Fallos de la caché de QR.", funcion=lambda: {(): _qr_cache.misses})
+metrics.gauge("axs_qr_cache_bytes", "Bytes en memoria de la caché de QR.", funcion=lambda: {(): _qr_cache.size_bytes})
+
+
+def _payload_qr(visita_id: str, token: str) -> str:
+    if es_token_firmado(token):
+        return f"{_PREFIJO_FIRMADO}|{visita_id}|{token}"
+    return f"AXS|{visita_id}|{token}"
+
+
+FORMATOS_QR = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def _qr(payload: str, box_size: int, border: int, ecc: str):
+    # qrcode (y PIL) se importan en el primer render, no al importar la app
+    import qrcode
+
+    niveles = {
+        "L": qrcode.constants.ERROR_CORRECT_L,
+        "M": qrcode.constants.ERROR_CORRECT_M,
+        "Q": qrcode.constants.ERROR_CORRECT_Q,
+        "H": qrcode.constants.ERROR_CORRECT_H,
+    }
+    qr = qrcode.QRCode(error_correction=niveles[ecc], box_size=box_size, border=border)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr
+
+
+def _render_png(payload: str, box_size: int = 10, border: int = 4, ecc: str = "M") -> bytes:
+    img = _qr(payload, box_size, border, ecc).make_image()
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _render_png_medido(payload: str) -> Tuple[bytes, float]:
+    """`_render_png` + su duración, medida donde corre (el proceso del pool en los lotes)."""
+    t0 = time.perf_counter()
+    png = _render_png(payload)
+    return png, time.perf_counter() - t0
+
+
+def _render_svg(payload: str, box_size: int = 10, border: int = 4, ecc: str = "M") -> bytes:
+    """SVG directo de la matriz QR: un solo <path> con tramos horizontales por fila."""
+    qr = _qr(payload, box_size, border, ecc)
+    matriz = qr.get_matrix()  # ya incluye el borde
+    n = len(matriz)
+    tramos = []
+    for y, fila in enumerate(matriz):
+        x = 0
+        while x < n:
+            if fila[x]:
+                inicio = x
+                while x < n and fila[x]:
+                    x += 1
+                tramos.append(f"M{inicio} {y}h{x - inicio}v1h-{x - inicio}z")
+            else:
+                x += 1
+    lado = n * box_size
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{lado}" height="{lado}" '
+        f'viewBox="0 0 {n} {n}" shape-rendering="crispEdges">'
+        f'<rect width="{n}" height="{n}" fill="#fff"/>'
+        f'<path fill="#000" d="{"".join(tramos)}"/></svg>'
+    ).encode()
+
+
+_RENDERERS = {"png": _render_png, "svg": _render_svg}
+
+
+def renderizar_qr(
+    visita_id: str,
+    token: str,
+    formato: str = "png",
+    box_size: int = 10,
+    border: int = 4,
+    ecc: str = "M",
+) -> bytes:
+    """Imagen del QR para el token almacenado de la visita (cacheada)."""
     visita_id = str(visita_id).strip()
+    key = (visita_id, token, formato, box_size, border, ecc)
+    data = _qr_cache.get(key)
+    if data is None:
+        t0 = time.perf_counter()
+        data = _RENDERERS[formato](_payload_qr(visita_id, token), box_size, border, ecc)
+        metrics.QR_RENDER.observe(time.perf_counter() - t0, formato=formato)
+        _qr_cache.put(key, data)
+    return data
+
+
+def etag_qr(visita_id: str, token: str, formato: str, box_size: int, border: int, ecc: str) -> str:
+    """ETag fuerte derivado del token y de las opciones de render."""
+    base = f"{visita_id}|{token}|{formato}|{box_size}|{border}|{ecc}"
+    return '"' + hashlib.sha256(base.encode()).hexdigest()[:32] + '"'
+
+
+def renderizar_qr_lote(visitas: List[Tuple[str, str]]) -> Iterator[bytes]:
+    """PNGs para muchos `(visita_id, token)`, en el mismo orden.
+
+    Los que no están en caché se renderizan en el pool de procesos (si el lote
+    es suficientemente grande) y se van entregando conforme terminan, para que
+    el caller pueda hacer streaming sin esperar al lote completo.
+    """
+    # Misma clave que `renderizar_qr` con las opciones por defecto
+    visitas = [(str(v).strip(), t, "png", 10, 4, "M") for v, t in visitas]
+    cacheados = [_qr_cache.get(key) for key in visitas]
+    pendientes = [_payload_qr(key[0], key[1]) for key, png in zip(visitas, cacheados) if png is None]
+
+    if len(pendientes) >= settings.QR_LOTE_MIN_POOL:
+        renders = obtener_pool().map(_render_png_medido, pendientes, chunksize=max(1, len(pendientes) // 64))
+    else:
+        renders = map(_render_png_medido, pendientes)
+
+    for key, png in zip(visitas, cacheados):
+        if png is None:
+            png, segundos = next(renders)
+            metrics.QR_RENDER.observe(segundos, formato="png")
+            _qr_cache.put(key, png)
+        yield png
+
+
+def precalentar(_=None) -> None:
+    """Importar qrcode/PIL y renderizar un QR desechable (no entra a la caché).
+
+    Se usa en el arranque y en cada proceso del pool, para que el primer QR
+    real no pague las importaciones.
+    """
+    _render_png("AXS|precalentar|0")
+
+
+# ---------------------------------------------------------
+# Tokens firmados: "<exp>.<kid>.<mac>"
+# ---------------------------------------------------------
+# El QR codifica `AXS2|<visita_id>|<exp>.<kid>.<mac>`, con `mac` = HMAC-SHA256
+# (truncado a 128 bits) de `AXS2|<visita_id>|<exp>|<kid>` usando el llavero de
+# `core/firmas.py`. La caseta verifica firma y expiración en memoria; la base
+# sólo se toca para marcar el uso único. El token completo se guarda en
+# `visitas.qr_token`, así que rotarlo sigue invalidando el anterior.
+_PREFIJO_FIRMADO = "AXS2"
+_MAC_BYTES = 16
+
+
+class QRInvalido(ValueError):
+    """Token QR mal formado o con firma que no corresponde a la visita."""
+
+
+class QRExpirado(QRInvalido):
+    """Token QR con firma válida pero ya vencido."""
+
+
+def _mensaje_firmado(visita_id: str, exp: int, kid: str) -> bytes:
+    return f"{_PREFIJO_FIRMADO}|{visita_id}|{exp}|{kid}".encode()
+
+
+def es_token_firmado(token: str) -> bool:
+    return token.count(".") == 2
+
+
+def nuevo_token(visita_id: str, minutos_vigencia: int = 60) -> Tuple[str, datetime]:
+    """Token firmado para `visita_id` y su vigencia (acotada a 7 días)."""
     # cap vigencia to a reasonable maximum (e.g., 7 days)
     max_minutes = 60 * 24 * 7
     minutos_vigencia = max(1, min(int(minutos_vigencia), max_minutes))
+    exp = int(time.time()) + minutos_vigencia * 60
+    kid, mac = firmas.firmar(_mensaje_firmado(str(visita_id).strip(), exp, firmas.kid_activo()))
+    return f"{exp}.{kid}.{firmas.b64url(mac[:_MAC_BYTES])}", datetime.utcfromtimestamp(exp)
 
-    token = str(uuid.uuid4())[:10]
-    qr_vigencia = datetime.utcnow() + timedelta(minutes=minutos_vigencia)
-    payload = f"AXS|{visita_id}|{token}"
 
-    img = qrcode.make(payload)
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
+def verificar_token(visita_id: str, token: str, ahora: Optional[float] = None) -> datetime:
+    """Verificar en memoria un token firmado; devuelve su vigencia.
+
+    Lanza `QRInvalido` (falsificado, de otra visita, llave desconocida) o
+    `QRExpirado`. No consulta la base: el uso único lo decide `redimir_qr`.
+    """
+    try:
+        exp_txt, kid, mac = token.split(".")
+        exp = int(exp_txt)
+        firmas.verificar(
+            _mensaje_firmado(str(visita_id).strip(), exp, kid), kid, firmas.b64url_decode(mac), _MAC_BYTES
+        )
+    except (ValueError, firmas.FirmaInvalida):
+        raise QRInvalido("QR inválido") from None
+    if exp <= (ahora if ahora is not None else time.time()):
+        raise QRExpirado("QR expirado")
+    return datetime.utcfromtimestamp(exp)
+
+
+def generar_qr_para_visita(visita_id: str, minutos_vigencia: int = 60):
+    # normalize inputs
+    visita_id = str(visita_id).strip()
+    token, qr_vigencia = nuevo_token(visita_id, minutos_vigencia)
 
     return {
         "token": token,
         "qr_vigencia": qr_vigencia,
-        "qr_bytes": buffer.getvalue(),
+        "qr_bytes": renderizar_qr(visita_id, token),
     }
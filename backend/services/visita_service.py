@@ -1,13 +1,21 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
-from typing import Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Tuple
 import uuid
+from sqlalchemy import Select, Update, bindparam, insert, select, tuple_, union_all, update
 
-from ..db.models import Visita, Evidencia
+from ..db import write_queue
+from ..db.models import Visita, VisitaArchivada, Evidencia
 from ..utils.hash_tools import calcular_hash_sha256
 from ..utils.file_storage import guardar_archivo
 from ..core.config import settings
+from ..utils.paginacion import codificar_cursor, decodificar_cursor
+from . import qr_service
+
+if TYPE_CHECKING:
+    # Sólo para anotaciones: sqlalchemy.ext.asyncio se carga con el engine async
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 
 # ---------------------------------------------------------
@@ -41,6 +49,47 @@ def crear_visita(db: Session, data: Any, condominio_id: str, casa_unidad: Option
     return visita
 
 
+# ---------------------------------------------------------
+# Crear visitas en lote con su token QR (ADMIN_CONDOMINIO)
+# ---------------------------------------------------------
+def crear_visitas_lote(
+    db: Session,
+    items: Iterable[Any],
+    condominio_id: str,
+    minutos_vigencia_qr: int = 60,
+) -> List[dict]:
+    """Insertar N visitas (ya con `qr_token`/`qr_vigencia`) en una sola transacción.
+
+    Usa un INSERT multi-fila en lugar de ORM + refresh por objeto, y devuelve
+    los valores insertados como dicts para no releer nada de la base.
+    """
+    filas = []
+    for item in items:
+        visita_id = generar_visita_id()
+        token, qr_vigencia = qr_service.nuevo_token(visita_id, minutos_vigencia_qr)
+        filas.append({
+            "visita_id": visita_id,
+            "condominio_id": condominio_id,
+            "nombre_visitante": getattr(item, "nombre_visitante", None),
+            "casa_unidad": getattr(item, "casa_unidad", None),
+            "tipo_visita": getattr(item, "tipo_visita", None),
+            "vigencia": getattr(item, "vigencia", None),
+            "qr_token": token,
+            "qr_vigencia": qr_vigencia,
+            "estado": "pendiente",
+        })
+    if not filas:
+        return filas
+
+    try:
+        db.execute(insert(Visita), filas)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return filas
+
+
 # ---------------------------------------------------------
 # Actualizar QR
 # ---------------------------------------------------------
@@ -58,6 +107,30 @@ def actualizar_qr(db: Session, visita_id: str, token: str, qr_vigencia: datetime
     return visita
 
 
+def _rotar_qr(db: Session, visita_id: str, token: str, qr_vigencia: datetime) -> bool:
+    stmt = (
+        update(Visita)
+        .where(Visita.visita_id == visita_id)
+        .values(qr_token=token, qr_vigencia=qr_vigencia)
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(stmt).rowcount == 1
+
+
+async def actualizar_qr_async(db: "AsyncSession", visita_id: str, token: str, qr_vigencia: datetime) -> bool:
+    """Rotar el token QR con un solo UPDATE (sin cargar la visita)."""
+    if write_queue.cola_activa():
+        return await write_queue.ejecutar_escritura(_rotar_qr, visita_id, token, qr_vigencia)
+
+    try:
+        rotado = await db.run_sync(_rotar_qr, visita_id, token, qr_vigencia)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return rotado
+
+
 # ---------------------------------------------------------
 # Registrar entrada
 # ---------------------------------------------------------
@@ -75,6 +148,72 @@ def registrar_entrada(db: Session, visita_id: str) -> Optional[Visita]:
     return visita
 
 
+# ---------------------------------------------------------
+# Redimir QR en caseta (un solo UPDATE condicional)
+# ---------------------------------------------------------
+def sentencia_redimir_qr(visita_id: str, token: str, ahora: datetime) -> Update:
+    return (
+        update(Visita)
+        .where(
+            Visita.visita_id == visita_id,
+            Visita.qr_token == token,
+            Visita.estado == "pendiente",
+            Visita.qr_vigencia > ahora,
+        )
+        .values(estado="entrada_registrada", entrada_registrada_en=ahora)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def redimir_qr(db: Session, visita_id: str, token: str, ahora: Optional[datetime] = None) -> Optional[dict]:
+    """Marcar la entrada sólo si el QR es válido, vigente y no se ha usado.
+
+    Toda la validación va en el WHERE del UPDATE, así que dos casetas que
+    escanean el mismo QR a la vez no pueden admitirlo dos veces: sólo una
+    afecta la fila. Devuelve los datos para la respuesta de caseta o `None`
+    si el QR no se pudo redimir (el motivo se averigua aparte, fuera del camino feliz).
+    """
+    try:
+        resultado = _redimir(db, visita_id, token, ahora or datetime.utcnow())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return resultado
+
+
+def _redimir(db: Session, visita_id: str, token: str, ahora: datetime) -> Optional[dict]:
+    """UPDATE condicional de `redimir_qr`, sin commit (lo hace quien llama o la cola)."""
+    stmt = sentencia_redimir_qr(visita_id, token, ahora)
+    columnas = (Visita.nombre_visitante, Visita.casa_unidad, Visita.condominio_id)
+
+    if db.get_bind().dialect.update_returning:
+        fila = db.execute(stmt.returning(*columnas)).first()
+    else:
+        # SQLite < 3.35: sin RETURNING, leer los datos sólo si hubo fila afectada
+        fila = None
+        if db.execute(stmt).rowcount == 1:
+            fila = db.execute(select(*columnas).where(Visita.visita_id == visita_id)).first()
+    return dict(fila._mapping) if fila else None
+
+
+async def redimir_qr_async(
+    db: "AsyncSession", visita_id: str, token: str, ahora: Optional[datetime] = None
+) -> Optional[dict]:
+    """Versión async de `redimir_qr` (mismo UPDATE condicional)."""
+    ahora = ahora or datetime.utcnow()
+    if write_queue.cola_activa():
+        return await write_queue.ejecutar_escritura(_redimir, visita_id, token, ahora)
+
+    try:
+        resultado = await db.run_sync(_redimir, visita_id, token, ahora)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return resultado
+
+
 # ---------------------------------------------------------
 # Registrar salida
 # ---------------------------------------------------------
@@ -93,275 +232,237 @@ def registrar_salida(db: Session, visita_id: str) -> Optional[Visita]:
 
 
 # ---------------------------------------------------------
-# Crear visita desde preregistro (RESIDENTE)
+# Eventos de entrada/salida en lote (casetas, buffer offline)
 # ---------------------------------------------------------
-def crear_desde_preregistro(db: Session, data: Any, usuario: Any) -> Visita:
-    """
-    Crear una visita desde preregistro.
-    Incluye evidencia metadata-only sin archivos (archivo_url='', hash_sha256='').
-    Todo se maneja en una sola transacción para evitar commits anidados.
-    """
+_COLUMNAS_EVENTO = (
+    Visita.id,
+    Visita.visita_id,
+    Visita.estado,
+    Visita.qr_token,
+    Visita.qr_vigencia,
+    Visita.entrada_registrada_en,
+    Visita.salida_registrada_en,
+)
 
-    condominio_id = getattr(usuario, "condominio_id", None)
-    casa_unidad = getattr(usuario, "casa_unidad", None)
 
-    def _normalize_str(val: Optional[str]) -> Optional[str]:
-        if val is None:
-            return None
-        v = str(val).strip()
-        return v if v != "" else None
+def _utc_naive(fecha: datetime) -> datetime:
+    """Las fechas se guardan en UTC sin zona: normalizar las del cliente."""
+    if fecha.tzinfo is not None:
+        return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
 
-    nombre_visitante = _normalize_str(getattr(data, "nombre_visitante", None))
-    tipo_visita = _normalize_str(getattr(data, "tipo_visita", None))
-    vigencia = getattr(data, "fecha_visita", None)
 
-    try:
-        # Transacción atómica
-        with db.begin():
+def _aplicar_evento(fila: dict, evento: Any, cuando: datetime) -> Tuple[str, Optional[str]]:
+    """Aplicar un evento sobre el estado en memoria de la visita.
 
-            visita_id = generar_visita_id()
-            visita = Visita(
-                visita_id=visita_id,
-                condominio_id=condominio_id,
-                nombre_visitante=nombre_visitante,
-                casa_unidad=casa_unidad,
-                tipo_visita=tipo_visita,
-                vigencia=vigencia,
-                estado="pendiente",
-            )
-            db.add(visita)
+    Devuelve `(resultado, detalle)`. Un evento repetido con la misma hora que
+    el ya registrado es `duplicado` (la caseta reenvió su buffer) y no cambia nada.
 
-            # Metadata opcional
-            metadata = {}
-            notas = _normalize_str(getattr(data, "notas", None))
-            placa = _normalize_str(getattr(data, "placa", None))
-            documento = _normalize_str(getattr(data, "documento", None))
-
-            if notas:
-                metadata["notas"] = notas
-            if placa:
-                metadata["placa"] = placa
-            if documento:
-                metadata["documento"] = documento
-
-            if metadata:
-                evidencia = Evidencia(
-                    evidencia_id=str(uuid.uuid4()),
-                    visita_id=visita.visita_id,
-                    categoria="preregistro",
-                    sub_tipo="preregistro_metadata",
-                    archivo_url="",      # ⚠️ Nunca NULL
-                    hash_sha256="",      # ⚠️ Nunca NULL
-                    guardia_id=getattr(usuario, "usuario_id", None),
-                    metadata_json={**metadata, "created_by": getattr(usuario, "usuario_id", None)},
-                )
-                db.add(evidencia)
+    Una entrada sobre una visita `expirada` se acepta si trae el QR de la visita
+    y ocurrió mientras ese QR seguía vigente: la caseta la admitió sin conexión y
+    el barrido de expiración la marcó sólo porque el evento aún no llegaba. Sin
+    QR, o escaneado ya vencido, se rechaza.
+    """
+    estado = fila["estado"]
+    if evento.tipo == "entrada":
+        if estado in ("entrada_registrada", "salida_registrada"):
+            if fila["entrada_registrada_en"] == cuando:
+                return "duplicado", None
+            return "rechazado", "Entrada ya registrada"
+        if estado == "expirada":
+            if evento.token is None or not fila["qr_vigencia"] or cuando > fila["qr_vigencia"]:
+                return "rechazado", "Visita expirada"
+        elif estado != "pendiente":
+            return "rechazado", f"Visita {estado}"
+        if evento.token is not None:
+            if evento.token != fila["qr_token"]:
+                return "rechazado", "QR inválido"
+            if fila["qr_vigencia"] and cuando > fila["qr_vigencia"]:
+                return "rechazado", "QR expirado"
+        fila.update(estado="entrada_registrada", entrada_registrada_en=cuando)
+        return "aplicado", None
+
+    if estado == "salida_registrada":
+        if fila["salida_registrada_en"] == cuando:
+            return "duplicado", None
+        return "rechazado", "Salida ya registrada"
+    if estado != "entrada_registrada":
+        return "rechazado", "Salida sin entrada registrada"
+    if fila["entrada_registrada_en"] and cuando < fila["entrada_registrada_en"]:
+        return "rechazado", "Salida anterior a la entrada"
+    fila.update(estado="salida_registrada", salida_registrada_en=cuando)
+    return "aplicado", None
+
+
+def _registrar_eventos(db: Session, eventos: List[Any], condominio_id: str, ahora: datetime) -> List[dict]:
+    """Aplicar el lote sin commit (lo hace quien llama o la cola de escritura).
+
+    Un SELECT (con bloqueo de filas donde el motor lo soporta) trae el estado
+    de todas las visitas del lote, los eventos se aplican en memoria en orden
+    de `ocurrido_en`, y un solo UPDATE executemany escribe el estado final de
+    las visitas que cambiaron. Devuelve un resultado por evento, en el orden
+    recibido.
+    """
+    ids = {e.visita_id for e in eventos}
+    stmt = (
+        select(*_COLUMNAS_EVENTO)
+        .where(Visita.condominio_id == condominio_id, Visita.visita_id.in_(ids))
+        .with_for_update()
+    )
+    filas = {f.visita_id: dict(f._mapping) for f in db.execute(stmt)}
+    originales = {k: dict(v) for k, v in filas.items()}
+
+    limite_futuro = ahora + timedelta(seconds=settings.EVENTOS_TOLERANCIA_S)
+    cuandos = [_utc_naive(e.ocurrido_en) for e in eventos]
+    resultados: List[Optional[dict]] = [None] * len(eventos)
+    for i in sorted(range(len(eventos)), key=cuandos.__getitem__):
+        evento, cuando = eventos[i], cuandos[i]
+        fila = filas.get(evento.visita_id)
+        if fila is None:
+            resultado, detalle = "rechazado", "Visita no encontrada"
+        elif cuando > limite_futuro:
+            resultado, detalle = "rechazado", "Fecha del evento en el futuro"
+        else:
+            resultado, detalle = _aplicar_evento(fila, evento, cuando)
+        resultados[i] = {
+            "visita_id": evento.visita_id,
+            "tipo": evento.tipo,
+            "resultado": resultado,
+            "detalle": detalle,
+            "estado": fila["estado"] if fila else None,
+        }
+
+    cambios = [
+        {
+            "_id": fila["id"],
+            "_estado": fila["estado"],
+            "_entrada": fila["entrada_registrada_en"],
+            "_salida": fila["salida_registrada_en"],
+        }
+        for visita_id, fila in filas.items()
+        if fila != originales[visita_id]
+    ]
+    if cambios:
+        tabla = Visita.__table__
+        db.execute(
+            update(tabla)
+            .where(tabla.c.id == bindparam("_id"))
+            .values(
+                estado=bindparam("_estado"),
+                entrada_registrada_en=bindparam("_entrada"),
+                salida_registrada_en=bindparam("_salida"),
+            ),
+            cambios,
+        )
+    return resultados
 
-        # Refresh fuera de la transacción
-        try:
-            db.refresh(visita)
-        except Exception:
-            pass
 
-    except SQLAlchemyError:
-        try:
-            db.rollback()
-        except Exception:
-            pass
+def registrar_eventos(
+    db: Session, eventos: List[Any], condominio_id: str, ahora: Optional[datetime] = None
+) -> List[dict]:
+    """Registrar un lote de entradas/salidas de caseta en una sola transacción."""
+    try:
+        resultados = _registrar_eventos(db, eventos, condominio_id, ahora or datetime.utcnow())
+        db.commit()
+    except Exception:
+        db.rollback()
         raise
+    return resultados
 
-    return visita
 
+async def registrar_eventos_async(
+    db: "AsyncSession", eventos: List[Any], condominio_id: str, ahora: Optional[datetime] = None
+) -> List[dict]:
+    """Versión async de `registrar_eventos`."""
+    ahora = ahora or datetime.utcnow()
+    if write_queue.cola_activa():
+        return await write_queue.ejecutar_escritura(_registrar_eventos, eventos, condominio_id, ahora)
 
-# ---------------------------------------------------------
-# Obtener visitas de residente
-# ---------------------------------------------------------
-def obtener_visitas_residente(db: Session, condominio_id: str, casa_unidad: str):
-    return (
-        db.query(Visita)
-        .filter(
-            Visita.condominio_id == condominio_id,
-            Visita.casa_unidad == casa_unidad,
-        )
-        .order_by(Visita.vigencia.desc())
-        .all()
-    )
-
-
-# ---------------------------------------------------------
-# Obtener visitas por condominio
-# ---------------------------------------------------------
-def obtener_visitas_condominio(db: Session, condominio_id: str):
-    return (
-        db.query(Visita)
-        .filter(Visita.condominio_id == condominio_id)
-        .order_by(Visita.vigencia.desc())
-        .all()
-    )
+    try:
+        resultados = await db.run_sync(_registrar_eventos, eventos, condominio_id, ahora)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return resultados
 
 
 # ---------------------------------------------------------
-# Obtener visita individual
+# Crear visita desde preregistro (RESIDENTE)
 # ---------------------------------------------------------
-def obtener_visita(db: Session, visita_id: str):
-    return db.query(Visita).filter(Visita.visita_id == visita_id).first()
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
-from typing import Any, Optional
-import uuid
+def _normalize_str(val: Optional[str]) -> Optional[str]:
+    if val is None:
+        return None
+    v = str(val).strip()
+    return v if v != "" else None
 
-from ..db.models import Visita, Evidencia
-from ..utils.hash_tools import calcular_hash_sha256
-from ..utils.file_storage import guardar_archivo
-from ..core.config import settings
-
-
-# ---------------------------------------------------------
-# Generador de IDs
-# ---------------------------------------------------------
-def generar_visita_id() -> str:
-    return f"VIS-{uuid.uuid4().hex[:10]}"
 
+def _objetos_preregistro(
+    data: Any,
+    usuario: Any,
+    minutos_vigencia_qr: Optional[int] = None,
+) -> Tuple[Visita, Optional[Evidencia]]:
+    """Visita del preregistro y, si hay metadata opcional, su evidencia metadata-only.
 
-# ---------------------------------------------------------
-# Crear visita (ADMIN_CONDOMINIO)
-# ---------------------------------------------------------
-def crear_visita(db: Session, data: Any, condominio_id: str, casa_unidad: Optional[str] = None) -> Visita:
+    Con `minutos_vigencia_qr` la visita sale ya con su token QR firmado.
+    """
     visita_id = generar_visita_id()
+    qr_token = qr_vigencia = None
+    if minutos_vigencia_qr is not None:
+        qr_token, qr_vigencia = qr_service.nuevo_token(visita_id, minutos_vigencia_qr)
+
     visita = Visita(
         visita_id=visita_id,
-        condominio_id=condominio_id,
-        nombre_visitante=getattr(data, "nombre_visitante", None),
-        casa_unidad=casa_unidad,
-        tipo_visita=getattr(data, "tipo_visita", None),
-        vigencia=getattr(data, "vigencia", None),
+        condominio_id=getattr(usuario, "condominio_id", None),
+        nombre_visitante=_normalize_str(getattr(data, "nombre_visitante", None)),
+        casa_unidad=getattr(usuario, "casa_unidad", None),
+        tipo_visita=_normalize_str(getattr(data, "tipo_visita", None)),
+        vigencia=getattr(data, "fecha_visita", None),
+        qr_token=qr_token,
+        qr_vigencia=qr_vigencia,
         estado="pendiente",
     )
-    try:
-        db.add(visita)
-        db.commit()
-        db.refresh(visita)
-    except Exception:
-        db.rollback()
-        raise
-    return visita
-
-
-# ---------------------------------------------------------
-# Actualizar QR
-# ---------------------------------------------------------
-def actualizar_qr(db: Session, visita_id: str, token: str, qr_vigencia: datetime) -> Optional[Visita]:
-    visita = db.query(Visita).filter(Visita.visita_id == visita_id).first()
-    if visita:
-        visita.qr_token = token
-        visita.qr_vigencia = qr_vigencia
-        try:
-            db.commit()
-            db.refresh(visita)
-        except Exception:
-            db.rollback()
-            raise
-    return visita
-
-
-# ---------------------------------------------------------
-# Registrar entrada
-# ---------------------------------------------------------
-def registrar_entrada(db: Session, visita_id: str) -> Optional[Visita]:
-    visita = db.query(Visita).filter(Visita.visita_id == visita_id).first()
-    if visita:
-        visita.estado = "entrada_registrada"
-        visita.entrada_registrada_en = datetime.utcnow()
-        try:
-            db.commit()
-            db.refresh(visita)
-        except Exception:
-            db.rollback()
-            raise
-    return visita
-
 
-# ---------------------------------------------------------
-# Registrar salida
-# ---------------------------------------------------------
-def registrar_salida(db: Session, visita_id: str) -> Optional[Visita]:
-    visita = db.query(Visita).filter(Visita.visita_id == visita_id).first()
-    if visita:
-        visita.estado = "salida_registrada"
-        visita.salida_registrada_en = datetime.utcnow()
-        try:
-            db.commit()
-            db.refresh(visita)
-        except Exception:
-            db.rollback()
-            raise
-    return visita
+    # Metadata opcional
+    metadata = {}
+    notas = _normalize_str(getattr(data, "notas", None))
+    placa = _normalize_str(getattr(data, "placa", None))
+    documento = _normalize_str(getattr(data, "documento", None))
+
+    if notas:
+        metadata["notas"] = notas
+    if placa:
+        metadata["placa"] = placa
+    if documento:
+        metadata["documento"] = documento
+
+    evidencia = None
+    if metadata:
+        evidencia = Evidencia(
+            evidencia_id=str(uuid.uuid4()),
+            visita_id=visita.visita_id,
+            categoria="preregistro",
+            sub_tipo="preregistro_metadata",
+            archivo_url="",      # ⚠️ Nunca NULL
+            hash_sha256="",      # ⚠️ Nunca NULL
+            guardia_id=getattr(usuario, "usuario_id", None),
+            metadata_json={**metadata, "created_by": getattr(usuario, "usuario_id", None)},
+        )
+    return visita, evidencia
 
 
-# ---------------------------------------------------------
-# Crear visita desde preregistro (RESIDENTE)
-# ---------------------------------------------------------
 def crear_desde_preregistro(db: Session, data: Any, usuario: Any) -> Visita:
     """
     Crear una visita desde preregistro.
     Incluye evidencia metadata-only sin archivos (archivo_url='', hash_sha256='').
     Todo se maneja en una sola transacción para evitar commits anidados.
     """
-
-    condominio_id = getattr(usuario, "condominio_id", None)
-    casa_unidad = getattr(usuario, "casa_unidad", None)
-
-    def _normalize_str(val: Optional[str]) -> Optional[str]:
-        if val is None:
-            return None
-        v = str(val).strip()
-        return v if v != "" else None
-
-    nombre_visitante = _normalize_str(getattr(data, "nombre_visitante", None))
-    tipo_visita = _normalize_str(getattr(data, "tipo_visita", None))
-    vigencia = getattr(data, "fecha_visita", None)
-
     try:
         # Transacción atómica
         with db.begin():
-
-            visita_id = generar_visita_id()
-            visita = Visita(
-                visita_id=visita_id,
-                condominio_id=condominio_id,
-                nombre_visitante=nombre_visitante,
-                casa_unidad=casa_unidad,
-                tipo_visita=tipo_visita,
-                vigencia=vigencia,
-                estado="pendiente",
-            )
+            visita, evidencia = _objetos_preregistro(data, usuario)
             db.add(visita)
-
-            # Metadata opcional
-            metadata = {}
-            notas = _normalize_str(getattr(data, "notas", None))
-            placa = _normalize_str(getattr(data, "placa", None))
-            documento = _normalize_str(getattr(data, "documento", None))
-
-            if notas:
-                metadata["notas"] = notas
-            if placa:
-                metadata["placa"] = placa
-            if documento:
-                metadata["documento"] = documento
-
-            if metadata:
-                evidencia = Evidencia(
-                    evidencia_id=str(uuid.uuid4()),
-                    visita_id=visita.visita_id,
-                    categoria="preregistro",
-                    sub_tipo="preregistro_metadata",
-                    archivo_url="",      # ⚠️ Nunca NULL
-                    hash_sha256="",      # ⚠️ Nunca NULL
-                    guardia_id=getattr(usuario, "usuario_id", None),
-                    metadata_json={**metadata, "created_by": getattr(usuario, "usuario_id", None)},
-                )
+            if evidencia is not None:
                 db.add(evidencia)
 
         # Refresh fuera de la transacción
@@ -380,35 +481,332 @@ def crear_desde_preregistro(db: Session, data: Any, usuario: Any) -> Visita:
     return visita
 
 
+def _agregar(db: Any, visita: Visita, evidencia: Optional[Evidencia]) -> Visita:
+    db.add(visita)
+    if evidencia is not None:
+        db.add(evidencia)
+    return visita
+
+
+async def crear_desde_preregistro_async(
+    db: "AsyncSession",
+    data: Any,
+    usuario: Any,
+    minutos_vigencia_qr: Optional[int] = 60,
+) -> Visita:
+    """Versión async de `crear_desde_preregistro`.
+
+    Genera el token QR firmado antes del INSERT para guardarlo en la misma
+    sentencia (sin un UPDATE posterior como `actualizar_qr`).
+    """
+    visita, evidencia = _objetos_preregistro(data, usuario, minutos_vigencia_qr)
+    if write_queue.cola_activa():
+        return await write_queue.ejecutar_escritura(_agregar, visita, evidencia)
+
+    try:
+        async with db.begin():
+            _agregar(db, visita, evidencia)
+    except SQLAlchemyError:
+        await db.rollback()
+        raise
+    return visita
+
+
+# ---------------------------------------------------------
+# Listados paginados (keyset sobre (vigencia, id))
+# ---------------------------------------------------------
+# Dos fases: primero las visitas con vigencia, en orden (vigencia DESC, id DESC);
+# luego las que no tienen vigencia, por id DESC. Cada fase es un rango simple de
+# (condominio_id, ..., vigencia, id) recorrido hacia atrás, así que ni SQLite ni
+# Postgres necesitan ordenar (un `NULLS LAST` o un `OR vigencia IS NULL` en la
+# misma consulta obligaba a Postgres a ordenar todo el histórico del condominio).
+def _condiciones_listado(
+    modelo: Any,
+    filtros: list,
+    posicion: Optional[Tuple[Optional[datetime], int]],
+    sin_vigencia: bool,
+    estado: Optional[str],
+    desde: Optional[datetime],
+    hasta: Optional[datetime],
+) -> list:
+    """Filtros + posición del cursor sobre `modelo` (`Visita` o `VisitaArchivada`)."""
+    filtros = list(filtros)
+    if estado:
+        filtros.append(modelo.estado == estado)
+    if desde:
+        filtros.append(modelo.vigencia >= desde)
+    if hasta:
+        filtros.append(modelo.vigencia < hasta)
+    if sin_vigencia:
+        filtros.append(modelo.vigencia.is_(None))
+        if posicion is not None:
+            filtros.append(modelo.id < posicion[1])
+    else:
+        filtros.append(modelo.vigencia.isnot(None))
+        if posicion is not None:
+            filtros.append(tuple_(modelo.vigencia, modelo.id) < posicion)
+    return filtros
+
+
+def _orden_listado(columnas: Any, sin_vigencia: bool) -> tuple:
+    if sin_vigencia:
+        return (columnas.id.desc(),)
+    return (columnas.vigencia.desc(), columnas.id.desc())
+
+
+# Columnas de `VisitaResponse` (+ id para el cursor), comunes a ambas tablas
+_COLUMNAS_LISTADO = (
+    "id", "visita_id", "condominio_id", "nombre_visitante", "casa_unidad",
+    "tipo_visita", "vigencia", "estado", "qr_token", "qr_vigencia",
+)
+
+
+def _consulta_fase(
+    filtros_por_modelo: Callable[[Any], list],
+    filas: int,
+    posicion: Optional[Tuple[Optional[datetime], int]],
+    sin_vigencia: bool,
+    estado: Optional[str],
+    desde: Optional[datetime],
+    hasta: Optional[datetime],
+    incluir_archivadas: bool,
+) -> Select:
+    """SELECT de hasta `filas` visitas de una fase, continuando desde `posicion`.
+
+    Con `incluir_archivadas` cada tabla aporta su propia página ya ordenada y
+    limitada (usando sus índices) y sólo se mezclan esas filas. Los `id` se
+    conservan al archivar, así que el mismo cursor sirve para ambas.
+    """
+    if not incluir_archivadas:
+        return (
+            select(Visita)
+            .where(*_condiciones_listado(
+                Visita, filtros_por_modelo(Visita), posicion, sin_vigencia, estado, desde, hasta
+            ))
+            .order_by(*_orden_listado(Visita, sin_vigencia))
+            .limit(filas)
+        )
+
+    partes = []
+    for modelo in (Visita, VisitaArchivada):
+        partes.append(
+            select(*(getattr(modelo, c) for c in _COLUMNAS_LISTADO))
+            .where(*_condiciones_listado(
+                modelo, filtros_por_modelo(modelo), posicion, sin_vigencia, estado, desde, hasta
+            ))
+            .order_by(*_orden_listado(modelo, sin_vigencia))
+            .limit(filas)
+            .subquery()
+        )
+    # SQLite no admite LIMIT dentro de un UNION salvo en subconsultas
+    union = union_all(*(select(p) for p in partes)).subquery()
+    return select(union).order_by(*_orden_listado(union.c, sin_vigencia)).limit(filas)
+
+
+def _consulta_pagina(
+    filtros_por_modelo: Callable[[Any], list],
+    limite: int,
+    cursor: Optional[str],
+    estado: Optional[str],
+    desde: Optional[datetime],
+    hasta: Optional[datetime],
+    incluir_archivadas: bool,
+) -> Select:
+    """Primera consulta de una página: `limite + 1` filas de la fase que indica el cursor.
+
+    El costo depende sólo de `limite`: se continúa desde la última (vigencia, id)
+    vista en lugar de usar OFFSET. Lanza `CursorInvalido` si el cursor no se
+    puede decodificar.
+    """
+    posicion = decodificar_cursor(cursor) if cursor else None
+    sin_vigencia = posicion is not None and posicion[0] is None
+    return _consulta_fase(
+        filtros_por_modelo, limite + 1, posicion, sin_vigencia, estado, desde, hasta, incluir_archivadas
+    )
+
+
+def _consulta_cola_sin_vigencia(
+    filtros_por_modelo: Callable[[Any], list],
+    faltan: int,
+    cursor: Optional[str],
+    estado: Optional[str],
+    desde: Optional[datetime],
+    hasta: Optional[datetime],
+    incluir_archivadas: bool,
+) -> Optional[Select]:
+    """Si la fase con vigencia se agotó antes de llenar la página, las primeras
+    `faltan` visitas sin vigencia. `None` si no corresponde."""
+    if faltan <= 0 or desde or hasta:
+        return None
+    if cursor and decodificar_cursor(cursor)[0] is None:
+        return None  # la página ya era de la fase sin vigencia
+    return _consulta_fase(filtros_por_modelo, faltan, None, True, estado, desde, hasta, incluir_archivadas)
+
+
+def _paginar(visitas: List[Visita], limite: int) -> Tuple[List[Visita], Optional[str]]:
+    siguiente = None
+    if len(visitas) > limite:
+        visitas = visitas[:limite]
+        siguiente = codificar_cursor(visitas[-1].vigencia, visitas[-1].id)
+    return visitas, siguiente
+
+
+def _filas(resultado, incluir_archivadas: bool) -> list:
+    """Objetos `Visita` o, sobre la unión con el archivo, filas con las mismas columnas."""
+    return resultado.all() if incluir_archivadas else resultado.scalars().all()
+
+
+def _pagina(db: Session, filtros_por_modelo, limite, cursor, estado, desde, hasta, incluir_archivadas):
+    filas = _filas(
+        db.execute(_consulta_pagina(filtros_por_modelo, limite, cursor, estado, desde, hasta, incluir_archivadas)),
+        incluir_archivadas,
+    )
+    cola = _consulta_cola_sin_vigencia(
+        filtros_por_modelo, limite + 1 - len(filas), cursor, estado, desde, hasta, incluir_archivadas
+    )
+    if cola is not None:
+        filas += _filas(db.execute(cola), incluir_archivadas)
+    return _paginar(filas, limite)
+
+
+async def _pagina_async(db: "AsyncSession", filtros_por_modelo, limite, cursor, estado, desde, hasta, incluir_archivadas):
+    filas = _filas(
+        await db.execute(
+            _consulta_pagina(filtros_por_modelo, limite, cursor, estado, desde, hasta, incluir_archivadas)
+        ),
+        incluir_archivadas,
+    )
+    cola = _consulta_cola_sin_vigencia(
+        filtros_por_modelo, limite + 1 - len(filas), cursor, estado, desde, hasta, incluir_archivadas
+    )
+    if cola is not None:
+        filas += _filas(await db.execute(cola), incluir_archivadas)
+    return _paginar(filas, limite)
+
+
+def _filtros_residente(condominio_id: str, casa_unidad: str) -> Callable[[Any], list]:
+    return lambda m: [m.condominio_id == condominio_id, m.casa_unidad == casa_unidad]
+
+
+def _filtros_condominio(condominio_id: str, casa_unidad: Optional[str]) -> Callable[[Any], list]:
+    def filtros(modelo):
+        condiciones = [modelo.condominio_id == condominio_id]
+        if casa_unidad:
+            condiciones.append(modelo.casa_unidad == casa_unidad)
+        return condiciones
+
+    return filtros
+
+
+def consulta_visitas_residente(
+    condominio_id: str,
+    casa_unidad: str,
+    limite: int = 50,
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    incluir_archivadas: bool = False,
+) -> Select:
+    return _consulta_pagina(
+        _filtros_residente(condominio_id, casa_unidad), limite, cursor, estado, desde, hasta, incluir_archivadas
+    )
+
+
+def consulta_visitas_condominio(
+    condominio_id: str,
+    limite: int = 50,
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    casa_unidad: Optional[str] = None,
+    incluir_archivadas: bool = False,
+) -> Select:
+    return _consulta_pagina(
+        _filtros_condominio(condominio_id, casa_unidad), limite, cursor, estado, desde, hasta, incluir_archivadas
+    )
+
+
 # ---------------------------------------------------------
 # Obtener visitas de residente
 # ---------------------------------------------------------
-def obtener_visitas_residente(db: Session, condominio_id: str, casa_unidad: str):
-    return (
-        db.query(Visita)
-        .filter(
-            Visita.condominio_id == condominio_id,
-            Visita.casa_unidad == casa_unidad,
-        )
-        .order_by(Visita.vigencia.desc())
-        .all()
+def obtener_visitas_residente(
+    db: Session,
+    condominio_id: str,
+    casa_unidad: str,
+    limite: int = 50,
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    incluir_archivadas: bool = False,
+) -> Tuple[List[Visita], Optional[str]]:
+    return _pagina(
+        db, _filtros_residente(condominio_id, casa_unidad), limite, cursor, estado, desde, hasta, incluir_archivadas
+    )
+
+
+async def obtener_visitas_residente_async(
+    db: "AsyncSession",
+    condominio_id: str,
+    casa_unidad: str,
+    limite: int = 50,
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    incluir_archivadas: bool = False,
+) -> Tuple[List[Visita], Optional[str]]:
+    return await _pagina_async(
+        db, _filtros_residente(condominio_id, casa_unidad), limite, cursor, estado, desde, hasta, incluir_archivadas
     )
 
 
 # ---------------------------------------------------------
 # Obtener visitas por condominio
 # ---------------------------------------------------------
-def obtener_visitas_condominio(db: Session, condominio_id: str):
-    return (
-        db.query(Visita)
-        .filter(Visita.condominio_id == condominio_id)
-        .order_by(Visita.vigencia.desc())
-        .all()
+def obtener_visitas_condominio(
+    db: Session,
+    condominio_id: str,
+    limite: int = 50,
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    casa_unidad: Optional[str] = None,
+    incluir_archivadas: bool = False,
+) -> Tuple[List[Visita], Optional[str]]:
+    return _pagina(
+        db, _filtros_condominio(condominio_id, casa_unidad), limite, cursor, estado, desde, hasta, incluir_archivadas
+    )
+
+
+async def obtener_visitas_condominio_async(
+    db: "AsyncSession",
+    condominio_id: str,
+    limite: int = 50,
+    cursor: Optional[str] = None,
+    estado: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    casa_unidad: Optional[str] = None,
+    incluir_archivadas: bool = False,
+) -> Tuple[List[Visita], Optional[str]]:
+    return await _pagina_async(
+        db, _filtros_condominio(condominio_id, casa_unidad), limite, cursor, estado, desde, hasta, incluir_archivadas
     )
 
 
 # ---------------------------------------------------------
 # Obtener visita individual
 # ---------------------------------------------------------
-def obtener_visita(db: Session, visita_id: str):
-    return db.query(Visita).filter(Visita.visita_id == visita_id).first()
+def obtener_visita(db: Session, visita_id: str, incluir_archivadas: bool = False):
+    visita = db.query(Visita).filter(Visita.visita_id == visita_id).first()
+    if visita is None and incluir_archivadas:
+        visita = db.query(VisitaArchivada).filter(VisitaArchivada.visita_id == visita_id).first()
+    return visita
+
+
+async def obtener_visita_async(db: "AsyncSession", visita_id: str) -> Optional[Visita]:
+    return (await db.execute(select(Visita).where(Visita.visita_id == visita_id))).scalar_one_or_none()
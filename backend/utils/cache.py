@@ -0,0 +1,197 @@
+"""Cachés en proceso reutilizables por los servicios."""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional
+
+
+class LRUBytesCache:
+    """Caché LRU de valores `bytes` acotada por tamaño total, con capa opcional en disco.
+
+    - En memoria se expulsa la entrada menos usada hasta quedar bajo `max_bytes`.
+    - Si se indica `disk_dir`, cada valor también se escribe ahí (nombre = SHA-256
+      de la clave) y un fallo en memoria se resuelve desde disco antes de recalcular.
+    - La capa en disco se acota a `disk_max_bytes`: al pasarse, se borran los
+      archivos con mtime más antiguo (leer uno desde disco le renueva el mtime)
+      hasta quedar en el 90 % del tope.
+    - Es segura entre hilos; los procesos comparten sólo la capa en disco. Cada
+      proceso lleva su propia cuenta de bytes escritos y la corrige con el
+      recorrido del directorio que hace al expulsar.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._data: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        # None = aún no se ha medido el directorio
+        self._disk_size: Optional[int] = None
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def _disk_path(self, key: Hashable) -> Path:
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return self.disk_dir / digest[:2] / digest
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.disk_dir is not None:
+            ruta = self._disk_path(key)
+            try:
+                value = ruta.read_bytes()
+                # Renueva el mtime para que la expulsión en disco sea LRU (atime no es confiable)
+                os.utime(ruta)
+            except OSError:
+                value = None
+            if value is not None:
+                self._put_memory(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: bytes) -> None:
+        self._put_memory(key, value)
+        if self.disk_dir is not None:
+            self._put_disk(key, value)
+
+    def _put_memory(self, key: Hashable, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previo = self._data.pop(key, None)
+            if previo is not None:
+                self._size -= len(previo)
+            self._data[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, expulsado = self._data.popitem(last=False)
+                self._size -= len(expulsado)
+
+    def _put_disk(self, key: Hashable, value: bytes) -> None:
+        if len(value) > self.disk_max_bytes:
+            return
+        dest = self._disk_path(key)
+        try:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=dest.parent, suffix=".part")
+        except OSError:
+            # La capa en disco es sólo una optimización
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp, dest)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+
+        with self._disk_lock:
+            if self._disk_size is None:
+                self._disk_size = sum(tamano for _, tamano, _ in self._disk_files())
+            else:
+                self._disk_size += len(value)
+            if self._disk_size > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _disk_files(self):
+        """`(ruta, tamaño, mtime)` de cada archivo de la capa en disco."""
+        for sub in os.scandir(self.disk_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, st.st_size, st.st_mtime
+
+    def _evict_disk(self) -> None:
+        """Borrar los archivos menos recientes hasta el 90 % de `disk_max_bytes` (con `_disk_lock`)."""
+        archivos = sorted(self._disk_files(), key=lambda a: a[2])
+        total = sum(tamano for _, tamano, _ in archivos)
+        objetivo = self.disk_max_bytes * 9 // 10
+        for ruta, tamano, _ in archivos:
+            if total <= objetivo:
+                break
+            try:
+                os.unlink(ruta)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            total -= tamano
+        self._disk_size = total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+
+class TTLCache:
+    """Caché LRU con expiración por entrada y tope de elementos (segura entre hilos)."""
+
+    def __init__(self, ttl_seconds: float, max_items: int):
+        self.ttl = ttl_seconds
+        self.max_items = max_items
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expira, value = item
+            if expira <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0 or self.max_items <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -1,41 +1,287 @@
+"""Almacenamiento de evidencias direccionado por contenido.
+
+Cada archivo se guarda una sola vez bajo su SHA-256, en subdirectorios
+fragmentados `UPLOAD_DIR/ab/cd/<hash>`, de modo que:
+
+- dos uploads con el mismo nombre nunca se pisan,
+- re-uploads idénticos se deduplican (las filas de `Evidencia` comparten
+  `archivo_url` y funcionan como conteo de referencias),
+- ningún directorio crece sin límite (65 536 hojas como máximo).
+
+Publicar un blob y borrarlo se serializan por hash con un `flock` (entre
+procesos y workers). Un blob sin referencias sólo se borra si además no se
+publicó en los últimos `EVIDENCIA_GC_GRACIA_S` segundos: publicar refresca su
+mtime, y entre publicar y confirmar la fila de `Evidencia` no hay referencia
+todavía. Lo que quede huérfano (lotes fallidos, borrados diferidos) lo recoge
+`recolectar_huerfanos`.
+"""
+import hashlib
 import os
 import re
+import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
-import aiofiles
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
 from ..core.config import settings
 
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (sólo desarrollo)
+    fcntl = None
 
-_FILENAME_SANITIZE_RE = re.compile(r"[^A-Za-z0-9._-]")
 
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+_TMP_DIRNAME = ".tmp"
+_LOCKS_DIRNAME = ".locks"
 
-def _secure_filename(name: str) -> str:
-    # Remove path separators and disallowed chars
-    name = os.path.basename(name)
-    name = _FILENAME_SANITIZE_RE.sub("_", name)
-    # Prevent empty names
-    return name or "file.bin"
 
+class ArchivoDemasiadoGrande(ValueError):
+    """El upload superó el tamaño máximo permitido."""
 
-async def save_file(uploaded_bytes: bytes, filename: str) -> str:
-    folder = Path(settings.UPLOAD_DIR)
-    folder.mkdir(parents=True, exist_ok=True)
-    safe_name = _secure_filename(filename)
-    dest = folder / safe_name
-    async with aiofiles.open(dest, "wb") as f:
-        await f.write(uploaded_bytes)
+
+def ruta_por_hash(hash_sha256: str) -> Path:
+    """Ruta fragmentada `UPLOAD_DIR/ab/cd/<hash>` para un SHA-256 hexadecimal."""
+    hash_sha256 = hash_sha256.lower()
+    if not _SHA256_RE.match(hash_sha256):
+        raise ValueError(f"Hash SHA-256 inválido: {hash_sha256!r}")
+    return Path(settings.UPLOAD_DIR) / hash_sha256[:2] / hash_sha256[2:4] / hash_sha256
+
+
+def _nuevo_temporal(raiz: Optional[Path] = None) -> Tuple[int, str]:
+    # El temporal vive dentro de UPLOAD_DIR para que el rename final sea atómico
+    tmp_dir = Path(raiz or settings.UPLOAD_DIR) / _TMP_DIRNAME
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    return tempfile.mkstemp(dir=tmp_dir, prefix="upload-", suffix=".part")
+
+
+def nuevo_temporal_derivado(archivo_url: str) -> Tuple[int, str]:
+    """Temporal para escribir un derivado de `archivo_url` antes de su rename.
+
+    Va al `.tmp/` del mismo almacén que el blob (`UPLOAD_DIR/ab/cd/<hash>`), no
+    junto a él: si el proceso muere a media escritura lo barre `limpiar_temporales`.
+    """
+    return _nuevo_temporal(Path(archivo_url).parents[2])
+
+
+@contextmanager
+def bloqueo_hash(hash_sha256: str) -> Iterator[None]:
+    """Exclusión entre publicar y borrar el mismo blob, también entre procesos.
+
+    Se reparte en 256 archivos de lock (por los dos primeros dígitos del hash):
+    hashes distintos rara vez esperan y no se crea un archivo por blob.
+    """
+    if fcntl is None:
+        yield
+        return
+    locks = Path(settings.UPLOAD_DIR) / _LOCKS_DIRNAME
+    locks.mkdir(parents=True, exist_ok=True)
+    fd = os.open(locks / f"{hash_sha256[:2].lower()}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _publicar(tmp_path: str, hash_sha256: str) -> str:
+    """Mover el temporal a su ruta por contenido; si ya existe, descartarlo.
+
+    Si ya existía se le refresca el mtime, para que un borrado concurrente
+    (que espera el mismo lock) lo vea recién publicado y no lo elimine antes
+    de que se confirme la evidencia que lo va a referenciar.
+    """
+    dest = ruta_por_hash(hash_sha256)
+    with bloqueo_hash(hash_sha256):
+        if dest.exists():
+            os.unlink(tmp_path)
+            os.utime(dest)
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, dest)
     return str(dest)
 
 
+def _descartar(tmp_path: str) -> None:
+    try:
+        os.unlink(tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_file(uploaded_bytes: bytes, filename: str) -> str:
+    """Versión asíncrona de `guardar_archivo` (hash, escritura y publicación en el threadpool)."""
+    return await run_in_threadpool(guardar_archivo, filename, uploaded_bytes)
+
+
 def guardar_archivo(filename: str, content: bytes) -> str:
     """Guardar contenido binario de forma síncrona y devolver la ruta.
 
-    - Sanitiza el nombre para evitar path traversal.
+    - La ruta depende sólo del contenido (SHA-256), nunca del nombre recibido.
     - Usa `UPLOAD_DIR` desde settings.
     """
-    folder = Path(settings.UPLOAD_DIR)
-    folder.mkdir(parents=True, exist_ok=True)
-    safe_name = _secure_filename(filename)
-    dest = folder / safe_name
-    with open(dest, "wb") as f:
-        f.write(content)
-    return str(dest)
+    fd, tmp_path = _nuevo_temporal()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        return _publicar(tmp_path, hashlib.sha256(content).hexdigest())
+    except BaseException:
+        _descartar(tmp_path)
+        raise
+
+
+def guardar_stream(
+    fileobj: BinaryIO,
+    filename: str,
+    max_bytes: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> Tuple[str, str, int]:
+    """Copiar un stream a disco por bloques calculando SHA-256 en la misma pasada.
+
+    - La memoria usada es de un bloque (`UPLOAD_CHUNK_SIZE`) sin importar el tamaño.
+    - Escribe en un temporal dentro de `UPLOAD_DIR` y al terminar lo publica en
+      su ruta por contenido (o lo descarta si ese contenido ya estaba guardado).
+    - Aborta en cuanto se supera `max_bytes` (lanza `ArchivoDemasiadoGrande`).
+
+    Devuelve `(ruta, hash_sha256, tamaño_bytes)`.
+    """
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    sha = hashlib.sha256()
+    total = 0
+    fd, tmp_path = _nuevo_temporal()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if max_bytes is not None and total > max_bytes:
+                    raise ArchivoDemasiadoGrande(
+                        f"Archivo '{filename}' excede tamaño máximo de {max_bytes // (1024 * 1024)} MB"
+                    )
+                sha.update(chunk)
+                out.write(chunk)
+        hash_sha = sha.hexdigest()
+        return _publicar(tmp_path, hash_sha), hash_sha, total
+    except BaseException:
+        _descartar(tmp_path)
+        raise
+
+
+def _escribir_bloque(out: BinaryIO, sha, chunk: bytes) -> None:
+    sha.update(chunk)
+    out.write(chunk)
+
+
+async def guardar_stream_async(
+    upload,
+    filename: str,
+    max_bytes: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> Tuple[str, str, int]:
+    """Versión asíncrona de `guardar_stream` para un `UploadFile` (o cualquier
+    objeto con `async read(n)`).
+
+    Todo lo bloqueante corre en el threadpool: crear el temporal, hashear y
+    escribir cada bloque (en un solo salto; hashlib suelta el GIL con bloques
+    grandes) y publicar, que puede esperar el lock del hash. El loop sólo lee
+    el upload.
+    """
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    sha = hashlib.sha256()
+    total = 0
+    fd, tmp_path = await run_in_threadpool(_nuevo_temporal)
+    try:
+        out = os.fdopen(fd, "wb")
+        try:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if max_bytes is not None and total > max_bytes:
+                    raise ArchivoDemasiadoGrande(
+                        f"Archivo '{filename}' excede tamaño máximo de {max_bytes // (1024 * 1024)} MB"
+                    )
+                await run_in_threadpool(_escribir_bloque, out, sha, chunk)
+        finally:
+            await run_in_threadpool(out.close)
+        hash_sha = sha.hexdigest()
+        return await run_in_threadpool(_publicar, tmp_path, hash_sha), hash_sha, total
+    except BaseException:
+        _descartar(tmp_path)
+        raise
+
+
+def ruta_servible(archivo_url: str) -> Optional[Path]:
+    """Ruta real de un blob si existe y está dentro de `UPLOAD_DIR` (nunca servir otra cosa)."""
+    if not archivo_url:
+        return None
+    raiz = Path(settings.UPLOAD_DIR).resolve()
+    ruta = Path(archivo_url).resolve()
+    if raiz not in ruta.parents or not ruta.is_file():
+        return None
+    return ruta
+
+
+def ruta_derivado(archivo_url: str, nombre: str) -> str:
+    """Ruta de un derivado (miniatura) junto a su blob: `<hash>.<nombre>.jpg`.
+
+    Depende sólo del contenido del original, igual que el blob.
+    """
+    return f"{archivo_url}.{nombre}.jpg"
+
+
+def eliminar_archivo(archivo_url: str) -> bool:
+    """Borrar un blob del almacén y sus derivados. Sólo debe llamarse cuando ya no tiene referencias."""
+    for derivado in Path(archivo_url).parent.glob(f"{Path(archivo_url).name}.*.jpg"):
+        _descartar(str(derivado))
+    try:
+        os.unlink(archivo_url)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def recolectar_blob(archivo_url: str, referenciado: Callable[[], bool], gracia_s: Optional[float] = None) -> bool:
+    """Borrar un blob si, bajo su lock, no tiene referencias ni se publicó hace poco.
+
+    `referenciado` se evalúa ya con el lock tomado, así que ninguna publicación
+    del mismo hash puede colarse entre la verificación y el borrado.
+    """
+    gracia_s = settings.EVIDENCIA_GC_GRACIA_S if gracia_s is None else gracia_s
+    with bloqueo_hash(Path(archivo_url).name):
+        try:
+            mtime = os.stat(archivo_url).st_mtime
+        except FileNotFoundError:
+            return False
+        if time.time() - mtime < gracia_s or referenciado():
+            return False
+        return eliminar_archivo(archivo_url)
+
+
+def blobs_en_disco() -> Iterator[str]:
+    """Rutas de todos los blobs del almacén (sin derivados, temporales ni locks)."""
+    raiz = Path(settings.UPLOAD_DIR)
+    for nivel1 in sorted(raiz.glob("[0-9a-f][0-9a-f]")):
+        for nivel2 in sorted(nivel1.glob("[0-9a-f][0-9a-f]")):
+            for ruta in nivel2.iterdir():
+                if _SHA256_RE.match(ruta.name):
+                    yield str(ruta)
+
+
+def limpiar_temporales(gracia_s: Optional[float] = None) -> int:
+    """Borrar temporales de uploads y derivados abandonados (proceso caído a media escritura)."""
+    gracia_s = settings.EVIDENCIA_GC_GRACIA_S if gracia_s is None else gracia_s
+    limite = time.time() - gracia_s
+    borrados = 0
+    for tmp in (Path(settings.UPLOAD_DIR) / _TMP_DIRNAME).glob("upload-*.part"):
+        try:
+            if tmp.stat().st_mtime < limite:
+                tmp.unlink()
+                borrados += 1
+        except FileNotFoundError:
+            pass
+    return borrados
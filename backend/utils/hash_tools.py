@@ -1,3 +1,5 @@
+from typing import Optional, Tuple
+
 from ..core.security import get_password_hash, verify_password
 
 # Wrappers simples para uso desde el código del proyecto
@@ -15,3 +17,30 @@ def calcular_hash_sha256(content: bytes) -> str:
     h = hashlib.sha256()
     h.update(content)
     return h.hexdigest()
+
+
+def sha256_archivo(ruta: str) -> Tuple[str, Optional[str], int, int, Optional[str]]:
+    """`(ruta, sha256_hex, tamaño, mtime_ns, error)` leyendo el archivo con mmap.
+
+    Si no existe, hash y error son `None`; si existe pero no se puede leer
+    (directorio, permisos, error de E/S) el hash es `None` y `error` lo describe.
+
+    Corre en el pool de procesos: el hash se calcula directo sobre las páginas
+    mapeadas (sin copiar el archivo a memoria de Python ni leerlo por bloques).
+    """
+    import hashlib
+    import mmap
+    import os
+
+    try:
+        with open(ruta, "rb") as f:
+            st = os.fstat(f.fileno())
+            h = hashlib.sha256()
+            if st.st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    h.update(mm)
+    except FileNotFoundError:
+        return ruta, None, 0, 0, None
+    except OSError as e:
+        return ruta, None, 0, 0, f"{type(e).__name__}: {e.strerror or e}"
+    return ruta, h.hexdigest(), st.st_size, st.st_mtime_ns, None
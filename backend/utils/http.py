@@ -0,0 +1,18 @@
+"""Helpers HTTP compartidos por los routers."""
+from typing import Optional
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """True si el header `If-None-Match` incluye `etag` (comparación débil, RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    objetivo = etag[2:] if etag.startswith("W/") else etag
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato == objetivo:
+            return True
+    return False
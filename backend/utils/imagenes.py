@@ -0,0 +1,52 @@
+"""Derivados reducidos de fotos de evidencia.
+
+`generar_derivados` corre en el pool de procesos: es una función de módulo con
+argumentos simples, e importa PIL adentro para que el worker web no lo cargue
+hasta que hace falta.
+"""
+import os
+from typing import Dict
+
+from .file_storage import nuevo_temporal_derivado, ruta_derivado
+
+
+def generar_derivados(archivo_url: str, tamanos: Dict[str, int], calidad: int = 80) -> Dict[str, dict]:
+    """JPEG reducidos de `archivo_url`, uno por `{nombre: lado_máximo_px}`, junto al original.
+
+    Devuelve `{nombre: {archivo_url, ancho, alto, bytes}}`, o `{}` si el archivo
+    no es una imagen (p. ej. un PDF en `documento`). Un derivado ya existente se
+    reutiliza: como el blob, depende sólo del contenido.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(archivo_url) as original:
+            # JPEG: decodificar directo a escala reducida (1/2, 1/4, 1/8), mucho más barato
+            lado = max(tamanos.values())
+            original.draft("RGB", (lado, lado))
+            imagen = ImageOps.exif_transpose(original).convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return {}
+
+    derivados = {}
+    # Del más grande al más chico, reduciendo cada uno a partir del anterior
+    for nombre, px in sorted(tamanos.items(), key=lambda t: -t[1]):
+        imagen = imagen.copy()
+        imagen.thumbnail((px, px), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        destino = ruta_derivado(archivo_url, nombre)
+        if not os.path.exists(destino):
+            fd, tmp_path = nuevo_temporal_derivado(archivo_url)
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    imagen.save(out, format="JPEG", quality=calidad, optimize=True)
+                os.replace(tmp_path, destino)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        derivados[nombre] = {
+            "archivo_url": destino,
+            "ancho": imagen.width,
+            "alto": imagen.height,
+            "bytes": os.path.getsize(destino),
+        }
+    return derivados
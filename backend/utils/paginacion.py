@@ -0,0 +1,23 @@
+"""Cursores opacos para paginación keyset."""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se pudo decodificar."""
+
+
+def codificar_cursor(vigencia: Optional[datetime], id_: int) -> str:
+    crudo = json.dumps([vigencia.isoformat() if vigencia else None, id_], separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        vigencia, id_ = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return (datetime.fromisoformat(vigencia) if vigencia else None), int(id_)
+    except Exception as exc:
+        raise CursorInvalido("Cursor inválido") from exc
@@ -0,0 +1,58 @@
+"""Pool de procesos compartido para trabajo CPU-bound (render de QR, imágenes).
+
+`multiprocessing` y `ProcessPoolExecutor` se importan al crear el pool, no al
+importar la app (ver `benchmarks/bench_startup.py`).
+"""
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from ..core.config import settings
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+_pool: Optional["ProcessPoolExecutor"] = None
+_lock = threading.Lock()
+
+
+def tamano_pool() -> int:
+    """Número de procesos del pool (`PROCESS_POOL_WORKERS`, 0 = número de CPUs)."""
+    return settings.PROCESS_POOL_WORKERS or os.cpu_count() or 1
+
+
+def _inicializar_proceso() -> None:
+    """Corre en cada proceso del pool al crearse, también en los que se crean tarde."""
+    if settings.STARTUP_PREWARM:
+        from ..services import qr_service
+
+        qr_service.precalentar()
+
+
+def obtener_pool() -> "ProcessPoolExecutor":
+    """Crear (una sola vez por proceso) y devolver el pool de procesos.
+
+    Usa `spawn` para no heredar hilos ni conexiones abiertas del worker web.
+    Con `STARTUP_PREWARM` cada proceso precalienta qrcode/PIL al nacer.
+    """
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                _pool = ProcessPoolExecutor(
+                    max_workers=tamano_pool(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_proceso,
+                )
+    return _pool
+
+
+def cerrar_pool(wait: bool = True) -> None:
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,25 @@
+"""Utilidades compartidas por los benchmarks."""
+import statistics
+from typing import Dict, List
+
+
+def percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    k = max(0, min(len(ordenados) - 1, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[k]
+
+
+def resumen_latencias(latencias: List[float], total_s: float, errores: int = 0) -> Dict[str, float]:
+    """Throughput y percentiles (en ms) de una ráfaga de requests."""
+    if not latencias:
+        return {"requests": 0, "errores": errores, "throughput_rps": 0.0}
+    return {
+        "requests": len(latencias),
+        "errores": errores,
+        "throughput_rps": round(len(latencias) / total_s, 1) if total_s else 0.0,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "media_ms": round(statistics.mean(latencias) * 1000, 2),
+        "max_ms": round(max(latencias) * 1000, 2),
+    }
@@ -0,0 +1,295 @@
+"""Benchmark de carga y latencia de la API, en proceso.
+
+Levanta la app (lifespan incluido) con httpx + ASGITransport sobre una base
+SQLite y un UPLOAD_DIR temporales, siembra un usuario por rol y un histórico de
+visitas, y mide cada escenario con N requests a concurrencia C:
+
+- ``preregistro``: ``POST /preregistro/crear`` (residente, con QR en base64).
+- ``qr_validar``: ``GET /qr/validar/{visita_id}/{token}`` (guardia, QR nuevos).
+- ``evidencias``: ``POST /evidencias/entrada/{visita_id}`` con 3 imágenes de
+  ``--image-kb`` (contenido distinto por request: no se deduplican).
+- ``mis_visitas`` / ``condominio``: primera página de ambos listados.
+
+Para cada escenario reporta throughput y p50/p95/p99, y guarda todo en JSON
+para comparar ramas antes de desplegar:
+
+    python -m benchmarks.bench_api run --requests 300 --concurrency 32 --output base.json
+    python -m benchmarks.bench_api run --output rama.json
+    python -m benchmarks.bench_api compare base.json rama.json --umbral 10
+
+``compare`` sale con código 1 si algún p95 empeora más de ``--umbral`` % o el
+throughput cae más de ese porcentaje.
+
+Para medir contra otra base (p. ej. PostgreSQL) basta exportar ``DATABASE_URL``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+from benchmarks._comun import resumen_latencias  # noqa: E402
+
+ESCENARIOS = ["preregistro", "qr_validar", "evidencias", "mis_visitas", "condominio"]
+USUARIOS = {
+    "bench-residente": "RESIDENTE",
+    "bench-admin": "ADMIN_CONDOMINIO",
+    "bench-guardia": "GUARDIA",
+}
+CONDOMINIO = "BENCH"
+CASA = "A-101"
+
+
+def _preparar_entorno() -> None:
+    tmp = Path(tempfile.mkdtemp(prefix="axs-bench-api-"))
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmp / 'bench.db'}")
+    os.environ.setdefault("UPLOAD_DIR", str(tmp / "uploads"))
+    # Un solo proceso: basta una llave efímera para firmar QR
+    os.environ.setdefault("AUTH_DEV_EPHEMERAL_KEY", "true")
+    # Los escenarios se autentican con X-User-Id (base desechable)
+    os.environ.setdefault("AUTH_LEGACY_HEADER", "true")
+
+
+def _sembrar(historico: int) -> None:
+    from sqlalchemy import select
+
+    from backend.db.connection import SessionLocal
+    from backend.db.migrations import upgrade
+    from backend.db.models import Usuario
+    from backend.schemas.visita import VisitaLoteItem
+    from backend.services import visita_service
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        for usuario_id, rol in USUARIOS.items():
+            # usuario_id no es la PK: db.get() buscaría por `id`
+            existente = db.execute(select(Usuario).where(Usuario.usuario_id == usuario_id)).scalar_one_or_none()
+            if existente is None:
+                db.add(Usuario(usuario_id=usuario_id, rol=rol, condominio_id=CONDOMINIO, casa_unidad=CASA))
+        db.commit()
+
+        # Histórico para que los listados recorran índices con datos reales
+        base = datetime.utcnow()
+        items = [
+            VisitaLoteItem(
+                nombre_visitante=f"Histórico {i}",
+                tipo_visita="visita_personal",
+                vigencia=base - timedelta(hours=i),
+                casa_unidad=CASA if i % 4 == 0 else f"B-{i % 50:03d}",
+            )
+            for i in range(historico)
+        ]
+        for inicio in range(0, len(items), 1000):
+            visita_service.crear_visitas_lote(db, items[inicio:inicio + 1000], CONDOMINIO)
+    finally:
+        db.close()
+
+
+def _visitas_con_qr(n: int):
+    """Crear `n` visitas pendientes con QR vigente y devolver (visita_id, token)."""
+    from backend.db.connection import SessionLocal
+    from backend.schemas.visita import VisitaLoteItem
+    from backend.services import visita_service
+
+    db = SessionLocal()
+    try:
+        items = [
+            VisitaLoteItem(nombre_visitante=f"Bench {i}", tipo_visita="visita_personal",
+                           vigencia=datetime.utcnow(), casa_unidad=CASA)
+            for i in range(n)
+        ]
+        filas = visita_service.crear_visitas_lote(db, items, CONDOMINIO)
+    finally:
+        db.close()
+    return [(f["visita_id"], f["qr_token"]) for f in filas]
+
+
+def _imagen(kb: int) -> bytes:
+    # Cabecera JPEG + relleno; el contenido real da igual para el endpoint
+    return b"\xff\xd8\xff\xe0" + os.urandom(max(0, kb * 1024 - 4))
+
+
+async def _rafaga(client, n, concurrency, hacer_request):
+    sem = asyncio.Semaphore(concurrency)
+    latencias = []
+    errores = 0
+
+    async def uno(i):
+        nonlocal errores
+        async with sem:
+            t0 = time.perf_counter()
+            r = await hacer_request(client, i)
+            latencias.append(time.perf_counter() - t0)
+            if r.status_code >= 400:
+                errores += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(uno(i) for i in range(n)))
+    return resumen_latencias(latencias, time.perf_counter() - t0, errores)
+
+
+def _escenarios(args):
+    hdr = {
+        "res": {"X-User-Id": "bench-residente"},
+        "adm": {"X-User-Id": "bench-admin"},
+        "grd": {"X-User-Id": "bench-guardia"},
+    }
+    payload = {
+        "nombre_visitante": "Visitante Bench",
+        "fecha_visita": datetime.utcnow().isoformat(),
+        "tipo_visita": "visita_personal",
+        "placa": "ABC123",
+    }
+    imagen = _imagen(args.image_kb)
+
+    def preregistro(client, i):
+        return client.post("/preregistro/crear", json=payload, headers=hdr["res"])
+
+    def qr_validar_factory(total):
+        qrs = _visitas_con_qr(total)
+
+        def qr_validar(client, i):
+            visita_id, token = qrs[i]
+            return client.get(f"/qr/validar/{visita_id}/{token}", headers=hdr["grd"])
+        return qr_validar
+
+    def evidencias(client, i):
+        # Bytes iniciales distintos por request para no caer en la deduplicación
+        files = {
+            campo: (f"{campo}_{i}.jpg", os.urandom(16) + imagen, "image/jpeg")
+            for campo in ("foto_visitante", "ine_frente", "placas")
+        }
+        return client.post(f"/evidencias/entrada/VIS-BENCH-{i}", files=files, headers=hdr["grd"])
+
+    def mis_visitas(client, i):
+        return client.get("/visitas/mis-visitas", params={"limite": 50}, headers=hdr["res"])
+
+    def condominio(client, i):
+        return client.get("/visitas/condominio", params={"limite": 50}, headers=hdr["adm"])
+
+    return {
+        "preregistro": lambda total: preregistro,
+        "qr_validar": qr_validar_factory,
+        "evidencias": lambda total: evidencias,
+        "mis_visitas": lambda total: mis_visitas,
+        "condominio": lambda total: condominio,
+    }
+
+
+def _commit_git() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "desconocido"
+
+
+async def _run(args) -> dict:
+    import httpx
+    from backend.core.config import settings
+    from backend.main import app
+
+    _sembrar(args.historico)
+    fabricas = _escenarios(args)
+    resultados = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for nombre in args.escenarios:
+                hacer_request = fabricas[nombre](args.warmup + args.requests)
+                # Calentamiento (cachés, pools, imports perezosos): no cuenta
+                for i in range(args.warmup):
+                    await hacer_request(client, i)
+                resultados[nombre] = await _rafaga(
+                    client, args.requests, args.concurrency,
+                    lambda c, i: hacer_request(c, args.warmup + i),
+                )
+                r = resultados[nombre]
+                print(
+                    f"{nombre:>12}: {r['throughput_rps']:8.1f} req/s  p50={r['p50_ms']:8.2f}  "
+                    f"p95={r['p95_ms']:8.2f}  p99={r['p99_ms']:8.2f} ms  errores={r['errores']}",
+                    file=sys.stderr,
+                )
+
+    return {
+        "meta": {
+            "commit": _commit_git(),
+            "fecha": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "base": settings.DATABASE_URL.split(":", 1)[0],
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "image_kb": args.image_kb,
+            "historico": args.historico,
+        },
+        "escenarios": resultados,
+    }
+
+
+def _comparar(base: dict, nuevo: dict, umbral: float) -> int:
+    regresiones = []
+    print(f"{'escenario':>12}  {'p95 base':>10}  {'p95 nuevo':>10}  {'Δp95':>8}  {'rps base':>9}  {'rps nuevo':>9}  {'Δrps':>8}")
+    for nombre, b in base["escenarios"].items():
+        n = nuevo["escenarios"].get(nombre)
+        if not n or not b.get("requests") or not n.get("requests"):
+            continue
+        d_p95 = (n["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100 if b["p95_ms"] else 0.0
+        d_rps = (n["throughput_rps"] - b["throughput_rps"]) / b["throughput_rps"] * 100 if b["throughput_rps"] else 0.0
+        print(f"{nombre:>12}  {b['p95_ms']:10.2f}  {n['p95_ms']:10.2f}  {d_p95:+7.1f}%  "
+              f"{b['throughput_rps']:9.1f}  {n['throughput_rps']:9.1f}  {d_rps:+7.1f}%")
+        if d_p95 > umbral or d_rps < -umbral:
+            regresiones.append(nombre)
+    if regresiones:
+        print(f"FAIL: regresión > {umbral}% en: {', '.join(regresiones)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    run = sub.add_parser("run", help="correr los escenarios y guardar resultados")
+    run.add_argument("--requests", type=int, default=200)
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--warmup", type=int, default=10)
+    run.add_argument("--image-kb", type=int, default=350, help="tamaño de cada imagen de evidencia")
+    run.add_argument("--historico", type=int, default=5000, help="visitas sembradas para los listados")
+    run.add_argument("--escenarios", nargs="+", choices=ESCENARIOS, default=ESCENARIOS)
+    run.add_argument("--output", type=Path, help="archivo JSON de resultados (por defecto stdout)")
+
+    cmp_ = sub.add_parser("compare", help="comparar dos resultados JSON")
+    cmp_.add_argument("base", type=Path)
+    cmp_.add_argument("nuevo", type=Path)
+    cmp_.add_argument("--umbral", type=float, default=10.0, help="regresión máxima tolerada (%%)")
+
+    args = parser.parse_args(argv)
+    if args.comando == "compare":
+        return _comparar(json.loads(args.base.read_text()), json.loads(args.nuevo.read_text()), args.umbral)
+
+    _preparar_entorno()
+    resultado = asyncio.run(_run(args))
+    texto = json.dumps(resultado, indent=2)
+    if args.output:
+        args.output.write_text(texto + "\n")
+        print(f"Resultados en {args.output}", file=sys.stderr)
+    else:
+        print(texto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Benchmark de ingesta de evidencias: ruta síncrona vs. asíncrona.
+
+Levanta la app en proceso (httpx + ASGITransport) sobre una base SQLite y un
+UPLOAD_DIR temporales, y dispara ráfagas concurrentes de uploads de 6 archivos
+contra:
+
+- ``/evidencias/entrada/{visita_id}``: endpoint actual (async, escrituras en paralelo).
+- ``/_bench/evidencias/sync/{visita_id}``: la ruta anterior (``def`` + escritura
+  secuencial con ``guardar_evidencias_opcionales``), montada sólo para comparar.
+
+Uso (desde la raíz del repo):
+
+    python -m benchmarks.bench_evidencias --requests 60 --concurrency 30 --size-mb 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_TMP = tempfile.mkdtemp(prefix="axs-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(_TMP) / 'bench.db'}")
+os.environ.setdefault("UPLOAD_DIR", str(Path(_TMP) / "uploads"))
+# Base desechable: los uploads se autentican con X-User-Id
+os.environ.setdefault("AUTH_LEGACY_HEADER", "true")
+os.environ.setdefault("AUTH_DEV_EPHEMERAL_KEY", "true")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+from fastapi import Depends, File, UploadFile  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from benchmarks._comun import percentil  # noqa: E402
+from backend.core.dependencies import get_db, get_usuario_actual  # noqa: E402
+from backend.db.connection import SessionLocal  # noqa: E402
+from backend.db.migrations import upgrade  # noqa: E402
+from backend.db.models import Usuario  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.services.evidencia_service import guardar_evidencias_opcionales  # noqa: E402
+
+SUB_TIPOS = ["foto_visitante", "ine_frente", "ine_reverso", "placas", "vehiculo", "documento"]
+
+
+@app.post("/_bench/evidencias/sync/{visita_id}", include_in_schema=False)
+def _evidencias_sync(
+    visita_id: str,
+    foto_visitante: UploadFile | None = File(None),
+    ine_frente: UploadFile | None = File(None),
+    ine_reverso: UploadFile | None = File(None),
+    placas: UploadFile | None = File(None),
+    vehiculo: UploadFile | None = File(None),
+    documento: UploadFile | None = File(None),
+    db: Session = Depends(get_db),
+    usuario=Depends(get_usuario_actual),
+):
+    archivos = {
+        "visitante": foto_visitante,
+        "ine_frente": ine_frente,
+        "ine_reverso": ine_reverso,
+        "placas": placas,
+        "vehiculo": vehiculo,
+        "documento": documento,
+    }
+    registros = guardar_evidencias_opcionales(
+        db, visita_id=visita_id, guardia_id=usuario.usuario_id, categoria="entrada", archivos=archivos
+    )
+    return {"status": "ok", "evidencias": len(registros)}
+
+
+def _seed():
+    upgrade()
+    db = SessionLocal()
+    try:
+        if not db.query(Usuario).filter(Usuario.usuario_id == "bench-guardia").first():
+            db.add(Usuario(usuario_id="bench-guardia", rol="GUARDIA", condominio_id="BENCH"))
+            db.commit()
+    finally:
+        db.close()
+
+
+async def _rafaga(client, url, n, concurrency, payload):
+    sem = asyncio.Semaphore(concurrency)
+    latencias = []
+
+    async def uno(i):
+        async with sem:
+            files = {campo: (f"IMG_{i}_{campo}.jpg", payload, "image/jpeg") for campo in SUB_TIPOS}
+            t0 = time.perf_counter()
+            r = await client.post(url.format(i=i), files=files, headers={"X-User-Id": "bench-guardia"})
+            latencias.append(time.perf_counter() - t0)
+            r.raise_for_status()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(uno(i) for i in range(n)))
+    total = time.perf_counter() - t0
+    return latencias, total
+
+
+async def main(args):
+    _seed()
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        rutas = {
+            "sync": "/_bench/evidencias/sync/VIS-BENCH-{i}",
+            "async": "/evidencias/entrada/VIS-BENCH-{i}",
+        }
+        print(f"{args.requests} requests x 6 archivos de {args.size_mb} MB, concurrencia {args.concurrency}")
+        for nombre, url in rutas.items():
+            latencias, total = await _rafaga(client, url, args.requests, args.concurrency, payload)
+            print(
+                f"{nombre:>5}: p50={percentil(latencias, 50) * 1000:8.1f} ms  "
+                f"p95={percentil(latencias, 95) * 1000:8.1f} ms  "
+                f"media={statistics.mean(latencias) * 1000:8.1f} ms  "
+                f"total={total:6.2f} s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--size-mb", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""Benchmark de arranque: tiempo de import de ``backend.main`` y time-to-first-request.
+
+Cada muestra corre en un intérprete nuevo (como un worker de uvicorn tras un
+reinicio o un evento de autoescalado) y mide:
+
+- ``import_ms``: ``import backend.main``.
+- ``lifespan_ms``: el hook lifespan (incluye ``STARTUP_PREWARM`` si está activo).
+- ``first_request_ms``: el primer ``GET /`` ya con la app arrancada.
+
+Falla (exit 1) si la mediana de ``import_ms`` supera ``--budget-ms`` o si alguno
+de los módulos de ``--forbid`` quedó importado sólo por importar la app.
+
+    python -m benchmarks.bench_startup --runs 5 --budget-ms 1500
+    STARTUP_PREWARM=true python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+# Se cargan al primer uso (render de QR, imágenes, login, engine async, pool de procesos)
+PROHIBIDOS = (
+    "qrcode",
+    "PIL",
+    "passlib",
+    "bcrypt",
+    "sqlalchemy.ext.asyncio",
+    "multiprocessing",
+    "concurrent.futures.process",
+)
+
+_MUESTRA = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import backend.main
+t1 = time.perf_counter()
+cargados = sorted(m for m in sys.argv[1].split(",") if m and m in sys.modules)
+
+import httpx
+
+async def main():
+    app = backend.main.app
+    t2 = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        t3 = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            r = await client.get("/")
+            r.raise_for_status()
+        t4 = time.perf_counter()
+    return t3 - t2, t4 - t3
+
+lifespan, primero = asyncio.run(main())
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "lifespan_ms": lifespan * 1000,
+    "first_request_ms": primero * 1000,
+    "total_ms": (t1 - t0 + lifespan + primero) * 1000,
+    "forbidden_loaded": cargados,
+}))
+"""
+
+
+def _muestra(forbid: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp(prefix='axs-startup-')) / 'bench.db'}")
+    env["PYTHONWARNINGS"] = "ignore"
+    # El lifespan se niega a arrancar sin AUTH_KEYS; aquí basta una llave efímera
+    env.setdefault("AUTH_DEV_EPHEMERAL_KEY", "true")
+    salida = subprocess.run(
+        [sys.executable, "-c", _MUESTRA, forbid],
+        cwd=RAIZ, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--forbid", default=",".join(PROHIBIDOS),
+                        help="módulos que no deben cargarse al importar la app")
+    args = parser.parse_args(argv)
+
+    muestras = [_muestra(args.forbid) for _ in range(args.runs)]
+    resumen = {
+        clave: round(statistics.median(m[clave] for m in muestras), 1)
+        for clave in ("import_ms", "lifespan_ms", "first_request_ms", "total_ms")
+    }
+    cargados = sorted({mod for m in muestras for mod in m["forbidden_loaded"]})
+    print(json.dumps({"runs": args.runs, "median": resumen, "forbidden_loaded": cargados}, indent=2))
+
+    fallo = False
+    if resumen["import_ms"] > args.budget_ms:
+        print(f"FAIL: import {resumen['import_ms']} ms > presupuesto {args.budget_ms} ms", file=sys.stderr)
+        fallo = True
+    if cargados:
+        print(f"FAIL: módulos pesados cargados al importar: {', '.join(cargados)}", file=sys.stderr)
+        fallo = True
+    return 1 if fallo else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
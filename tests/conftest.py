@@ -0,0 +1,105 @@
+"""Entorno de las pruebas de la API.
+
+`Settings` lee las variables de entorno al importarse, así que aquí se fijan
+antes de importar `backend`: base SQLite y UPLOAD_DIR en un directorio
+temporal, llave de firma efímera y header X-User-Id habilitado (los usuarios
+de prueba se autentican con él). Las tareas de fondo y las miniaturas quedan
+apagadas; las pruebas que las necesitan las encienden con `monkeypatch`.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+_TMP = Path(tempfile.mkdtemp(prefix="axs-tests-"))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP / 'axs.db'}"
+os.environ["UPLOAD_DIR"] = str(_TMP / "uploads")
+os.environ["INTEGRIDAD_CHECKPOINT"] = str(_TMP / "checkpoint.sqlite3")
+os.environ["QR_CACHE_DIR"] = ""
+os.environ["AUTH_KEYS"] = ""
+os.environ["AUTH_DEV_EPHEMERAL_KEY"] = "true"
+os.environ["AUTH_LEGACY_HEADER"] = "true"
+os.environ["EXPIRACION_ENABLED"] = "false"
+os.environ["ARCHIVO_ENABLED"] = "false"
+os.environ["EVIDENCIA_DERIVADOS"] = "false"
+os.environ["STARTUP_PREWARM"] = "false"
+os.environ["PROCESS_POOL_WORKERS"] = "2"
+
+import pytest  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from backend.db import migrations  # noqa: E402
+from backend.db.connection import Base, SessionLocal, engine  # noqa: E402
+from backend.db.models import Usuario  # noqa: E402
+
+# (usuario_id, rol, condominio_id, casa_unidad)
+USUARIOS = [
+    ("res", "RESIDENTE", "C1", "A1"),
+    ("adm", "ADMIN_CONDOMINIO", "C1", None),
+    ("grd", "GUARDIA", "C1", None),
+    ("res2", "RESIDENTE", "C2", "B1"),
+    ("adm2", "ADMIN_CONDOMINIO", "C2", None),
+    ("grd2", "GUARDIA", "C2", None),
+]
+
+
+def H(usuario_id: str) -> dict:
+    """Headers de autenticación de un usuario de prueba."""
+    return {"X-User-Id": usuario_id}
+
+
+@pytest.fixture(scope="session")
+def esquema():
+    migrations.upgrade(engine)
+    yield engine
+    engine.dispose()
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+def _vaciar() -> None:
+    from backend.core.principal import invalidar_todos
+    from backend.core import sesion
+    from backend.services import qr_service
+
+    with engine.begin() as conn:
+        for tabla in reversed(Base.metadata.sorted_tables):
+            conn.execute(delete(tabla))
+    shutil.rmtree(os.environ["UPLOAD_DIR"], ignore_errors=True)
+    invalidar_todos()
+    sesion.reemplazar_revocados({})
+    qr_service._qr_cache.clear()
+
+
+@pytest.fixture
+def db(esquema):
+    """Base vacía con los usuarios de `USUARIOS`; se vacía otra vez al terminar."""
+    _vaciar()
+    sesion = SessionLocal()
+    for usuario_id, rol, condominio_id, casa_unidad in USUARIOS:
+        sesion.add(
+            Usuario(
+                usuario_id=usuario_id,
+                rol=rol,
+                condominio_id=condominio_id,
+                casa_unidad=casa_unidad,
+                msp_id="M1",
+            )
+        )
+    sesion.commit()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        _vaciar()
+
+
+@pytest.fixture
+def client(db):
+    """Cliente de la app con el lifespan corriendo (cola de escritura, tareas de fondo)."""
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    with TestClient(app) as c:
+        yield c
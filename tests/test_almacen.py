@@ -0,0 +1,124 @@
+"""Almacén por contenido: deduplicación, conteo de referencias y recolección de blobs."""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import insert
+
+from backend.db.models import Evidencia, EvidenciaArchivada, Visita
+from backend.services import archivo_service, evidencia_service
+from backend.utils import file_storage
+
+
+def _envejecer(ruta: str, segundos: float = 7200) -> None:
+    antes = time.time() - segundos
+    os.utime(ruta, (antes, antes))
+
+
+def _evidencia(db, archivo_url: str, visita_id: str = "V-1") -> str:
+    evidencia_id = str(uuid.uuid4())
+    db.add(Evidencia(evidencia_id=evidencia_id, visita_id=visita_id, categoria="entrada", archivo_url=archivo_url))
+    db.commit()
+    return evidencia_id
+
+
+def test_reupload_identico_se_deduplica(db):
+    a = file_storage.guardar_archivo("a.jpg", b"mismo contenido")
+    b = file_storage.guardar_archivo("otro-nombre.jpg", b"mismo contenido")
+
+    assert a == b
+    assert Path(a).read_bytes() == b"mismo contenido"
+    assert Path(a).relative_to(os.environ["UPLOAD_DIR"]).parts[:2] == (Path(a).name[:2], Path(a).name[2:4])
+
+
+def test_blob_sin_referencias_se_recolecta_pasada_la_gracia(db):
+    url = file_storage.guardar_archivo("a.jpg", b"huerfano")
+    _envejecer(url)
+
+    assert evidencia_service.recolectar_huerfanos(db, gracia_s=3600) == 1
+    assert not os.path.exists(url)
+
+
+def test_reupload_dentro_de_la_gracia_sobrevive(db):
+    url = file_storage.guardar_archivo("a.jpg", b"foto")
+    evidencia_id = _evidencia(db, url)
+    _envejecer(url)
+
+    # Se vuelve a subir el mismo contenido y, antes de que se confirme su
+    # evidencia, se borra la única referencia existente
+    assert file_storage.guardar_archivo("b.jpg", b"foto") == url
+    assert evidencia_service.eliminar_evidencia(db, evidencia_id)
+    assert os.path.exists(url)
+
+    assert evidencia_service.recolectar_huerfanos(db, gracia_s=3600) == 0
+    assert os.path.exists(url)
+
+
+def test_borrado_espera_la_publicacion_del_mismo_hash(db):
+    url = file_storage.guardar_archivo("a.jpg", b"carrera")
+    _envejecer(url)
+    publicado = threading.Event()
+
+    def publicar():
+        file_storage.guardar_archivo("b.jpg", b"carrera")
+        publicado.set()
+
+    def referenciado():
+        # Con el lock del hash tomado, la publicación concurrente no avanza
+        hilo.start()
+        assert not publicado.wait(0.2)
+        return False
+
+    hilo = threading.Thread(target=publicar)
+    assert file_storage.recolectar_blob(url, referenciado, gracia_s=3600)
+    hilo.join(5)
+
+    # Se publicó después del borrado: el blob vuelve a existir, completo
+    assert publicado.is_set()
+    assert Path(url).read_bytes() == b"carrera"
+
+
+def test_blob_referenciado_solo_por_evidencia_archivada_se_conserva(db):
+    url = file_storage.guardar_archivo("a.jpg", b"evidencia vieja")
+    derivado = file_storage.ruta_derivado(url, "small")
+    Path(derivado).write_bytes(b"miniatura")
+    hace_100_dias = datetime.utcnow() - timedelta(days=100)
+    db.execute(
+        insert(Visita),
+        [dict(
+            visita_id="V-vieja",
+            condominio_id="C1",
+            estado="salida_registrada",
+            vigencia=hace_100_dias,
+            salida_registrada_en=hace_100_dias,
+        )],
+    )
+    db.commit()
+    _evidencia(db, url, visita_id="V-vieja")
+
+    assert archivo_service.archivar() == 1
+    assert db.query(Evidencia).count() == 0
+    assert db.query(EvidenciaArchivada).filter_by(archivo_url=url).count() == 1
+
+    _envejecer(url)
+    assert evidencia_service.recolectar_huerfanos(db, gracia_s=0) == 0
+    assert os.path.exists(url)
+    assert os.path.exists(derivado)
+
+
+def test_eliminar_la_ultima_referencia_borra_blob_y_derivados(db):
+    url = file_storage.guardar_archivo("a.jpg", b"unica")
+    derivado = file_storage.ruta_derivado(url, "small")
+    Path(derivado).write_bytes(b"miniatura")
+    _envejecer(url)
+    primera, segunda = _evidencia(db, url), _evidencia(db, url)
+
+    evidencia_service.eliminar_evidencia(db, primera)
+    assert os.path.exists(url)
+
+    evidencia_service.eliminar_evidencia(db, segunda)
+    assert not os.path.exists(url)
+    assert not os.path.exists(derivado)
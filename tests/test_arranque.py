@@ -0,0 +1,25 @@
+"""Importar la app no carga los módulos que se difieren al primer uso."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.bench_startup import PROHIBIDOS
+
+
+def test_importar_la_app_no_carga_modulos_diferidos():
+    codigo = (
+        "import json, sys; import backend.main; "
+        f"print(json.dumps([m for m in {list(PROHIBIDOS)!r} if m in sys.modules]))"
+    )
+    salida = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", codigo],
+        cwd=Path(__file__).resolve().parents[1],
+        env=dict(os.environ),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert json.loads(salida.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,81 @@
+"""Caché LRU de bytes: tope en memoria y capa en disco acotada por `disk_max_bytes`."""
+import os
+import time
+
+from backend.utils.cache import LRUBytesCache
+
+_KB = b"x" * 1024
+
+
+def _envejecer(cache: LRUBytesCache, key, segundos: float) -> None:
+    """Fijar el mtime del archivo de `key` en el pasado (el orden de expulsión en disco)."""
+    antes = time.time() - segundos
+    os.utime(cache._disk_path(key), (antes, antes))
+
+
+def _en_disco(cache: LRUBytesCache) -> list:
+    return sorted(p.name for p in cache.disk_dir.rglob("*") if p.is_file())
+
+
+def test_memoria_expulsa_el_menos_usado():
+    cache = LRUBytesCache(max_bytes=3 * 1024)
+    for key in "abc":
+        cache.put(key, _KB)
+    assert cache.get("a") == _KB
+
+    cache.put("d", _KB)
+
+    assert [cache.get(k) is not None for k in "abcd"] == [True, False, True, True]
+    assert cache.size_bytes == 3 * 1024
+
+
+def test_disco_expulsa_los_mas_antiguos_hasta_el_90_por_ciento(tmp_path):
+    cache = LRUBytesCache(max_bytes=1024 * 1024, disk_dir=str(tmp_path), disk_max_bytes=10 * 1024)
+    for i in range(10):
+        cache.put(i, _KB)
+        _envejecer(cache, i, 100 - i)
+
+    cache.put(10, _KB)
+
+    # 11 KB > 10 KB: se borran los más antiguos hasta quedar en <= 9 KB
+    sobrevivientes = [i for i in range(11) if cache._disk_path(i).exists()]
+    assert sobrevivientes == list(range(2, 11))
+    assert cache._disk_size == 9 * 1024
+    assert not list(tmp_path.rglob("*.part"))
+
+
+def test_leer_desde_disco_renueva_el_archivo(tmp_path):
+    cache = LRUBytesCache(max_bytes=1024 * 1024, disk_dir=str(tmp_path), disk_max_bytes=3 * 1024)
+    for i, key in enumerate("abc"):
+        cache.put(key, _KB)
+        _envejecer(cache, key, 100 - i)
+
+    # Otro proceso (memoria vacía) lee "a" desde disco: pasa a ser el más reciente
+    otro = LRUBytesCache(max_bytes=1024 * 1024, disk_dir=str(tmp_path), disk_max_bytes=3 * 1024)
+    assert otro.get("a") == _KB
+    otro.put("d", _KB)
+
+    assert [otro._disk_path(k).exists() for k in "abcd"] == [True, False, False, True]
+
+
+def test_otro_proceso_mide_el_directorio_antes_de_sumar(tmp_path):
+    primero = LRUBytesCache(max_bytes=1024 * 1024, disk_dir=str(tmp_path), disk_max_bytes=4 * 1024)
+    for i in range(4):
+        primero.put(i, _KB)
+        _envejecer(primero, i, 100 - i)
+
+    # Su cuenta empieza en None: recorre el directorio y ve los 4 KB del otro proceso
+    segundo = LRUBytesCache(max_bytes=1024 * 1024, disk_dir=str(tmp_path), disk_max_bytes=4 * 1024)
+    segundo.put("nuevo", _KB)
+
+    assert len(_en_disco(segundo)) == 3
+    assert segundo.get("nuevo") == _KB and not segundo._disk_path(0).exists()
+
+
+def test_valores_mayores_que_el_tope_no_se_guardan(tmp_path):
+    cache = LRUBytesCache(max_bytes=512, disk_dir=str(tmp_path), disk_max_bytes=512)
+
+    cache.put("grande", _KB)
+
+    assert len(cache) == 0 and _en_disco(cache) == []
+    assert cache.get("grande") is None and cache.misses == 1
@@ -0,0 +1,143 @@
+"""Sincronización de casetas: snapshot y deltas por cursor `(actualizado_en, id)`."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, update
+
+from backend.core.config import settings
+from backend.db.models import Caseta, Visita
+from backend.services import caseta_service
+from backend.utils.paginacion import codificar_cursor
+
+from .conftest import H
+
+_T0 = datetime(2030, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def casetas(db):
+    db.add_all([Caseta(caseta_id="K1", condominio_id="C1"), Caseta(caseta_id="K2", condominio_id="C2")])
+    db.commit()
+
+
+def _visita(visita_id: str, actualizado_en: datetime, **extra) -> dict:
+    return {
+        "visita_id": visita_id,
+        "condominio_id": "C1",
+        "casa_unidad": "A1",
+        "nombre_visitante": f"Visitante {visita_id}",
+        "qr_token": f"tok-{visita_id}",
+        "qr_vigencia": _T0 + timedelta(days=1),
+        "estado": "pendiente",
+        "actualizado_en": actualizado_en,
+        **extra,
+    }
+
+
+def _ids(pagina: dict) -> list:
+    return [v["visita_id"] for v in pagina["visitas"]]
+
+
+def test_snapshot_solo_pendientes_con_qr_vigente_del_condominio(client, db, casetas):
+    ahora = datetime.utcnow()
+    db.execute(
+        insert(Visita),
+        [
+            _visita("V-ok", ahora, qr_vigencia=ahora + timedelta(hours=1)),
+            _visita("V-vencida", ahora, qr_vigencia=ahora - timedelta(minutes=1)),
+            _visita("V-ingresada", ahora, estado="ingresada", qr_vigencia=ahora + timedelta(hours=1)),
+            _visita("V-otro", ahora, condominio_id="C2", qr_vigencia=ahora + timedelta(hours=1)),
+        ],
+    )
+    db.commit()
+
+    r = client.get("/casetas/K1/snapshot", headers=H("grd"))
+
+    assert r.status_code == 200, r.text
+    (item,) = r.json()["visitas"]
+    assert (item["visita_id"], item["token"], item["estado"]) == ("V-ok", "tok-V-ok", "pendiente")
+    assert r.json()["mas"] is False
+
+
+def test_caseta_de_otro_condominio_o_inexistente(client, casetas):
+    assert client.get("/casetas/K2/snapshot", headers=H("grd")).status_code == 403
+    assert client.get("/casetas/K2/delta", headers=H("grd"), params={"cursor": "x"}).status_code == 403
+    assert client.get("/casetas/K9/snapshot", headers=H("grd")).status_code == 404
+    assert client.get("/casetas/K1/snapshot", headers=H("res")).status_code == 403
+
+
+def test_cursor_invalido_responde_400(client, casetas):
+    r = client.get("/casetas/K1/delta", headers=H("grd"), params={"cursor": "no-es-un-cursor"})
+
+    assert r.status_code == 400
+
+
+def test_delta_pagina_sin_perder_ni_repetir_con_empates(client, db, casetas, monkeypatch):
+    monkeypatch.setattr(settings, "CASETA_DELTA_MARGEN_S", 0)
+    # Varias filas con el mismo actualizado_en: el desempate por id no debe saltarse ninguna
+    base = datetime.utcnow() - timedelta(hours=1)
+    db.execute(insert(Visita), [_visita(f"V-{i}", base + timedelta(seconds=i // 3)) for i in range(8)])
+    db.commit()
+
+    vistas, cursor, paginas = [], codificar_cursor(None, 0), 0
+    while True:
+        r = client.get("/casetas/K1/delta", headers=H("grd"), params={"cursor": cursor, "limite": 3})
+        assert r.status_code == 200, r.text
+        vistas += _ids(r.json())
+        cursor, paginas = r.json()["cursor"], paginas + 1
+        if not r.json()["mas"]:
+            break
+
+    assert vistas == [f"V-{i}" for i in range(8)]
+    assert paginas == 3
+    # Sin cambios nuevos el mismo cursor devuelve vacío
+    r = client.get("/casetas/K1/delta", headers=H("grd"), params={"cursor": cursor})
+    assert _ids(r.json()) == []
+
+
+def test_delta_entrega_cambios_posteriores_al_snapshot_incluidos_los_no_pendientes(db, casetas, monkeypatch):
+    monkeypatch.setattr(settings, "CASETA_DELTA_MARGEN_S", 2)
+    db.execute(insert(Visita), [_visita(f"V-{i}", _T0 - timedelta(minutes=5)) for i in (1, 2)])
+    db.commit()
+
+    snap = caseta_service.snapshot(db, "C1", ahora=_T0)
+    assert _ids(snap) == ["V-1", "V-2"]
+
+    # V-1 entra después del snapshot: la caseta debe enterarse para quitarla
+    db.execute(
+        update(Visita)
+        .where(Visita.visita_id == "V-1")
+        .values(estado="ingresada", actualizado_en=_T0 + timedelta(seconds=10))
+    )
+    db.commit()
+
+    cambio = caseta_service.delta(db, "C1", snap["cursor"], ahora=_T0 + timedelta(seconds=20))
+    assert [(v["visita_id"], v["estado"]) for v in cambio["visitas"]] == [("V-1", "ingresada")]
+    assert _ids(caseta_service.delta(db, "C1", cambio["cursor"], ahora=_T0 + timedelta(seconds=30))) == []
+
+
+def test_delta_retiene_lo_modificado_dentro_del_margen(db, casetas, monkeypatch):
+    monkeypatch.setattr(settings, "CASETA_DELTA_MARGEN_S", 2)
+    snap = caseta_service.snapshot(db, "C1", ahora=_T0)
+    # Fila fijada hace 1 s: su transacción podría no haber confirmado todavía
+    db.execute(insert(Visita), [_visita("V-reciente", _T0 + timedelta(seconds=9))])
+    db.commit()
+
+    pronto = caseta_service.delta(db, "C1", snap["cursor"], ahora=_T0 + timedelta(seconds=10))
+    assert _ids(pronto) == []
+
+    despues = caseta_service.delta(db, "C1", pronto["cursor"], ahora=_T0 + timedelta(seconds=12))
+    assert _ids(despues) == ["V-reciente"]
+    assert _ids(caseta_service.delta(db, "C1", despues["cursor"], ahora=_T0 + timedelta(seconds=20))) == []
+
+
+def test_fila_justo_en_el_horizonte_se_entrega_una_sola_vez(db, casetas, monkeypatch):
+    monkeypatch.setattr(settings, "CASETA_DELTA_MARGEN_S", 2)
+    ahora = _T0 + timedelta(seconds=10)
+    db.execute(insert(Visita), [_visita("V-borde", ahora - timedelta(seconds=2))])
+    db.commit()
+
+    primero = caseta_service.delta(db, "C1", codificar_cursor(_T0, 0), ahora=ahora)
+    segundo = caseta_service.delta(db, "C1", primero["cursor"], ahora=ahora + timedelta(seconds=5))
+
+    assert (_ids(primero), _ids(segundo)) == (["V-borde"], [])
@@ -0,0 +1,95 @@
+"""Miniaturas de fotos de evidencia: generación, temporales y relleno."""
+import asyncio
+import io
+import os
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+
+from backend.db.models import Evidencia
+from backend.services import evidencia_service
+from backend.utils import file_storage, imagenes
+from backend.utils.procesos import cerrar_pool
+
+_TAMANOS = {"small": 16, "medium": 64}
+
+
+def _jpeg(color=(200, 30, 30)) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def _temporales() -> list:
+    raiz = Path(os.environ["UPLOAD_DIR"])
+    return sorted(str(p.relative_to(raiz)) for p in raiz.rglob("*.part"))
+
+
+def test_genera_miniaturas_junto_al_blob(db):
+    url = file_storage.guardar_archivo("foto.jpg", _jpeg())
+
+    derivados = imagenes.generar_derivados(url, _TAMANOS)
+
+    assert set(derivados) == {"small", "medium"}
+    assert derivados["small"]["archivo_url"] == file_storage.ruta_derivado(url, "small")
+    assert max(derivados["medium"]["ancho"], derivados["medium"]["alto"]) == 64
+    assert _temporales() == []
+
+
+def test_archivo_que_no_es_imagen_no_tiene_derivados(db):
+    url = file_storage.guardar_archivo("doc.pdf", b"%PDF-1.4 no es imagen")
+
+    assert imagenes.generar_derivados(url, _TAMANOS) == {}
+
+
+def test_temporal_de_derivado_abandonado_lo_barre_limpiar_temporales(db, monkeypatch):
+    url = file_storage.guardar_archivo("foto.jpg", _jpeg())
+
+    # El proceso muere entre escribir el temporal y publicarlo: nadie lo borra
+    def morir(*args):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(imagenes.os, "replace", morir)
+    monkeypatch.setattr(imagenes.os, "unlink", lambda path: None)
+    with pytest.raises(KeyboardInterrupt):
+        imagenes.generar_derivados(url, _TAMANOS)
+    monkeypatch.undo()
+
+    (temporal,) = _temporales()
+    assert Path(temporal).parent.name == ".tmp"
+    assert file_storage.limpiar_temporales(gracia_s=3600) == 0
+
+    antes = time.time() - 7200
+    os.utime(Path(os.environ["UPLOAD_DIR"]) / temporal, (antes, antes))
+    assert file_storage.limpiar_temporales(gracia_s=3600) == 1
+    assert _temporales() == []
+
+
+def test_rellenar_derivados_completa_los_faltantes_una_vez(db):
+    foto = file_storage.guardar_archivo("foto.jpg", _jpeg())
+    documento = file_storage.guardar_archivo("doc.pdf", b"%PDF-1.4")
+    hecha = file_storage.guardar_archivo("otra.jpg", _jpeg((0, 0, 255)))
+    for url, metadata in [
+        (foto, {"filename": "foto.jpg"}),
+        (documento, {"filename": "doc.pdf"}),
+        (hecha, {"filename": "otra.jpg", "derivados": {}}),
+    ]:
+        db.add(Evidencia(evidencia_id=str(uuid.uuid4()), visita_id="V-1", archivo_url=url, metadata_json=metadata))
+    db.commit()
+
+    try:
+        assert asyncio.run(evidencia_service.rellenar_derivados(lote=2)) == 2
+        assert asyncio.run(evidencia_service.rellenar_derivados(lote=2)) == 0
+    finally:
+        cerrar_pool()
+
+    db.expire_all()
+    por_url = {e.archivo_url: e.metadata_json for e in db.query(Evidencia)}
+    assert set(por_url[foto]["derivados"]) == {"small", "medium"}
+    assert por_url[foto]["filename"] == "foto.jpg"
+    assert por_url[documento]["derivados"] == {}
+    assert por_url[hecha]["derivados"] == {}
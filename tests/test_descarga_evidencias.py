@@ -0,0 +1,110 @@
+"""Descarga de evidencias: ETag/304, Range/If-Range y acceso por condominio."""
+import hashlib
+import uuid
+from pathlib import Path
+
+import pytest
+
+from backend.core.config import settings
+from backend.db.models import Evidencia, Visita
+from backend.utils import file_storage
+
+from .conftest import H
+
+_CONTENIDO = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def evidencia(db) -> str:
+    url = file_storage.guardar_archivo("placas.bin", _CONTENIDO)
+    evidencia_id = str(uuid.uuid4())
+    db.add(Visita(visita_id="V-1", condominio_id="C1", casa_unidad="A1", estado="ingresada"))
+    db.add(
+        Evidencia(
+            evidencia_id=evidencia_id,
+            visita_id="V-1",
+            categoria="entrada",
+            sub_tipo="placas",
+            archivo_url=url,
+            hash_sha256=hashlib.sha256(_CONTENIDO).hexdigest(),
+            metadata_json={"filename": "placas.bin"},
+        )
+    )
+    db.commit()
+    return evidencia_id
+
+
+def _ruta(evidencia_id: str) -> str:
+    return f"/evidencias/{evidencia_id}/archivo"
+
+
+def test_descarga_completa_con_etag_del_contenido(client, evidencia):
+    r = client.get(_ruta(evidencia), headers=H("grd"))
+
+    assert r.status_code == 200
+    assert r.content == _CONTENIDO
+    assert r.headers["etag"] == f'"{hashlib.sha256(_CONTENIDO).hexdigest()}"'
+    assert "immutable" in r.headers["cache-control"]
+    assert r.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize("forma", ["{}", "W/{}", '"otro", {}'])
+def test_if_none_match_responde_304_sin_cuerpo(client, evidencia, forma):
+    etag = client.get(_ruta(evidencia), headers=H("grd")).headers["etag"]
+
+    r = client.get(_ruta(evidencia), headers={**H("grd"), "If-None-Match": forma.format(etag)})
+
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+
+
+def test_range_devuelve_206_con_el_fragmento(client, evidencia):
+    r = client.get(_ruta(evidencia), headers={**H("grd"), "Range": "bytes=100-1123"})
+
+    assert r.status_code == 206
+    assert r.content == _CONTENIDO[100:1124]
+    assert r.headers["content-range"] == f"bytes 100-1123/{len(_CONTENIDO)}"
+
+
+def test_if_range_reanuda_solo_si_el_etag_sigue_igual(client, evidencia):
+    etag = client.get(_ruta(evidencia), headers=H("grd")).headers["etag"]
+    rango = {**H("grd"), "Range": "bytes=5000-"}
+
+    reanudada = client.get(_ruta(evidencia), headers={**rango, "If-Range": etag})
+    distinta = client.get(_ruta(evidencia), headers={**rango, "If-Range": '"otra-version"'})
+
+    assert (reanudada.status_code, reanudada.content) == (206, _CONTENIDO[5000:])
+    assert (distinta.status_code, distinta.content) == (200, _CONTENIDO)
+
+
+def test_rango_fuera_del_archivo_responde_416(client, evidencia):
+    r = client.get(_ruta(evidencia), headers={**H("grd"), "Range": f"bytes={len(_CONTENIDO) + 10}-"})
+
+    assert r.status_code == 416
+
+
+def test_acceso_por_condominio_y_rol(client, evidencia):
+    assert client.get(_ruta(evidencia), headers=H("adm")).status_code == 200
+    assert client.get(_ruta(evidencia), headers=H("grd2")).status_code == 403
+    assert client.get(_ruta(evidencia), headers=H("adm2")).status_code == 403
+    assert client.get(_ruta(evidencia), headers=H("res")).status_code == 403
+    # El 304 tampoco se da a otro condominio aunque conozca el ETag
+    etag = f'"{hashlib.sha256(_CONTENIDO).hexdigest()}"'
+    assert client.get(_ruta(evidencia), headers={**H("grd2"), "If-None-Match": etag}).status_code == 403
+    assert client.get(_ruta("no-existe"), headers=H("grd")).status_code == 404
+
+
+def test_variante_sin_miniatura_responde_404(client, evidencia):
+    assert client.get(_ruta(evidencia), headers=H("grd"), params={"variante": "small"}).status_code == 404
+
+
+def test_x_accel_redirect_delega_el_envio(client, db, evidencia, monkeypatch):
+    monkeypatch.setattr(settings, "EVIDENCIA_X_ACCEL_PREFIX", "/protegido/")
+    url = db.query(Evidencia).filter_by(evidencia_id=evidencia).one().archivo_url
+    relativa = Path(url).resolve().relative_to(Path(settings.UPLOAD_DIR).resolve()).as_posix()
+
+    r = client.get(_ruta(evidencia), headers=H("grd"))
+
+    assert r.status_code == 200 and r.content == b""
+    assert r.headers["x-accel-redirect"] == f"/protegido/{relativa}"
@@ -0,0 +1,163 @@
+"""Entradas/salidas en lote desde caseta (`POST /visitas/eventos`)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from backend.core.config import settings
+from backend.db.models import Visita
+
+from .conftest import H
+
+T0 = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+
+
+@pytest.fixture(autouse=True, params=[True, False], ids=["cola", "sin_cola"])
+def cola_escritura(request, monkeypatch):
+    """Cada caso corre por la cola de escritura y por la sesión async directa."""
+    monkeypatch.setattr(settings, "SQLITE_WRITE_QUEUE", request.param)
+
+
+def _visita(db, visita_id: str, estado: str = "pendiente", **columnas) -> None:
+    db.execute(
+        insert(Visita),
+        [dict(
+            visita_id=visita_id,
+            condominio_id="C1",
+            casa_unidad="A1",
+            estado=estado,
+            qr_token=f"tok-{visita_id}",
+            qr_vigencia=T0 + timedelta(minutes=30),
+            **columnas,
+        )],
+    )
+    db.commit()
+
+
+def _evento(visita_id: str, tipo: str, minuto: int, token: str = None) -> dict:
+    evento = {"visita_id": visita_id, "tipo": tipo, "ocurrido_en": (T0 + timedelta(minutes=minuto)).isoformat()}
+    if token is not None:
+        evento["token"] = token
+    return evento
+
+
+def _enviar(client, *eventos, usuario="grd") -> list:
+    r = client.post("/visitas/eventos", headers=H(usuario), json={"eventos": list(eventos)})
+    assert r.status_code == 200, r.text
+    return r.json()["resultados"]
+
+
+def _estado(db, visita_id: str) -> Visita:
+    db.expire_all()
+    return db.query(Visita).filter_by(visita_id=visita_id).one()
+
+
+def test_lote_desordenado_se_aplica_por_hora(client, db):
+    _visita(db, "V-A")
+
+    # La salida llega antes que la entrada en el buffer de la caseta
+    resultados = _enviar(client, _evento("V-A", "salida", 10), _evento("V-A", "entrada", 5, "tok-V-A"))
+
+    assert [(r["tipo"], r["resultado"]) for r in resultados] == [("salida", "aplicado"), ("entrada", "aplicado")]
+    visita = _estado(db, "V-A")
+    assert visita.estado == "salida_registrada"
+    assert visita.entrada_registrada_en == T0 + timedelta(minutes=5)
+    assert visita.salida_registrada_en == T0 + timedelta(minutes=10)
+
+
+def test_reenviar_el_buffer_es_duplicado(client, db):
+    _visita(db, "V-A")
+    lote = (_evento("V-A", "entrada", 5, "tok-V-A"), _evento("V-A", "salida", 10))
+    _enviar(client, *lote)
+
+    resultados = _enviar(client, *lote)
+
+    assert [r["resultado"] for r in resultados] == ["duplicado", "duplicado"]
+    assert _estado(db, "V-A").salida_registrada_en == T0 + timedelta(minutes=10)
+
+
+def test_segunda_entrada_con_otra_hora_se_rechaza(client, db):
+    _visita(db, "V-A")
+    _enviar(client, _evento("V-A", "entrada", 5, "tok-V-A"))
+
+    (resultado,) = _enviar(client, _evento("V-A", "entrada", 7, "tok-V-A"))
+
+    assert resultado["resultado"] == "rechazado"
+    assert resultado["detalle"] == "Entrada ya registrada"
+    assert _estado(db, "V-A").entrada_registrada_en == T0 + timedelta(minutes=5)
+
+
+def test_salida_antes_de_la_entrada(client, db):
+    _visita(db, "V-A")
+    _visita(db, "V-B")
+    _enviar(client, _evento("V-B", "entrada", 20, "tok-V-B"))
+
+    resultados = _enviar(
+        client,
+        _evento("V-A", "salida", 3),  # nunca entró
+        _evento("V-B", "salida", 10),  # anterior a su entrada
+    )
+
+    assert [(r["resultado"], r["detalle"]) for r in resultados] == [
+        ("rechazado", "Salida sin entrada registrada"),
+        ("rechazado", "Salida anterior a la entrada"),
+    ]
+    assert _estado(db, "V-A").estado == "pendiente"
+    assert _estado(db, "V-B").estado == "entrada_registrada"
+
+
+def test_un_rechazo_no_invalida_el_resto_del_lote(client, db):
+    _visita(db, "V-A")
+    _visita(db, "V-B")
+
+    resultados = _enviar(
+        client,
+        _evento("V-A", "entrada", 5, "otro-token"),
+        _evento("V-B", "entrada", 6, "tok-V-B"),
+        _evento("V-nope", "entrada", 7),
+    )
+
+    assert [(r["resultado"], r["detalle"]) for r in resultados] == [
+        ("rechazado", "QR inválido"),
+        ("aplicado", None),
+        ("rechazado", "Visita no encontrada"),
+    ]
+    assert _estado(db, "V-A").estado == "pendiente"
+    assert _estado(db, "V-B").estado == "entrada_registrada"
+
+
+def test_no_aplica_eventos_de_otro_condominio(client, db):
+    _visita(db, "V-A")
+
+    (resultado,) = _enviar(client, _evento("V-A", "entrada", 5, "tok-V-A"), usuario="grd2")
+
+    assert resultado["detalle"] == "Visita no encontrada"
+    assert _estado(db, "V-A").estado == "pendiente"
+
+
+def test_entrada_offline_de_visita_ya_expirada(client, db):
+    # El barrido la expiró porque la entrada (escaneada con QR vigente) aún no llegaba
+    _visita(db, "V-A", estado="expirada")
+
+    (resultado,) = _enviar(client, _evento("V-A", "entrada", 5, "tok-V-A"))
+
+    assert resultado["resultado"] == "aplicado"
+    assert _estado(db, "V-A").estado == "entrada_registrada"
+
+
+def test_entrada_de_visita_expirada_sin_qr_vigente_se_rechaza(client, db):
+    _visita(db, "V-A", estado="expirada")
+    _visita(db, "V-B", estado="expirada")
+
+    resultados = _enviar(
+        client,
+        _evento("V-A", "entrada", 5),  # sin QR
+        _evento("V-B", "entrada", 45, "tok-V-B"),  # QR ya vencido al escanear
+    )
+
+    assert [(r["resultado"], r["detalle"]) for r in resultados] == [
+        ("rechazado", "Visita expirada"),
+        ("rechazado", "Visita expirada"),
+    ]
+    assert _estado(db, "V-A").estado == "expirada"
+    assert _estado(db, "V-B").estado == "expirada"
@@ -0,0 +1,81 @@
+"""Llavero HMAC: rotación de llaves por `kid` para sesiones y QR firmados."""
+import pytest
+
+from backend.core import firmas, sesion
+from backend.core.config import settings
+from backend.core.principal import Principal
+from backend.services import qr_service
+
+
+@pytest.fixture
+def configurar(monkeypatch):
+    """Fijar `AUTH_KEYS`/`AUTH_KEY_ID` como los vería un worker recién reiniciado."""
+
+    def aplicar(llaves: str, activo: str = "") -> None:
+        monkeypatch.setattr(settings, "AUTH_KEYS", llaves)
+        monkeypatch.setattr(settings, "AUTH_KEY_ID", activo)
+        firmas.llavero.cache_clear()
+
+    yield aplicar
+    firmas.llavero.cache_clear()
+
+
+def _token() -> str:
+    return sesion.emitir_token(Principal(usuario_id="res", rol="RESIDENTE", condominio_id="C1"))[0]
+
+
+def test_rotacion_sigue_aceptando_la_llave_anterior(configurar):
+    configurar("k1:secreto-uno")
+    viejo = _token()
+    qr_viejo, _ = qr_service.nuevo_token("V-1")
+
+    # Paso 1 y 2: se agrega k2 y pasa a ser la activa
+    configurar("k1:secreto-uno,k2:secreto-dos", "k2")
+    nuevo = _token()
+
+    assert viejo.split(".")[1] == "k1" and nuevo.split(".")[1] == "k2"
+    assert sesion.leer_token(viejo)["sub"] == sesion.leer_token(nuevo)["sub"] == "res"
+    qr_service.verificar_token("V-1", qr_viejo)
+    assert qr_service.nuevo_token("V-1")[0].split(".")[1] == "k2"
+
+
+def test_quitar_la_llave_anterior_invalida_lo_firmado_con_ella(configurar):
+    configurar("k1:secreto-uno")
+    viejo = _token()
+    qr_viejo, _ = qr_service.nuevo_token("V-1")
+
+    configurar("k2:secreto-dos")
+
+    with pytest.raises(sesion.TokenInvalido, match="Token inválido"):
+        sesion.leer_token(viejo)
+    with pytest.raises(qr_service.QRInvalido):
+        qr_service.verificar_token("V-1", qr_viejo)
+
+
+def test_kid_desconocido_o_cambiado_se_rechaza(configurar):
+    configurar("k1:secreto-uno,k2:secreto-dos")
+    cuerpo, kid, mac = _token().split(".")
+
+    with pytest.raises(sesion.TokenInvalido):
+        sesion.leer_token(f"{cuerpo}.k9.{mac}")
+    # El kid va dentro del mensaje firmado: cambiarlo por otro válido no sirve
+    with pytest.raises(sesion.TokenInvalido):
+        sesion.leer_token(f"{cuerpo}.k2.{mac}")
+
+
+def test_misma_configuracion_en_otro_worker_verifica(configurar):
+    configurar("k1:secreto-uno")
+    token = _token()
+
+    # Otro proceso con las mismas variables: el llavero se reconstruye igual
+    firmas.llavero.cache_clear()
+    assert sesion.leer_token(token)["sub"] == "res"
+
+
+def test_configuracion_invalida_falla_al_cargar(configurar):
+    with pytest.raises(ValueError, match="AUTH_KEY_ID"):
+        configurar("k1:secreto-uno", "k2")
+        firmas.llavero()
+    with pytest.raises(ValueError, match="formato"):
+        configurar("sin-secreto")
+        firmas.llavero()
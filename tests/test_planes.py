@@ -0,0 +1,57 @@
+"""Planes de las consultas calientes (ver `backend.db.migrations.planes`).
+
+Corre siempre sobre una base SQLite temporal con todas las migraciones y,
+si `TEST_POSTGRES_URL` apunta a una base de Postgres desechable, también ahí.
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+from backend.db import migrations
+from backend.db.migrations import planes
+
+_MOTORES = ["sqlite"] + (["postgresql"] if os.getenv("TEST_POSTGRES_URL") else [])
+
+
+@pytest.fixture(scope="module", params=_MOTORES)
+def conn(request, tmp_path_factory):
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path_factory.mktemp('planes') / 'planes.db'}"
+    else:
+        url = os.environ["TEST_POSTGRES_URL"]
+    engine = create_engine(url)
+    migrations.upgrade(engine)
+    try:
+        with planes.conexion_explain(engine) as conexion:
+            yield conexion
+    finally:
+        engine.dispose()
+
+
+@pytest.mark.parametrize("caso", planes._casos(), ids=lambda caso: caso[0])
+def test_usa_indice(conn, caso):
+    r = planes.evaluar(conn, caso)
+    assert r["indice"] in r["plan"], r["plan"]
+
+
+@pytest.mark.parametrize(
+    "caso", [c for c in planes._casos() if not c[3]], ids=lambda caso: caso[0]
+)
+def test_sale_en_orden_del_indice(conn, caso):
+    r = planes.evaluar(conn, caso)
+    assert not r["ordena"], r["plan"]
+
+
+@pytest.mark.parametrize(
+    "plan, ordena",
+    [
+        ("SEARCH visitas USING INDEX ix_visitas_condominio_vigencia (condominio_id=?)", False),
+        ("SCAN anon_1\nUSE TEMP B-TREE FOR ORDER BY", True),
+        ("Limit\n  ->  Sort  (cost=8.2..8.3 rows=1 width=8)\n        Sort Key: vigencia DESC", True),
+        ("Limit\n  ->  Incremental Sort  (cost=0.1..9.1 rows=1 width=8)", True),
+        ("Limit\n  ->  Index Scan Backward using ix_visitas_condominio_vigencia on visitas", False),
+    ],
+)
+def test_detecta_orden_en_memoria(plan, ordena):
+    assert planes.ordena_en_memoria(plan) is ordena
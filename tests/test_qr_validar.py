@@ -0,0 +1,104 @@
+"""Validación de QR en caseta (`GET /qr/validar/{visita_id}/{token}`): uso único."""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from backend.core import firmas, sesion
+from backend.core.config import settings
+from backend.core.principal import Principal
+from backend.db.models import Visita
+from backend.services import qr_service
+
+
+@pytest.fixture(params=[True, False], ids=["cola", "sin_cola"])
+def cola_escritura(request, monkeypatch):
+    monkeypatch.setattr(settings, "SQLITE_WRITE_QUEUE", request.param)
+
+
+@pytest.fixture
+def guardia():
+    """Bearer firmado del guardia de C1: autentica sin consultar la base."""
+    token, _ = sesion.emitir_token(Principal(usuario_id="grd", rol="GUARDIA", condominio_id="C1"))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _visita(db, token: str, visita_id: str = "V-QR") -> str:
+    db.execute(
+        insert(Visita),
+        [dict(
+            visita_id=visita_id,
+            condominio_id="C1",
+            casa_unidad="A1",
+            nombre_visitante="Visitante",
+            estado="pendiente",
+            qr_token=token,
+            qr_vigencia=datetime.utcnow() + timedelta(hours=1),
+        )],
+    )
+    db.commit()
+    return visita_id
+
+
+def _estado(db, visita_id: str) -> Visita:
+    db.expire_all()
+    return db.query(Visita).filter_by(visita_id=visita_id).one()
+
+
+def _token_firmado(visita_id: str, exp: int) -> str:
+    kid, mac = firmas.firmar(qr_service._mensaje_firmado(visita_id, exp, firmas.kid_activo()))
+    return f"{exp}.{kid}.{firmas.b64url(mac[:qr_service._MAC_BYTES])}"
+
+
+def test_validaciones_concurrentes_admiten_una_sola_vez(client, db, guardia, cola_escritura):
+    token, _ = qr_service.nuevo_token("V-QR")
+    visita_id = _visita(db, token)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        respuestas = list(
+            pool.map(lambda _: client.get(f"/qr/validar/{visita_id}/{token}", headers=guardia), range(8))
+        )
+
+    aprobadas = [r for r in respuestas if r.status_code == 200]
+    rechazadas = [r for r in respuestas if r.status_code != 200]
+    assert len(aprobadas) == 1
+    assert aprobadas[0].json()["status"] == "aprobado"
+    assert {(r.status_code, r.json()["detail"]) for r in rechazadas} == {(400, "QR ya utilizado")}
+    assert _estado(db, visita_id).estado == "entrada_registrada"
+
+
+@pytest.mark.parametrize("caso", ["expirado", "falsificado", "de_otra_visita"])
+def test_token_firmado_invalido_no_toca_la_base(client, db, guardia, caso):
+    vigente, _ = qr_service.nuevo_token("V-QR")
+    visita_id = _visita(db, vigente)
+    if caso == "expirado":
+        token, detalle = _token_firmado(visita_id, int(time.time()) - 60), "QR expirado"
+    elif caso == "falsificado":
+        exp, kid, mac = vigente.split(".")
+        token, detalle = f"{int(exp) + 3600}.{kid}.{mac}", "QR inválido"
+    else:
+        token, detalle = qr_service.nuevo_token("V-OTRA")[0], "QR inválido"
+
+    r = client.get(f"/qr/validar/{visita_id}/{token}", headers=guardia)
+
+    assert (r.status_code, r.json()["detail"]) == (400, detalle)
+    assert r.headers["x-db-queries"] == "0"
+    assert _estado(db, visita_id).estado == "pendiente"
+
+
+def test_token_equivocado_no_se_escribe_en_el_log(client, db, guardia, caplog, monkeypatch):
+    # Token legado (sin firma): llega a la base y el rechazo se explica en el log
+    monkeypatch.setattr(settings, "QR_LEGACY_TOKENS", True)
+    visita_id = _visita(db, "token-secreto-de-la-visita")
+
+    with caplog.at_level(logging.INFO, logger="axs.qr"):
+        r = client.get(f"/qr/validar/{visita_id}/token-adivinado", headers=guardia)
+
+    assert (r.status_code, r.json()["detail"]) == (400, "QR inválido")
+    (registro,) = [rec for rec in caplog.records if "token mismatch" in rec.getMessage()]
+    valores = " ".join(str(v) for v in vars(registro).values())
+    assert "token-secreto-de-la-visita" not in valores
+    assert "token-adivinado" not in valores
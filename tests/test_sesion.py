@@ -0,0 +1,84 @@
+"""Tokens de sesión firmados: login, logout y revocación."""
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from backend.core import sesion
+from backend.core.principal import Principal
+from backend.db.connection import SessionLocal
+from backend.db.models import TokenRevocado
+from backend.services import auth_service
+
+
+def _bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_logouts_concurrentes_del_mismo_token(client, db):
+    token, payload = sesion.emitir_token(Principal(usuario_id="res", rol="RESIDENTE", condominio_id="C1"))
+    barrera = threading.Barrier(8)
+    errores = []
+
+    def revocar():
+        sesion_db = SessionLocal()
+        try:
+            barrera.wait(5)
+            auth_service.revocar(sesion_db, payload)
+        except Exception as exc:
+            errores.append(exc)
+        finally:
+            sesion_db.close()
+
+    hilos = [threading.Thread(target=revocar) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(10)
+
+    assert errores == []
+    assert db.query(TokenRevocado).filter_by(jti=payload["jti"]).count() == 1
+
+
+def test_logout_repetido_responde_401_no_500(client, db):
+    token, _ = sesion.emitir_token(Principal(usuario_id="res", rol="RESIDENTE", condominio_id="C1"))
+
+    assert client.post("/auth/logout", headers=_bearer(token)).status_code == 200
+    segundo = client.post("/auth/logout", headers=_bearer(token))
+
+    assert (segundo.status_code, segundo.json()["detail"]) == (401, "Token revocado")
+
+
+def test_revocacion_llega_a_otro_worker_al_refrescar(client, db, monkeypatch):
+    token, payload = sesion.emitir_token(Principal(usuario_id="res", rol="RESIDENTE", condominio_id="C1"))
+    auth_service.revocar(db, payload)
+    with pytest.raises(sesion.TokenInvalido, match="revocado"):
+        sesion.leer_token(token)
+
+    # Otro worker: todavía no ha leído la tabla, así que el token le sigue valiendo
+    monkeypatch.setattr(sesion, "_revocados", {})
+    assert sesion.leer_token(token)["jti"] == payload["jti"]
+
+    auth_service._refrescar_revocados()
+    with pytest.raises(sesion.TokenInvalido, match="revocado"):
+        sesion.leer_token(token)
+    assert client.post("/auth/logout", headers=_bearer(token)).status_code == 401
+
+
+def test_refresco_descarta_expirados_y_conserva_revocaciones_locales(db, monkeypatch):
+    monkeypatch.setattr(sesion, "_revocados", {})
+    ahora = time.time()
+    db.add_all(
+        [
+            TokenRevocado(jti="viejo", usuario_id="res", expira=datetime.utcfromtimestamp(ahora - 60)),
+            TokenRevocado(jti="vigente", usuario_id="res", expira=datetime.utcfromtimestamp(ahora + 600)),
+        ]
+    )
+    db.commit()
+    # Revocado en este proceso pero aún no visible en la lectura (p. ej. réplica atrasada)
+    sesion.marcar_revocado("local", ahora + 600)
+
+    auth_service._refrescar_revocados()
+
+    assert [sesion.revocado(j) for j in ("viejo", "vigente", "local")] == [False, True, True]
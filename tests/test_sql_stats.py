@@ -0,0 +1,56 @@
+"""Contabilidad de SQL: por request y totales del proceso, con consultas desde varios hilos."""
+import contextvars
+import threading
+
+from sqlalchemy import text
+
+from backend.core import metrics
+from backend.db import sql_stats
+from backend.db.connection import engine
+
+_HILOS = 8
+_POR_HILO = 200
+
+
+def _total_consultas() -> int:
+    histograma = metrics.DB_CONSULTA_DURACION
+    (linea,) = [m for m in histograma.muestras() if m.startswith(f"{histograma.nombre}_count")]
+    return int(linea.rsplit(" ", 1)[1])
+
+
+def test_consultas_concurrentes_no_pierden_cuentas(esquema):
+    stats = sql_stats.EstadisticasSQL()
+    token = sql_stats._actual.set(stats)
+    try:
+        contexto = contextvars.copy_context()
+    finally:
+        sql_stats._actual.reset(token)
+    barrera = threading.Barrier(_HILOS)
+
+    def consultar():
+        # Como el threadpool de Starlette: cada hilo corre con una copia del contexto del request
+        with engine.connect() as conn:
+            barrera.wait(5)
+            for _ in range(_POR_HILO):
+                conn.execute(text("SELECT 1"))
+
+    antes = _total_consultas()
+    hilos = [threading.Thread(target=contexto.copy().run, args=(consultar,)) for _ in range(_HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(30)
+
+    assert stats.consultas == _HILOS * _POR_HILO
+    assert stats.sentencias["SELECT 1"] == _HILOS * _POR_HILO
+    assert stats.repetidas(_HILOS * _POR_HILO) == [("SELECT 1", _HILOS * _POR_HILO)]
+    assert _total_consultas() - antes == _HILOS * _POR_HILO
+
+
+def test_consultas_fuera_de_un_request_cuentan_en_el_total(esquema):
+    antes = _total_consultas()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert sql_stats.actuales() is None
+    assert _total_consultas() - antes == 1
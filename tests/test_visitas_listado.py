@@ -0,0 +1,73 @@
+"""Listados paginados de visitas (keyset en dos fases: con vigencia y sin ella)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from backend.db.models import Visita
+
+from .conftest import H
+
+
+def _sembrar(db, con_vigencia: int, sin_vigencia: int) -> list:
+    """Visitas de la casa A1 de C1; devuelve sus visita_id en el orden del listado."""
+    base = datetime(2030, 1, 1, 10, 0)
+    filas = [
+        dict(
+            visita_id=f"V-{i:02d}",
+            condominio_id="C1",
+            casa_unidad="A1",
+            nombre_visitante=f"Visitante {i}",
+            tipo_visita="personal",
+            vigencia=base + timedelta(days=i % 3),
+            estado="pendiente",
+        )
+        for i in range(con_vigencia)
+    ]
+    # Filas históricas: sin vigencia, nombre ni tipo
+    filas += [
+        dict(visita_id=f"V-nula-{i}", condominio_id="C1", casa_unidad="A1", estado="pendiente")
+        for i in range(sin_vigencia)
+    ]
+    db.execute(insert(Visita), filas)
+    db.commit()
+    fechadas = sorted(
+        (v for v in db.query(Visita) if v.vigencia is not None), key=lambda v: (v.vigencia, v.id), reverse=True
+    )
+    nulas = sorted((v for v in db.query(Visita) if v.vigencia is None), key=lambda v: v.id, reverse=True)
+    return [v.visita_id for v in fechadas + nulas]
+
+
+def _recorrer(client, ruta: str, usuario: str, limite: int) -> list:
+    vistas, cursor = [], None
+    while True:
+        params = {"limite": limite, **({"cursor": cursor} if cursor else {})}
+        r = client.get(ruta, headers=H(usuario), params=params)
+        assert r.status_code == 200, r.text
+        pagina = r.json()
+        vistas += [v["visita_id"] for v in pagina["items"]]
+        cursor = pagina["next_cursor"]
+        if not cursor:
+            return vistas
+
+
+@pytest.mark.parametrize(
+    "ruta, usuario", [("/visitas/mis-visitas", "res"), ("/visitas/condominio", "adm")]
+)
+def test_pagina_cruza_a_las_visitas_sin_vigencia(client, db, ruta, usuario):
+    # 5 con vigencia + 4 sin ella, de 3 en 3: la segunda página mezcla ambas fases
+    esperado = _sembrar(db, con_vigencia=5, sin_vigencia=4)
+
+    assert _recorrer(client, ruta, usuario, limite=3) == esperado
+
+
+def test_visita_sin_vigencia_se_serializa_con_nulos(client, db):
+    _sembrar(db, con_vigencia=0, sin_vigencia=1)
+
+    r = client.get("/visitas/mis-visitas", headers=H("res"))
+
+    assert r.status_code == 200, r.text
+    (item,) = r.json()["items"]
+    assert item["vigencia"] is None
+    assert item["nombre_visitante"] is None
+    assert item["tipo_visita"] is None
@@ -0,0 +1,40 @@
+"""Alta de visitas (individual y en lote) por el administrador del condominio."""
+import json
+
+from backend.db.models import Visita
+
+from .conftest import H
+
+
+def _lote(condominio_id: str, n: int = 3) -> dict:
+    return {
+        "condominio_id": condominio_id,
+        "visitas": [
+            {"nombre_visitante": f"Invitado {i}", "tipo_visita": "evento", "vigencia": "2030-01-01T10:00:00"}
+            for i in range(n)
+        ],
+    }
+
+
+def test_lote_en_el_propio_condominio(client, db):
+    r = client.post("/visitas/lote", headers=H("adm"), json=_lote("C1"))
+
+    assert r.status_code == 200, r.text
+    lineas = [json.loads(linea) for linea in r.text.splitlines()]
+    assert len(lineas) == 3 and all(linea["qr_base64"] for linea in lineas)
+    assert {v.condominio_id for v in db.query(Visita)} == {"C1"}
+
+
+def test_lote_en_otro_condominio_se_rechaza(client, db):
+    r = client.post("/visitas/lote", headers=H("adm"), json=_lote("C2"))
+
+    assert r.status_code == 403
+    assert db.query(Visita).count() == 0
+
+
+def test_visita_en_otro_condominio_se_rechaza(client, db):
+    visita = {**_lote("C2", 1)["visitas"][0], "condominio_id": "C2"}
+
+    assert client.post("/visitas/", headers=H("adm"), json=visita).status_code == 403
+    assert client.post("/visitas/", headers=H("adm2"), json=visita).status_code == 200
+    assert [v.condominio_id for v in db.query(Visita)] == ["C2"]
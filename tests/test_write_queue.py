@@ -0,0 +1,132 @@
+"""Cola de escritura SQLite: group commit, SAVEPOINT por trabajo y apagado ordenado."""
+import asyncio
+import contextvars
+import threading
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import write_queue
+from backend.db.models import Evidencia
+from backend.db.write_queue import ColaEscritura, crear_engine_escritor
+
+from .conftest import H
+
+_metadata = MetaData()
+notas = Table("notas", _metadata, Column("id", Integer, primary_key=True), Column("texto", String))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    eng = crear_engine_escritor(f"sqlite:///{tmp_path / 'cola.db'}")
+    _metadata.create_all(eng)
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture
+def cola(engine):
+    cola = ColaEscritura(sessionmaker(bind=engine, autoflush=False, expire_on_commit=False), max_lote=64)
+    yield cola
+    cola.detener(timeout=5)
+
+
+def _textos(engine) -> list:
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(notas.c.texto)).scalars())
+
+
+def _insertar(db, texto: str) -> str:
+    db.execute(insert(notas).values(texto=texto))
+    return texto
+
+
+def _insertar_y_fallar(db, texto: str) -> None:
+    db.execute(insert(notas).values(texto=texto))
+    raise RuntimeError("falla a propósito")
+
+
+def _bloquear(cola: ColaEscritura) -> threading.Event:
+    """Ocupar el hilo escritor hasta que se libere el evento devuelto, para que
+    lo que se encole mientras tanto forme un solo lote."""
+    liberar, ocupado = threading.Event(), threading.Event()
+
+    def esperar(db):
+        ocupado.set()
+        liberar.wait(5)
+
+    cola.enviar(esperar)
+    assert ocupado.wait(5)
+    return liberar
+
+
+def test_un_trabajo_fallido_solo_deshace_su_savepoint(cola, engine):
+    liberar = _bloquear(cola)
+    futuros = [
+        cola.enviar(_insertar, "a"),
+        cola.enviar(_insertar_y_fallar, "b"),
+        cola.enviar(_insertar, "c"),
+    ]
+    liberar.set()
+
+    assert futuros[0].result(5) == "a"
+    with pytest.raises(RuntimeError, match="falla a propósito"):
+        futuros[1].result(5)
+    assert futuros[2].result(5) == "c"
+    # Los tres fueron un solo lote (una transacción y un commit), después del bloqueo
+    assert cola.lotes == 2
+    assert _textos(engine) == ["a", "c"]
+
+
+def test_error_de_sql_se_propaga_al_futuro(cola, engine):
+    with pytest.raises(Exception, match="no such table"):
+        cola.enviar(lambda db: db.execute(select(Table("nope", MetaData(), Column("x", Integer))))).result(5)
+
+    assert cola.enviar(_insertar, "despues").result(5) == "despues"
+    assert _textos(engine) == ["despues"]
+
+
+def test_detener_procesa_lo_pendiente(cola, engine):
+    liberar = _bloquear(cola)
+    futuros = [cola.enviar(_insertar, f"n{i}") for i in range(10)]
+
+    deteniendo = threading.Thread(target=cola.detener, kwargs={"timeout": 5})
+    deteniendo.start()
+    liberar.set()
+    deteniendo.join(5)
+
+    assert not deteniendo.is_alive()
+    assert all(f.done() for f in futuros)
+    assert [f.result() for f in futuros] == [f"n{i}" for i in range(10)]
+    assert _textos(engine) == sorted(f"n{i}" for i in range(10))
+
+
+def test_trabajo_corre_con_el_contexto_de_quien_lo_encola(cola):
+    variable = contextvars.ContextVar("prueba", default=None)
+    variable.set("request-1")
+
+    assert cola.enviar(lambda db: variable.get()).result(5) == "request-1"
+
+
+def test_ejecutar_escritura_espera_sin_bloquear_el_loop(esquema):
+    async def escribir():
+        return await asyncio.gather(*(write_queue.ejecutar_escritura(lambda db, i=i: i) for i in range(5)))
+
+    try:
+        assert asyncio.run(escribir()) == [0, 1, 2, 3, 4]
+    finally:
+        write_queue.detener_cola()
+
+
+def test_subida_de_evidencias_escribe_por_la_cola(client, db):
+    antes = write_queue.obtener_cola().trabajos
+    r = client.post(
+        "/evidencias/entrada/V-1",
+        headers=H("grd"),
+        files={"placas": ("p.bin", b"placas", "application/octet-stream"), "documento": ("d.bin", b"doc")},
+    )
+
+    assert r.status_code == 200, r.text
+    assert write_queue.obtener_cola().trabajos == antes + 1
+    assert {e.sub_tipo for e in db.query(Evidencia)} == {"placas", "documento"}